@@ -0,0 +1,373 @@
+"""性能基准：生成合成历史数据，无界面地测量加载、保存、统计聚合与各类图表的耗时
+
+    python benchmark.py generate todo.json [--years 3] [--sessions 8] [--tasks 20] [--seed 0]
+    python benchmark.py run [--years 3] [--sessions 8] [--tasks 20] [--data todo.json]
+                            [--repeat 5] [--output result.json] [--compare baseline.json]
+
+- generate 写出当前格式 (版本 2) 的 todo.json：截至今天的若干年历史，
+  每天的计时次数在 [0, 2 × sessions] 间随机，任务的使用频率近似 Zipf 分布。
+- run 在临时目录中生成数据 (或复制 --data 指定的文件)，在 Agg 后端下依次测量
+  load_data (读 JSON 与映射二进制快照两种路径)、按需读入更早历史、save_data、汇总索引构建、各视图的统计聚合
+  (_compute_statistics) 以及 ChartEngine.render 与汇总表。
+  存储模式与按需加载沿用 CLOCKTODO_STORAGE 等环境变量。
+- 结果为 JSON，附带当前提交与运行环境；--compare 与先前的结果比较各项中位数，
+  超过 --threshold 倍时视为性能回退，退出码为 1。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import matplotlib
+matplotlib.use('Agg')
+
+import dataset
+import main
+import storage
+from charts import ChartEngine
+from dataset import Dataset
+from storage import STORAGE_MODE, rebuild_binary, snapshot_data, write_json_atomic
+from tasks import TaskTable
+
+# 各视图：(统计周期, 图表类型, 粒度)
+VIEWS = [
+    ('今日', '饼图', '按天'),
+    ('本周', '折线图', '按天'),
+    ('本月', '折线图', '按天'),
+    ('本月', '折线图', '按周'),
+    ('本年', '饼图', '按天'),
+    ('本年', '折线图', '按天'),
+    ('本年', '折线图', '按周'),
+    ('本年', '折线图', '按月'),
+]
+# 每次计时的时长范围，秒
+SESSION_SECONDS = (10 * 60, 90 * 60)
+# 中位数低于该值 (毫秒) 的项只显示、不判定回退，避免计时噪声
+COMPARE_FLOOR_MS = 1.0
+
+
+def generate_history(path, years=3, sessions_per_day=8, tasks=20, seed=0, end=None):
+    """写出合成的 todo.json，返回记录条数
+
+    记录从 end (默认今天) 往前覆盖 years 年，每天的计时从 7 点起依次排开、互不重叠。
+    """
+    rng = random.Random(seed)
+    table = TaskTable()
+    for i in range(tasks):
+        table.add(f'任务{i}')
+    task_ids = list(table)
+    # 排名靠前的任务更常用
+    weights = [1 / (rank + 1) for rank in range(tasks)]
+
+    end = end or date.today()
+    day = end - timedelta(days=round(years * 365))
+    daily_records = {}
+    count = 0
+    while day <= end:
+        clock = 7 * 3600 + rng.randrange(0, 2 * 3600)
+        records = []
+        for _ in range(rng.randint(0, 2 * sessions_per_day)):
+            duration = rng.randint(*SESSION_SECONDS)
+            if clock + duration >= 24 * 3600:
+                break
+            records.append({
+                'task': rng.choices(task_ids, weights)[0],
+                'start': _clock(clock),
+                'end': _clock(clock + duration),
+                'duration': duration,
+            })
+            clock += duration + rng.randint(0, 45 * 60)
+        if records:
+            daily_records[day.isoformat()] = records
+            count += len(records)
+        day += timedelta(days=1)
+
+    write_json_atomic(path, snapshot_data(table, daily_records))
+    return count
+
+
+def _clock(seconds):
+    return f'{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}'
+
+
+def timeit(fn, repeat, setup=None):
+    """调用 fn repeat 次 (每次之前先调用 setup)，返回以毫秒计的统计"""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return {
+        'runs': repeat,
+        'min_ms': round(min(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+
+class _HeadlessWidget:
+    """没有显示器时代替汇总表所在的 Tk 部件，只保留 BenchmarkApp 用到的接口"""
+
+    def __init__(self, master=None):
+        self.master = master
+        self._manager = ''
+
+    def pack(self, **kwargs):
+        self._manager = 'pack'
+
+    def pack_forget(self):
+        self._manager = ''
+
+    def winfo_manager(self):
+        return self._manager
+
+
+class _HeadlessTable(_HeadlessWidget):
+    """内存中的 Treeview 替代，只实现 VirtualTable 用到的接口"""
+
+    def __init__(self, columns, height):
+        super().__init__(_HeadlessWidget())
+        self.options = {'columns': columns, 'height': height}
+        self.headings = {column: {'text': column} for column in columns}
+        self.rows = {}
+        self.tags = {}
+
+    def __getitem__(self, option):
+        return self.options[option]
+
+    def cget(self, option):
+        return self.options[option]
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    def heading(self, column, option=None, **options):
+        if option is not None:
+            return self.headings[column].get(option)
+        self.headings[column].update(options)
+
+    def bind(self, sequence, func):
+        pass
+
+    def get_children(self):
+        return tuple(self.rows)
+
+    def delete(self, *items):
+        for item in items:
+            del self.rows[item]
+
+    def insert(self, parent, index, values=(), tags=()):
+        iid = f'I{len(self.rows) + 1:03X}'
+        self.rows[iid] = (values, tags)
+        return iid
+
+    def item(self, iid, values=(), tags=()):
+        self.rows[iid] = (values, tags)
+
+    def tag_configure(self, tag, **options):
+        self.tags[tag] = options
+
+
+class _HeadlessScrollbar:
+    def configure(self, **options):
+        pass
+
+    def set(self, first, last):
+        self.position = (first, last)
+
+
+class BenchmarkApp(Dataset):
+    """Dataset 加上 Agg 画布与汇总表：有显示器时使用隐藏窗口中的真实 Treeview，否则使用内存中的替代部件"""
+
+    def __init__(self, data_file):
+        super().__init__(data_file)
+        self.root = None
+        self.chart = ChartEngine()
+        self.table_backend = self._init_summary_table()
+
+    def _init_summary_table(self):
+        try:
+            self.root = main.tk.Tk()
+        except main.tk.TclError:
+            self.summary_table = main.wrap_summary_table(
+                _HeadlessTable(('计划', '累计时长', '占比'), main.SUMMARY_TABLE_ROWS), _HeadlessScrollbar())
+            return 'headless'
+        self.root.withdraw()
+        self.summary_table = main.create_summary_table(main.tk.Frame(self.root))
+        return 'tk'
+
+    def draw_summary_table(self, labels, values, colors):
+        self.summary_table.set_rows(main.summary_rows(labels, values, colors))
+
+    def close(self):
+        super().close()
+        if self.root is not None:
+            self.root.destroy()
+
+
+def _view(period, chart_type, sub_period, now):
+    return {'period': period, 'chart_type': chart_type, 'sub_period': sub_period, 'force_day': None, 'now': now,
+            'custom': None}
+
+
+def run_benchmarks(data_file, repeat=5):
+    """在 data_file 上运行全部基准，返回 {名称: 计时统计}"""
+    results = {}
+    app = BenchmarkApp(data_file)
+    try:
+        binary = storage.BINARY_SNAPSHOT
+        storage.BINARY_SNAPSHOT = dataset.BINARY_SNAPSHOT = False
+        results['load_data'] = timeit(app.load_data, repeat)
+        storage.BINARY_SNAPSHOT = dataset.BINARY_SNAPSHOT = binary
+        if binary and STORAGE_MODE != 'sqlite':
+            rebuild_binary(data_file)
+            results['load_data/binary'] = timeit(app.load_data, repeat)
+        app.load_data()
+        # 其余各项都在完整历史上测量
+        results['load_history'] = timeit(lambda: app.ensure_history('0001-01-01'), 1)
+
+        save_file = os.path.join(os.path.dirname(data_file), 'save_data.json')
+        results['save_data'] = timeit(lambda: app.write_data(save_file), repeat)
+
+        results['rollups_build'] = timeit(lambda: app.get_rollups(), repeat,
+                                          setup=lambda: setattr(app, 'rollups', None))
+
+        now = datetime.now()
+        specs = {}
+        for period, chart_type, sub_period in VIEWS:
+            view = _view(period, chart_type, sub_period, now)
+            label = f'{period}/{sub_period}' if chart_type == '折线图' else period
+            results[f'statistics/{chart_type}/{label}'] = timeit(lambda: app._compute_statistics(view), repeat)
+            specs[label] = app._compute_statistics(view)
+
+        # 绘图计时包含 Agg 渲染；每次先清空图表类型，测量完整重建而非原地更新
+        def reset_chart():
+            app.chart.kind = None
+
+        for label, spec in specs.items():
+            if spec is None:
+                continue
+            if spec['kind'] == 'pie':
+                results[f'pie_chart/{label}'] = timeit(
+                    lambda: (app.chart.render(spec), app.chart.draw()), repeat, setup=reset_chart)
+                results[f'summary_tables/{label}'] = timeit(
+                    lambda: app.draw_summary_table(spec['labels'], spec['values'], spec['colors']), repeat)
+            else:
+                results[f'line_chart/{label}'] = timeit(
+                    lambda: (app.chart.render(spec), app.chart.draw()), repeat, setup=reset_chart)
+                # 同一类目再次绘制走原地更新
+                results[f'line_chart_update/{label}'] = timeit(
+                    lambda: (app.chart.render(spec), app.chart.draw()), repeat)
+        return results, app.table_backend, len(app.store.task_ids)
+    finally:
+        app.close()
+
+
+def environment():
+    """当前提交与运行环境，便于跨提交比较"""
+    info = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'matplotlib': matplotlib.__version__,
+        'storage_mode': STORAGE_MODE,
+        'lazy_load': storage.LAZY_LOAD,
+    }
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        info['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=here, capture_output=True,
+                                        text=True, check=True).stdout.strip()
+        info['dirty'] = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=here,
+                                            capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        info['commit'] = None
+    return info
+
+
+def compare(results, baseline, threshold):
+    """与先前结果逐项比较中位数，返回 [(名称, 旧值, 新值, 倍数)] 中超过阈值的项"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous['median_ms']:
+            continue
+        ratio = current['median_ms'] / previous['median_ms']
+        regressed = ratio > threshold and current['median_ms'] >= COMPARE_FLOOR_MS
+        mark = ' ←' if regressed else ''
+        print(f'{name:<36} {previous["median_ms"]:10.2f} → {current["median_ms"]:10.2f} ms  ×{ratio:.2f}{mark}',
+              file=sys.stderr)
+        if regressed:
+            regressions.append((name, previous['median_ms'], current['median_ms'], ratio))
+    return regressions
+
+
+def _add_dataset_args(parser):
+    parser.add_argument('--years', type=float, default=3, help='历史年数 (默认 3)')
+    parser.add_argument('--sessions', type=int, default=8, help='平均每天的计时次数 (默认 8)')
+    parser.add_argument('--tasks', type=int, default=20, help='任务数 (默认 20)')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子 (默认 0)')
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='ClockToDo 性能基准')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('generate', help='生成合成的 todo.json')
+    p.add_argument('output')
+    _add_dataset_args(p)
+    p = sub.add_parser('run', help='运行基准并输出 JSON 结果')
+    _add_dataset_args(p)
+    p.add_argument('--data', help='使用现有的数据文件而非生成 (复制后测量，原文件不会改动)')
+    p.add_argument('--repeat', type=int, default=5, help='每项重复次数 (默认 5)')
+    p.add_argument('--output', default='-', help='结果输出路径，- 表示标准输出')
+    p.add_argument('--compare', help='与先前的结果文件比较')
+    p.add_argument('--threshold', type=float, default=1.2, help='中位数超过基线该倍数时视为回退 (默认 1.2)')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        count = generate_history(args.output, args.years, args.sessions, args.tasks, args.seed)
+        print(f'已生成 {count} 条记录：{args.output}')
+        return 0
+
+    with tempfile.TemporaryDirectory(prefix='clocktodo-bench-') as tmp:
+        data_file = os.path.join(tmp, 'todo.json')
+        if args.data:
+            shutil.copyfile(args.data, data_file)
+            data_info = {'source': args.data}
+        else:
+            generate_history(data_file, args.years, args.sessions, args.tasks, args.seed)
+            data_info = {'years': args.years, 'sessions_per_day': args.sessions, 'tasks': args.tasks,
+                         'seed': args.seed}
+        data_info['bytes'] = os.path.getsize(data_file)
+        results, table_backend, records = run_benchmarks(data_file, args.repeat)
+    data_info['records'] = records
+
+    report = {'environment': dict(environment(), summary_tables=table_backend), 'dataset': data_info,
+              'results': results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline['results'], args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,172 @@
+"""二进制快照：todo.json 旁的 `<数据文件名>.bin`，启动时直接映射读取
+
+todo.json 仍是唯一的数据源 (导入导出、迁移与手工编辑都只针对它)，二进制快照
+只是它的紧凑副本：文件头 + 任务表 (JSON) + 四列定长数组，记录按开始时间升序：
+
+    头部   magic 'CTDS'、版本、来源 todo.json 的 (大小, 修改时间)、journal_seq、记录数、任务表长度
+    任务表 TaskTable.to_data() 的 UTF-8 JSON (任务名、别名、next_id)
+    数组   task_id int32[n]、start int64[n]、end int64[n]、duration int64[n]，各自按 8 字节对齐
+
+时间为“本地时间秒”(见 stats.py)，任务 id 为记录中的原始 id。读取时用 mmap 映射文件，
+按开始时间二分出所需的区间后只复制这一段，启动耗时与内存占用与历史长短无关。
+文件头中记下的来源签名与当前 todo.json 不符时视为过期，由 storage 重新生成。
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+from stats import DAY_SECONDS, day_seconds, clock_seconds
+from tasks import TaskTable
+
+MAGIC = b'CTDS'
+VERSION = 1
+# magic、版本、保留、来源大小、来源修改时间 (纳秒)、journal_seq、记录数、任务表字节数
+HEADER = struct.Struct('<4sHHqqqqI')
+# 数组按机器字节序写出，只在小端机器上启用
+SUPPORTED = sys.byteorder == 'little'
+
+
+def binary_path(data_file):
+    return os.path.splitext(data_file)[0] + '.bin'
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class Columns:
+    """按开始时间升序的四列记录 (array)，记录按原始 id 引用任务"""
+
+    def __init__(self, task_ids=None, starts=None, ends=None, durations=None):
+        self.task_ids = task_ids if task_ids is not None else array('i')
+        self.starts = starts if starts is not None else array('q')
+        self.ends = ends if ends is not None else array('q')
+        self.durations = durations if durations is not None else array('q')
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def columns_from_days(daily_records):
+    """{date: [记录]} -> Columns；记录须已按 id 引用任务，无效记录跳过"""
+    rows = []
+    for date_str, records in daily_records.items():
+        try:
+            base = day_seconds(date_str)
+        except (ValueError, TypeError):
+            continue
+        for record in records:
+            try:
+                start = base + clock_seconds(record['start'])
+                end = base + clock_seconds(record['end'])
+                rows.append((start, end if end >= start else end + DAY_SECONDS,
+                             int(record['task']), int(float(record['duration']))))
+            except (KeyError, ValueError, TypeError, AttributeError):
+                continue
+    rows.sort(key=lambda row: row[0])
+    return Columns(array('i', [row[2] for row in rows]), array('q', [row[0] for row in rows]),
+                   array('q', [row[1] for row in rows]), array('q', [row[3] for row in rows]))
+
+
+def write_binary(path, table, columns, journal_seq, source):
+    """写出二进制快照 (临时文件 + 原子替换)；source 为来源 todo.json 的 (大小, 修改时间)"""
+    table_bytes = json.dumps(table.to_data(), ensure_ascii=False).encode('utf-8')
+    count = len(columns)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, source[0], source[1], journal_seq, count, len(table_bytes)))
+        f.write(table_bytes)
+        for column in (columns.task_ids, columns.starts, columns.ends, columns.durations):
+            f.write(b'\0' * (_align(f.tell()) - f.tell()))
+            column.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class BinarySnapshot:
+    """映射读取二进制快照；用完须 close() (或用 with)，映射期间 Windows 上无法替换该文件"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except (ValueError, TypeError, struct.error):
+            self.close()
+            raise ValueError(f'二进制快照已损坏：{path}')
+
+    def _parse(self):
+        (magic, version, _, size, mtime_ns, self.journal_seq,
+         self.count, table_len) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('格式不符')
+        self.source = (size, mtime_ns)
+        offset = HEADER.size + table_len
+        self.table = TaskTable.from_data(json.loads(self._map[HEADER.size:offset].decode('utf-8')))
+        views = []
+        try:
+            for code, width in (('i', 4), ('q', 8), ('q', 8), ('q', 8)):
+                offset = _align(offset)
+                end = offset + width * self.count
+                if end > len(self._map):
+                    raise ValueError('文件被截断')
+                views.append(memoryview(self._map)[offset:end].cast(code))
+                offset = end
+        except Exception:
+            # 已建立的视图仍引用着映射，不释放则 close() 时 mmap 报 BufferError
+            for view in views:
+                view.release()
+            raise
+        self._task_ids, self._starts, self._ends, self._durations = views
+
+    def close(self):
+        for name in ('_task_ids', '_starts', '_ends', '_durations'):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def first_start(self):
+        """最早一条记录的开始时间，没有记录时为 None"""
+        return self._starts[0] if self.count else None
+
+    def range(self, lo=None, hi=None):
+        """开始时间在 [lo, hi) 内的记录 (None 表示不限)，复制为 Columns"""
+        first = 0 if lo is None else bisect_left(self._starts, lo)
+        last = self.count if hi is None else bisect_left(self._starts, hi)
+        columns = Columns()
+        if first < last:
+            # frombytes 只接受字节格式的缓冲区
+            columns.task_ids.frombytes(self._task_ids[first:last].cast('B'))
+            columns.starts.frombytes(self._starts[first:last].cast('B'))
+            columns.ends.frombytes(self._ends[first:last].cast('B'))
+            columns.durations.frombytes(self._durations[first:last].cast('B'))
+        return columns
+
+
+def open_binary(data_file):
+    """打开与当前 todo.json 一致的二进制快照；不存在、已过期或损坏时返回 None"""
+    path = binary_path(data_file)
+    if not SUPPORTED or not os.path.exists(path) or not os.path.exists(data_file):
+        return None
+    try:
+        snapshot = BinarySnapshot(path)
+    except (OSError, ValueError, BufferError):
+        return None
+    st = os.stat(data_file)
+    if snapshot.source != (st.st_size, st.st_mtime_ns):
+        snapshot.close()
+        return None
+    return snapshot
@@ -0,0 +1,386 @@
+"""统计图绘制：常驻 Figure/画布、原地更新图元与渲染结果缓存"""
+import os
+from collections import OrderedDict
+
+from tracing import span
+
+CHART_BG = '#fffbe6'
+# 渲染结果缓存的条目上限 (LRU)
+RENDER_CACHE_SIZE = 16
+# 折线图点数超过该值 (或 dense) 时改用细节层次 (LOD) 绘制
+LOD_MIN_POINTS = 60
+# LOD 折线图最多标注的数值个数，以及标注之间的最小像素间距 (横, 纵)
+MAX_ANNOTATIONS = 12
+ANNOTATION_SPACING_PX = (48, 16)
+# 相邻点平均间距小于该像素数时不画圆点标记
+MARKER_SPACING_PX = 6
+# 滚轮每格的缩放比例
+ZOOM_STEP = 0.8
+# 扇形图最多单独显示的任务数 (0 表示不限) 与单独显示所需的最小占比，其余并为“其他”
+PIE_TOP_N = int(os.environ.get('CLOCKTODO_PIE_TOP', '10'))
+PIE_MIN_SHARE = float(os.environ.get('CLOCKTODO_PIE_MIN_SHARE', '0.02'))
+OTHER_LABEL = '其他'
+OTHER_COLOR = '#d9d9d9'
+
+
+def format_hours(value):
+    """小时数 -> '1h 30m' 形式"""
+    hours, minutes = int(value), int(round((value - int(value)) * 60))
+    return f"{hours}h" + (f" {minutes}m" if minutes > 0 else "")
+
+
+def top_slices(labels, values, colors, top_n=None, min_share=None):
+    """扇形图的扇区：保留用时最多的 top_n 项中占比不低于 min_share 的，其余合并为“其他”
+
+    保留的扇区维持原有顺序，“其他”放在最后；只有一项可合并时照常显示。
+    返回 (labels, values, colors)，扇区数不超过 top_n + 1。
+    """
+    top_n = PIE_TOP_N if top_n is None else top_n
+    min_share = PIE_MIN_SHARE if min_share is None else min_share
+    total = sum(values)
+    ranked = sorted(range(len(values)), key=values.__getitem__, reverse=True)
+    if top_n > 0:
+        ranked = ranked[:top_n]
+    kept = {i for i in ranked if total and values[i] >= min_share * total}
+    if len(values) - len(kept) <= 1:
+        return list(labels), list(values), list(colors)
+    other = sum(value for i, value in enumerate(values) if i not in kept)
+    kept = sorted(kept)
+    return ([labels[i] for i in kept] + [OTHER_LABEL], [values[i] for i in kept] + [other],
+            [colors[i] for i in kept] + [OTHER_COLOR])
+
+
+def lttb_indices(values, threshold):
+    """Largest-Triangle-Three-Buckets 降采样：从等间距序列中选出 threshold 个最能保持形状的点的下标"""
+    import numpy as np
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    values = np.asarray(values, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        # 下一个桶的平均点
+        avg_x = (end + next_end - 1) / 2
+        avg_y = values[end:next_end].mean()
+        xs = np.arange(start, end)
+        area = np.abs((a - avg_x) * (values[start:end] - values[a]) - (a - xs) * (avg_y - values[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+
+def preload_plotting():
+    """预先导入绘图相关模块 (可在后台线程中调用，缩短首张统计图的等待)"""
+    import numpy  # noqa: F401
+    import matplotlib.figure  # noqa: F401
+    import matplotlib.backends.backend_agg  # noqa: F401
+
+
+class ChartEngine:
+    """统计图引擎
+
+    整个生命周期只创建一个 Figure 与画布。柱状图/折线图在类目不变时只更新
+    柱高、折线数据和数值标注，不再重建坐标轴；每次完整绘制后的位图按
+    (周期, 图表类型, 粒度, 日期, 数据版本) 缓存，切回最近看过的视图时直接贴图。
+    长序列的折线图按画布像素宽度降采样并剔除相互重叠的标注 (LOD)，绘制开销
+    与天数无关；在图上滚动滚轮缩放横轴时按可见范围重新取样，双击恢复全貌。
+    master 为 None 时使用无界面的 Agg 画布。
+    """
+
+    def __init__(self, master=None, cache_size=RENDER_CACHE_SIZE):
+        import matplotlib
+        from matplotlib.figure import Figure
+
+        matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS', 'sans-serif']
+        matplotlib.rcParams['axes.unicode_minus'] = False
+
+        self.fig = Figure(figsize=(5, 5), dpi=100, facecolor=CHART_BG)
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_facecolor(CHART_BG)
+        self._default_layout = {k: getattr(self.fig.subplotpars, k)
+                                for k in ('left', 'bottom', 'right', 'top', 'wspace', 'hspace')}
+        if master is None:
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            self.canvas = FigureCanvasAgg(self.fig)
+            self.widget = None
+        else:
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            self.canvas = FigureCanvasTkAgg(self.fig, master=master)
+            self.widget = self.canvas.get_tk_widget()
+
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        # 画布上当前视图的缓存键
+        self.key = None
+        # 当前坐标轴上的图表：类型、类目与可原地更新的图元
+        self.kind = None
+        self.categories = None
+        self.main_artists = []
+        self.value_texts = []
+        # LOD 折线图的完整序列
+        self.lod = None
+        self._lod_updating = False
+        if self.widget is not None:
+            self.canvas.mpl_connect('scroll_event', self._on_scroll)
+            self.canvas.mpl_connect('button_press_event', self._on_press)
+
+    # ---- 渲染结果缓存 ----
+    def show_cached(self, key):
+        """命中缓存时把位图贴回画布并返回当时保存的附加信息，否则返回 None"""
+        entry = self.cache.get(key)
+        # 画布尺寸变化后旧位图作废；缩放过的视图只留下横轴范围，需要重绘
+        if entry is None or entry[1] is None or entry[0] != tuple(self.fig.bbox.size):
+            return None
+        self.cache.move_to_end(key)
+        _, region, extra, _ = entry
+        with span('canvas.blit'):
+            self.canvas.restore_region(region)
+            if self.widget is not None:
+                self.canvas.blit(self.fig.bbox)
+        # 画布内容已与坐标轴上的图元不一致，下次必须整图重绘
+        self.kind = None
+        self.key = key
+        return extra
+
+    def draw(self, key=None, extra=None):
+        """绘制当前图表；给出 key 时缓存渲染结果 (LOD 折线图连同当前的横轴范围)"""
+        with span('canvas.draw'):
+            self.canvas.draw()
+        self.key = key
+        if key is None:
+            return
+        xlim = self.ax.get_xlim() if self.kind == 'lod' else None
+        self.cache[key] = (tuple(self.fig.bbox.size), self.canvas.copy_from_bbox(self.fig.bbox), extra, xlim)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _reset(self, kind, categories):
+        self.ax.clear()
+        self.ax.set_facecolor(CHART_BG)
+        self.kind = kind
+        self.categories = categories
+        self.main_artists = []
+        self.value_texts = []
+        self.lod = None
+
+    def _clear_value_texts(self):
+        for text in self.value_texts:
+            text.remove()
+        self.value_texts = []
+
+    # ---- 各类图表 ----
+    def render(self, spec, key=None):
+        """按 Dataset 统计结果 (kind 为 'pie' / 'bars' / 'line') 绘制对应的图表
+
+        key 为该视图的缓存键：之前缩放过的 LOD 折线图按缓存中的横轴范围绘制。
+        """
+        if spec['kind'] == 'pie':
+            self.pie(*spec['slices'], spec['title'])
+        elif spec['kind'] == 'bars':
+            self.bars(spec['labels'], spec['values'], spec['colors'], spec['title'])
+        else:
+            entry = self.cache.get(key)
+            self.line(spec['labels'], spec['values'], spec['color'], spec['title'], dense=spec['dense'],
+                      xlim=entry[3] if entry is not None else None)
+
+    def pie(self, labels, values, colors, title):
+        """各任务占比扇形图，扇区内标任务名，外侧标注时长"""
+        import numpy as np
+        ax = self.ax
+        self._reset('pie', None)
+        self.fig.subplots_adjust(**self._default_layout)
+        wedges, _ = ax.pie(values, startangle=90, wedgeprops={'linewidth': 1, 'edgecolor': 'white'}, colors=colors)
+
+        for i, wedge in enumerate(wedges):
+            ang = (wedge.theta2 + wedge.theta1) / 2.
+            angle_span = wedge.theta2 - wedge.theta1
+            r = 0.6
+            x, y = r * np.cos(np.deg2rad(ang)), r * np.sin(np.deg2rad(ang))
+            if angle_span < 15: continue
+            fontsize = int(8 + 4 * min(angle_span, 60) / 60)
+            display_ang = ang if not (90 < (ang % 360) < 270) else ang + 180
+            ax.text(x, y, labels[i], ha='center', va='center', fontsize=fontsize, color='#333', fontweight='bold', rotation=display_ang, rotation_mode='default')
+
+        for i, (wedge, value) in enumerate(zip(wedges, values)):
+            ang = (wedge.theta2 + wedge.theta1) / 2.
+            angle_span = wedge.theta2 - wedge.theta1
+            x, y = np.cos(np.deg2rad(ang)), np.sin(np.deg2rad(ang))
+            time_str = format_hours(value)
+            label = f"{labels[i]}\n{time_str}" if angle_span < 15 else time_str
+            ax.annotate(label, xy=(x, y), xytext=(1.35 * x, 1.10 * y), ha='center', va='center', fontsize=9,
+                        arrowprops=dict(arrowstyle='-', color='#888', lw=1, connectionstyle="angle3,angleA=0,angleB=90"),
+                        bbox=dict(boxstyle='round,pad=0.2', fc='white', ec='#ccc', lw=0.5, alpha=0.8))
+
+        ax.set_title(title, fontsize=14, pad=20)
+
+    def bars(self, labels, values, colors, title):
+        """各任务用时柱状图；任务集合不变时只更新柱高与标注"""
+        ax = self.ax
+        categories = tuple(labels)
+        if self.kind == 'bars' and self.categories == categories:
+            for bar, value, color in zip(self.main_artists, values, colors):
+                bar.set_height(value)
+                bar.set_color(color)
+            self._clear_value_texts()
+            ax.relim()
+            ax.autoscale_view()
+            rebuilt = False
+        else:
+            self._reset('bars', categories)
+            self.main_artists = list(ax.bar(labels, values, color=colors))
+            ax.tick_params(axis='x', labelrotation=30)
+            for tick in ax.get_xticklabels():
+                tick.set_ha('right')
+            rebuilt = True
+
+        for bar in self.main_artists:
+            yval = bar.get_height()
+            if yval > 0:
+                hours, minutes = int(yval), int(round((yval - int(yval)) * 60))
+                self.value_texts.append(ax.text(bar.get_x() + bar.get_width()/2.0, yval, f'{hours}h{minutes}m', va='bottom', ha='center', fontsize=9))
+        self._finish_axes(title, rebuilt)
+
+    def line(self, x_labels, y_values, color, title, dense=False, xlim=None):
+        """按时间分桶的折线图；横轴类目不变时只更新折线数据与标注
+
+        dense 为 True 或点数较多时按 LOD 方式绘制，横轴刻度最多保留 8 个并倾斜显示，
+        此时 xlim 为初始的横轴范围 (默认显示全貌)。
+        """
+        if dense or len(x_labels) > LOD_MIN_POINTS:
+            self._lod_line(x_labels, y_values, color, title, xlim)
+            return
+        ax = self.ax
+        categories = tuple(x_labels)
+        if self.kind == 'line' and self.categories == categories:
+            line = self.main_artists[0]
+            line.set_ydata(y_values)
+            line.set_color(color)
+            self._clear_value_texts()
+            ax.relim()
+            ax.autoscale_view()
+            rebuilt = False
+        else:
+            self._reset('line', categories)
+            self.main_artists = ax.plot(x_labels, y_values, marker='o', linestyle='-', color=color)
+            rebuilt = True
+
+        offset = max(y_values) * 0.01
+        for x, y in zip(x_labels, y_values):
+            if y > 0:
+                hours, minutes = int(y), int(round((y - int(y)) * 60))
+                self.value_texts.append(ax.text(x, y+offset, f' {hours}h{minutes}m', va='bottom', ha='left' if str(x)[0] != 'W' else 'center', fontsize=9))
+        self._finish_axes(title, rebuilt)
+
+    def _lod_line(self, x_labels, y_values, color, title, xlim=None):
+        """横轴按序号绘制、刻度显示类目名；数据与标注由 _refresh_lod 按可见范围生成"""
+        import numpy as np
+        from matplotlib.ticker import FuncFormatter, MaxNLocator
+        ax = self.ax
+        categories = tuple(x_labels)
+        if self.kind == 'lod' and self.categories == categories:
+            self.main_artists[0].set_color(color)
+            rebuilt = False
+        else:
+            self._reset('lod', categories)
+            self.main_artists = ax.plot([], [], marker='o', linestyle='-', color=color)
+            ax.xaxis.set_major_locator(MaxNLocator(8, integer=True))
+            ax.xaxis.set_major_formatter(FuncFormatter(self._category_label))
+            ax.tick_params(axis='x', labelrotation=30)
+            for tick in ax.get_xticklabels():
+                tick.set_ha('right')
+            rebuilt = True
+        self.lod = {'labels': list(x_labels), 'values': np.asarray(y_values, dtype=float)}
+
+        self._lod_updating = True
+        ax.set_xlim(*(xlim or (-0.5, len(x_labels) - 0.5)))
+        self._lod_updating = False
+        if rebuilt:
+            ax.callbacks.connect('xlim_changed', self._on_xlim_changed)
+        self._finish_axes(title, rebuilt)
+        # 依赖 tight_layout 之后的坐标轴像素宽度
+        self._refresh_lod()
+
+    def _category_label(self, x, pos=None):
+        labels = self.lod['labels'] if self.lod else ()
+        i = int(round(x))
+        return str(labels[i]) if 0 <= i < len(labels) and abs(x - i) < 1e-6 else ''
+
+    def _refresh_lod(self):
+        """按当前可见的横轴范围把序列降采样到像素宽度，并重新挑选不重叠的数值标注"""
+        import numpy as np
+        ax, lod = self.ax, self.lod
+        values = lod['values']
+        n = len(values)
+        lo, hi = ax.get_xlim()
+        first, last = max(0, int(np.floor(lo))), min(n, int(np.ceil(hi)) + 1)
+        width_px = max(int(ax.bbox.width), 50)
+        indices = first + lttb_indices(values[first:last], width_px)
+
+        line = self.main_artists[0]
+        line.set_data(indices, values[indices])
+        line.set_marker('o' if len(indices) * MARKER_SPACING_PX <= width_px else '')
+        top = values[first:last].max() if last > first else 0
+        top = top or 1
+        ax.set_ylim(-0.05 * top, 1.1 * top)
+
+        # 数值大的点优先标注，与已选标注在像素上过近的跳过
+        self._clear_value_texts()
+        candidates = [i for i in indices if values[i] > 0]
+        candidates.sort(key=lambda i: -values[i])
+        if not candidates:
+            return
+        points = ax.transData.transform(np.column_stack([candidates, values[candidates]]))
+        min_dx, min_dy = ANNOTATION_SPACING_PX
+        placed = []
+        offset = top * 0.01
+        for i, (px, py) in zip(candidates, points):
+            if any(abs(px - qx) < min_dx and abs(py - qy) < min_dy for qx, qy in placed):
+                continue
+            placed.append((px, py))
+            y = values[i]
+            hours, minutes = int(y), int(round((y - int(y)) * 60))
+            label = lod['labels'][i]
+            self.value_texts.append(ax.text(i, y + offset, f' {hours}h{minutes}m', va='bottom',
+                                            ha='left' if str(label)[0] != 'W' else 'center', fontsize=9))
+            if len(placed) >= MAX_ANNOTATIONS:
+                break
+
+    def _on_xlim_changed(self, ax):
+        if self._lod_updating or self.kind != 'lod':
+            return
+        self._refresh_lod()
+        self.canvas.draw_idle()
+        # 缓存的位图已不是当前的样子：只保留新的横轴范围，切回该视图时按它重绘
+        entry = self.cache.get(self.key)
+        if entry is not None:
+            self.cache[self.key] = (entry[0], None, entry[2], ax.get_xlim())
+
+    def _on_scroll(self, event):
+        """滚轮以光标为中心缩放横轴，最小显示 7 个点"""
+        if self.kind != 'lod' or event.inaxes is not self.ax or event.xdata is None:
+            return
+        n = len(self.lod['values'])
+        lo, hi = self.ax.get_xlim()
+        scale = ZOOM_STEP if event.button == 'up' else 1 / ZOOM_STEP
+        width = min(max((hi - lo) * scale, 7), n)
+        left = event.xdata - (event.xdata - lo) * width / (hi - lo)
+        left = min(max(left, -0.5), n - 0.5 - width)
+        self.ax.set_xlim(left, left + width)
+
+    def _on_press(self, event):
+        if event.dblclick and self.kind == 'lod' and event.inaxes is self.ax:
+            self.ax.set_xlim(-0.5, len(self.lod['values']) - 0.5)
+
+    def _finish_axes(self, title, rebuilt):
+        ax = self.ax
+        ax.set_title(title, fontsize=14, pad=20)
+        if rebuilt:
+            ax.set_ylabel('时长 (小时)')
+            ax.grid(True, linestyle='--', alpha=0.6)
+            self.fig.tight_layout(pad=2.0)
@@ -0,0 +1,387 @@
+"""不依赖界面的数据层：任务表、列式记录与汇总索引的读取、按需加载与统计聚合
+
+ClockToDoApp (界面)、报表 (report.py)、统计接口与各数据配置 (见 profiles.py) 都以 Dataset
+持有并统计数据；界面只在其上加上窗口、写入与文件监视。读取失败时抛出 LoadError，
+由调用方决定是弹窗提示还是输出到 stderr。
+"""
+import json
+import os
+import threading
+from array import array
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from binsnap import Columns
+from charts import top_slices
+from stats import (RecordStore, Rollups, DAY_SECONDS, day_seconds, clock_seconds, from_seconds, day_to_date,
+                   period_bounds, bucket_keys, bucket_label)
+from storage import (STORAGE_MODE, LAZY_LOAD, BINARY_SNAPSHOT, data_exists, file_signature, load_window_start,
+                     read_binary, read_data, rebuild_binary_async, save_binary, snapshot_data, write_json_atomic)
+from tasks import TaskTable
+from tracing import span, traced
+
+# 自定义统计范围可选的粒度
+GRANULARITY_NAMES = {'hour': '按小时', 'day': '按天', 'week': '按周', 'month': '按月', 'year': '按年'}
+
+# 全局统一 pastel_colors
+PASTEL_COLORS = [
+    '#aec7e8', '#ffbb78', '#98df8a', '#ff9896', '#c5b0d5', '#c49c94',
+    '#f7b6d2', '#c7c7c7', '#dbdb8d', '#9edae5',
+    '#b3e2cd', '#fdcdac', '#cbd5e8', '#f4cae4', '#e6f5c9', '#fff2ae',
+    '#f1e2cc', '#cccccc'
+]
+
+
+class LoadError(Exception):
+    """读取数据文件、数据库或更早的历史失败"""
+
+
+class Dataset:
+    """一份数据：任务表、按开始时间排序的列式记录与按需构建的汇总索引
+
+    data_lock 保护以上各项 (统计在工作线程中进行)；data_version 在数据变化时递增，
+    用作统计结果缓存的键。history 不为 None 时只加载了最近一段历史，见 ensure_history。
+    data_file 为这份数据的文件路径。
+    """
+
+    def __init__(self, data_file=None):
+        self.data_file = data_file
+        self.pastel_colors = PASTEL_COLORS
+        self.task_table = TaskTable()
+        self.store = RecordStore()
+        self.rollups = None
+        self.history = None
+        self.journal_seq = 0
+        self.data_signature = None
+        self.db = None
+        self.data_version = 0
+        self.data_lock = threading.Lock()
+
+    def _clear(self):
+        self.task_table = TaskTable()
+        self.store = RecordStore()
+        self.rollups = None
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    # ---- 读取 ----
+    @traced('load_data')
+    def load_data(self):
+        """读取 data_file 到任务表与列式存储；读取失败时数据为空并抛出 LoadError"""
+        data_file = self.data_file
+        self.history = None
+        # 读取前的文件签名，此后文件再有变化即为外部修改
+        self.data_signature = file_signature(data_file)
+        if STORAGE_MODE == 'sqlite':
+            self.load_database(data_file)
+        elif data_exists(data_file):
+            try:
+                # 快照 + 未合并的日志；日志模式下只流式读取最近一段历史
+                since = load_window_start(datetime.now().date()) if LAZY_LOAD and STORAGE_MODE == 'journal' else None
+                # 优先映射读取二进制快照，不可用 (首次运行或 todo.json 被外部修改) 时读 JSON 并在后台重建
+                loaded = read_binary(data_file, since)
+                rebuild = loaded is None and BINARY_SNAPSHOT and os.path.exists(data_file)
+                data, self.journal_seq, self.history = loaded or read_data(data_file, since)
+
+                # 任务表与列式存储
+                self.task_table = data["table"]
+                self.store = RecordStore()
+                if "columns" in data:
+                    self._load_columns(data["columns"])
+
+                # 加载每日记录
+                self._load_days(data["daily_records"])
+                if rebuild:
+                    rebuild_binary_async(data_file)
+
+            except (json.JSONDecodeError, TypeError) as e:
+                self._clear()
+                raise LoadError(f'读取数据文件失败，文件可能已损坏：{e}') from e
+            except Exception as e:
+                self._clear()
+                raise LoadError(f'读取数据时发生未知错误：{e}') from e
+        else:
+            # 如果文件不存在，则初始化为空任务表
+            self._clear()
+
+        # 汇总索引依赖 NumPy，留到绘图库就绪后的首次统计时构建
+        self.rollups = None
+
+    def load_database(self, data_file):
+        """SQLite 模式：首次运行时导入现有的 todo.json，之后按开始时间索引只读取加载窗口内的记录"""
+        from sqlite_store import SQLiteStore, SQLiteHistory, db_path
+        path = db_path(data_file)
+        self._clear()
+        self.db = None
+        try:
+            fresh = not os.path.exists(path)
+            self.db = SQLiteStore(path)
+            if fresh and data_exists(data_file):
+                self.db.import_data(read_data(data_file)[0])
+            since = load_window_start(datetime.now().date()) if LAZY_LOAD else None
+            data = self.db.load(since)
+        except Exception as e:
+            raise LoadError(f'读取数据库失败：{e}') from e
+        self.task_table = data["table"]
+        self._load_days(data["daily_records"])
+        first = self.db.first_date()
+        if since and first is not None and first < since:
+            self.history = SQLiteHistory(self.db, since)
+
+    @traced('parse_records')
+    def _load_days(self, daily_records):
+        """把 {date: [record]} 并入列式存储；记录的任务 id 解析到现存任务，已删除任务的记录忽略"""
+        resolve = self.task_table.resolve
+        append = self.store.append
+        for date, records in daily_records.items():
+            # 每天只解析一次日期，记录内只需解析时分秒
+            for row in parse_records(day_seconds(date), records, resolve):
+                append(*row)
+
+    @traced('parse_records')
+    def _load_columns(self, columns):
+        """把二进制快照中的 Columns 并入列式存储；任务 id 都未被合并或删除时整列追加"""
+        resolve = self.task_table.resolve
+        live = {task_id: resolve(task_id) for task_id in set(columns.task_ids)}
+        if all(task_id == resolved for task_id, resolved in live.items()):
+            self.store.extend(columns.task_ids, columns.starts, columns.ends, columns.durations, is_sorted=True)
+            return
+        for task_id, start, end, duration in zip(columns.task_ids, columns.starts, columns.ends, columns.durations):
+            task_id = live[task_id]
+            if task_id is not None:
+                self.store.append(task_id, start, end, duration)
+
+    @traced('ensure_history')
+    def ensure_history(self, date_str):
+        """确保 date_str 及之后的记录都已加载，按需从快照中读入更早的历史；读入了记录时返回 True"""
+        if self.history is None or date_str >= self.history.loaded_from:
+            return False
+        try:
+            days = self.history.load_before(date_str)
+        except (OSError, ValueError) as e:
+            raise LoadError(f'读取历史记录失败：{e}') from e
+        if self.history.complete:
+            self.history = None
+        with self.data_lock:
+            loaded = len(self.store)
+            if isinstance(days, Columns):
+                self._load_columns(days)
+            else:
+                self._load_days(days)
+            # 读入的多是一个月左右的记录，直接增量记入汇总索引
+            if self.rollups is not None:
+                store = self.store
+                for i in range(loaded, len(store)):
+                    self.rollups.add(store.task_ids[i], store.starts[i], store.ends[i], store.durations[i])
+        self.data_version += 1
+        return True
+
+    # ---- 写出 ----
+    def copy_data(self):
+        """持锁复制任务表与各列记录 (按开始时间排序)，返回 (TaskTable, Columns, journal_seq)"""
+        with self.data_lock:
+            store = self.store
+            store.ensure_sorted()
+            columns = Columns(array('i', store.task_ids), array('q', store.starts), array('q', store.ends),
+                              array('q', store.durations))
+            return TaskTable.from_data(self.task_table.to_data()), columns, self.journal_seq
+
+    def snapshot(self, copied=None):
+        """当前数据的快照 (版本 2 格式)；只在持锁期间复制各列，之后的转换不阻塞其他线程"""
+        table, columns, journal_seq = copied or self.copy_data()
+        # 由列式存储重构为按天记录的格式，记录按任务 id 引用任务
+        daily_records = {}
+        for task_id, start, end, duration in zip(columns.task_ids, columns.starts, columns.ends,
+                                                 columns.durations):
+            date = day_to_date(start // DAY_SECONDS).isoformat()
+            if date not in daily_records:
+                daily_records[date] = []
+            daily_records[date].append({
+                "task": task_id,
+                "start": from_seconds(start).strftime('%H:%M:%S'),
+                "end": from_seconds(end).strftime('%H:%M:%S'),
+                "duration": duration
+            })
+        # 已重放过的日志不再重复应用
+        return snapshot_data(table, daily_records, journal_seq)
+
+    def write_data(self, data_file):
+        """整体写出 data_file (临时文件 + 原子重命名) 及其二进制副本"""
+        copied = self.copy_data()
+        written = write_json_atomic(data_file, self.snapshot(copied))
+        save_binary(data_file, *copied, written)
+
+    # ---- 统计 ----
+    def task_color(self, task_id):
+        """任务颜色按 id 固定，删除或移动其他任务时不会变化"""
+        return self.pastel_colors[(task_id - 1) % len(self.pastel_colors)]
+
+    def get_rollups(self):
+        """汇总索引，失效后按需由列式存储重建"""
+        if self.rollups is None:
+            with span('rollups.build', records=len(self.store.task_ids)):
+                self.rollups = Rollups.from_store(self.store)
+        return self.rollups
+
+    @traced('statistics.compute')
+    def _compute_statistics(self, view):
+        """在工作线程中聚合统计数据，返回绘图所需的数据；周期内无记录时返回 None"""
+        period, force_day, now = view['period'], view['force_day'], view['now']
+        if view['custom'] and not force_day:
+            with self.data_lock:
+                return self._custom_statistics(view)
+        period_type = {'今日': 'day', '本周': 'week', '本月': 'month', '本年': 'year'}.get(period)
+        title_prefix = f'{force_day}' if force_day else f'{period}'
+        with self.data_lock:
+            # 直接读取汇总索引中对应周期的各任务累计值
+            lo, hi = period_bounds(period_type, now, force_day)
+            # 并入其他任务的旧 id 在这里按现存任务合并
+            task_totals = self.task_table.combine(self.get_rollups().period_totals(period_type, now, force_day))
+            if not task_totals:
+                return None
+            if view['chart_type'] == '饼图':
+                return self._pie_chart_data(task_totals, title_prefix, view.get('pie'))
+            return self._line_chart_data(task_totals, title_prefix, view, lo, hi)
+
+    def _custom_statistics(self, view):
+        """自定义范围：用按开始时间排序的记录做区间查询，按所选粒度分桶"""
+        custom = view['custom']
+        lo, hi = day_seconds(custom['start']), day_seconds(custom['end']) + DAY_SECONDS
+        granularity = custom['granularity']
+        task_ids = self.task_table.ids_for(custom['tasks']) if custom['tasks'] else None
+        result = self._range_query(lo, hi, task_ids, granularity)
+        task_totals = self.task_table.combine(result.totals)
+        if not task_totals:
+            return None
+        title_prefix = f"{custom['start']}~{custom['end']}"
+        if view['chart_type'] == '饼图':
+            return self._pie_chart_data(task_totals, title_prefix, view.get('pie'))
+        keys = bucket_keys(lo, hi, granularity)
+        title = f'{title_prefix} 专注时长 ({GRANULARITY_NAMES[granularity]})'
+        return {
+            'kind': 'line',
+            'labels': [bucket_label(granularity, key) for key in keys],
+            'values': [result.bucket_total(key) / 3600 for key in keys],
+            'color': '#8e7cc3',
+            'dense': len(keys) > 31,
+            'title': title,
+            'label_text': f'当前图表: {title.replace(" ", "")}',
+        }
+
+    def _range_query(self, lo, hi, task_ids, granularity):
+        """[lo, hi) 内按粒度分桶的区间查询，返回 stats.QueryResult"""
+        return self.store.query(lo, hi, task_ids, granularity)
+
+    def _ordered_totals(self, task_totals):
+        """按任务列表顺序排列的 [(任务 id, 秒数)]"""
+        return [(task_id, task_totals[task_id]) for task_id in self.task_table if task_id in task_totals]
+
+    def _pie_chart_data(self, task_totals, title_prefix, pie=None):
+        """labels/values/colors 含全部任务 (汇总表与报表用)，slices 为合并了尾部任务的扇区
+
+        pie 为 (top_n, min_share)，传给 top_slices；None 时用 charts 中的默认值。
+        """
+        totals = self._ordered_totals(task_totals)
+        labels = [self.task_table.names[task_id] for task_id, _ in totals]
+        values = [seconds / 3600 for _, seconds in totals]
+        colors = [self.task_color(task_id) for task_id, _ in totals]
+        return {
+            'kind': 'pie',
+            'labels': labels,
+            'values': values,
+            'colors': colors,
+            'slices': top_slices(labels, values, colors, *(pie or ())),
+            'title': f'{title_prefix} 各任务专注时间占比',
+            'label_text': f'当前统计: {title_prefix}',
+        }
+
+    def _line_chart_data(self, task_totals, title_prefix, view, period_start, period_end):
+        data = {}
+        rollups = self.get_rollups()
+        period, now, sub_period_type = view['period'], view['now'], view['sub_period']
+        title = f'{title_prefix} '
+        first_day, hi_day = period_start // DAY_SECONDS, period_end // DAY_SECONDS
+
+        if period == '今日' or view['force_day']:
+            title += '各任务用时分布'
+            totals = self._ordered_totals(task_totals)
+            spec = {
+                'kind': 'bars',
+                'labels': [self.task_table.names[task_id] for task_id, _ in totals],
+                'values': [seconds / 3600 for _, seconds in totals],
+                'colors': [self.task_color(task_id) for task_id, _ in totals],
+            }
+
+        else: # 非'今日'且非force_day的周期性图表
+            plot_color = '#6fa8dc' # 默认颜色
+            if period == '本周':
+                title += '每日专注时长'
+                plot_color = '#6fa8dc'
+                for i in range(7): data[day_to_date(first_day + i).strftime('%a(%d)')] = rollups.day_total(first_day + i) / 3600
+
+            elif period == '本月':
+                plot_color = '#93c47d'
+                if sub_period_type == '按天':
+                    title += '每日专注时长 (按天)'
+                    days_in_month = (datetime(now.year, now.month + 1, 1) - timedelta(days=1)).day if now.month < 12 else 31
+                    for day in range(1, days_in_month + 1): data[day] = rollups.day_total(first_day + day - 1) / 3600
+                elif sub_period_type == '按周':
+                    title += '每周专注时长'
+                    week_data = defaultdict(float)
+                    for day in range(first_day, hi_day):
+                        if day in rollups.days:
+                            week_data[day_to_date(day).isocalendar()[1]] += rollups.day_total(day) / 3600
+                    data = {f'W{week}': week_data[week] for week in sorted(week_data)}
+
+            elif period == '本年':
+                plot_color = '#e06666'
+                if sub_period_type == '按月':
+                    title += '每月专注时长'
+                    for month in range(1, 13):
+                        data[datetime(now.year, month, 1).strftime('%b')] = sum(rollups.months.get((now.year, month), {}).values()) / 3600
+                elif sub_period_type == '按周':
+                    title += '每周专注时长'
+                    week_data = defaultdict(float)
+                    for day in range(first_day, hi_day):
+                        if day in rollups.days:
+                            week_data[day_to_date(day).isocalendar()[1]] += rollups.day_total(day) / 3600
+                    data = {f'W{k}': week_data[k] for k in sorted(week_data) if week_data[k] > 0}
+                elif sub_period_type == '按天':
+                    title += '每日专注时长'
+                    for day in range(first_day, hi_day):
+                        if day in rollups.days:
+                            data[day_to_date(day).strftime('%m-%d')] = rollups.day_total(day) / 3600
+
+            spec = {
+                'kind': 'line',
+                'labels': list(data.keys()),
+                'values': list(data.values()),
+                'color': plot_color,
+                'dense': len(data) > 31,
+            }
+
+        spec['title'] = title
+        spec['label_text'] = f'当前图表: {title.replace(" ", "")}'
+        return spec
+
+
+def parse_records(day_base, records, resolve):
+    """一天的记录 -> [(任务 id, 开始, 结束, 时长)]，已删除任务的记录与无效记录跳过"""
+    rows = []
+    for record in records:
+        task_id = resolve(record["task"])
+        if task_id is None:
+            continue
+        try:
+            start = day_base + clock_seconds(record['start'])
+            end = day_base + clock_seconds(record['end'])
+            duration = int(float(record['duration']))
+        except (ValueError, TypeError):
+            continue
+        if end < start:  # 跨过零点
+            end += DAY_SECONDS
+        rows.append((task_id, start, end, duration))
+    return rows
@@ -1,23 +1,44 @@
 import tkinter as tk
-from tkinter import messagebox, simpledialog
+from tkinter import filedialog, messagebox, simpledialog
 import json
 import sys
 import os
 import time
-from datetime import datetime, timedelta
-from collections import defaultdict
-from matplotlib import pyplot as plt
+import threading
+import argparse
+import tempfile
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 import tkinter.ttk as ttk # 统一导入ttk
+from stats import DAY_SECONDS, day_seconds, to_seconds, day_to_date
+from charts import ChartEngine, format_hours, preload_plotting
+from storage import (STORAGE_MODE, COMPACT_THRESHOLD, BINARY_SNAPSHOT, Journal, SnapshotWriter, file_signature,
+                     read_data, rebase_entries, rebuild_binary_async, save_binary, write_json_atomic)
+from dataset import GRANULARITY_NAMES, Dataset, LoadError, parse_records
+from merge import merge_files
+from profiles import (DEFAULT_PROFILE, CombinedView, ProfileCache, ProfileData, check_name, create_profile,
+                      list_profiles, profile_path)
+from tasks import NameIndex
+from timers import TimerSet, format_elapsed, read_checkpoint, timers_path
+from virtual_table import VirtualTable
+from watcher import ConflictError, FileWatcher
+import tracing
+from tracing import span, traced
 
-DATA_FILE = 'todo.json'
+_STARTUP_T0 = time.perf_counter()
 
-# 全局统一 pastel_colors
-PASTEL_COLORS = [
-    '#aec7e8', '#ffbb78', '#98df8a', '#ff9896', '#c5b0d5', '#c49c94',
-    '#f7b6d2', '#c7c7c7', '#dbdb8d', '#9edae5',
-    '#b3e2cd', '#fdcdac', '#cbd5e8', '#f4cae4', '#e6f5c9', '#fff2ae',
-    '#f1e2cc', '#cccccc'
-]
+# 后台统计结果的轮询间隔，毫秒
+STATS_POLL_MS = 30
+
+# 汇总表的可见行数，更多的任务通过滚动查看
+SUMMARY_TABLE_ROWS = 6
+
+# 恢复计时时，程序未运行超过此秒数才询问是否计入这段时间；否则直接从检查点继续
+RECOVER_GAP_SECONDS = 60
+
+# 日历按当天专注时长深浅着色：(小时下限, 背景色)
+CALENDAR_LEVELS = [(0, '#fdebd0'), (1, '#f9cb9c'), (2, '#f6b26b'), (4, '#e69138')]
 
 
 def resource_path(relative_path):
@@ -29,29 +50,153 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
-class ClockToDoApp:
-    def __init__(self, root):
+class StartupProfile:
+    """--startup-profile：记录启动各阶段距进程启动的耗时，首张统计图完成后输出"""
+    # 首屏 (任务列表与计时器可用) 的目标耗时，毫秒
+    FIRST_PAINT_TARGET_MS = 300
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.marks = []
+
+    def mark(self, name):
+        if self.enabled:
+            self.marks.append((name, (time.perf_counter() - _STARTUP_T0) * 1000))
+
+    def report(self):
+        if not self.enabled:
+            return
+        for name, ms in self.marks:
+            line = f'[startup] {name:<8} {ms:8.1f} ms'
+            if name == '首屏显示':
+                ok = '达成' if ms <= self.FIRST_PAINT_TARGET_MS else '未达成'
+                line += f'  (目标 ≤ {self.FIRST_PAINT_TARGET_MS} ms: {ok})'
+            print(line)
+
+
+def create_summary_table(parent_frame):
+    """汇总表：行为 (任务名, 小时数, 颜色, 占比)，默认按任务列表顺序"""
+    table = ttk.Treeview(
+        parent_frame, columns=('计划', '累计时长', '占比'), show='headings',
+        height=SUMMARY_TABLE_ROWS,
+        style='Custom.Treeview', selectmode='none'
+    )
+    for column, width in (('计划', 160), ('累计时长', 100), ('占比', 80)):
+        table.heading(column, text=column)
+        table.column(column, width=width, anchor='center')
+    scrollbar = ttk.Scrollbar(parent_frame, orient='vertical')
+    table.pack(side=tk.LEFT, fill='both', expand=True)
+    scrollbar.pack(side=tk.RIGHT, fill='y')
+    return wrap_summary_table(table, scrollbar)
+
+
+def wrap_summary_table(table, scrollbar):
+    by_time = (lambda row: row[1], True)
+    return VirtualTable(table, scrollbar,
+                        render=lambda row: (row[0], format_hours(row[1]), f'{row[3]:.1%}'),
+                        color=lambda row: row[2],
+                        sort_keys={'计划': (lambda row: row[0], False), '累计时长': by_time, '占比': by_time})
+
+
+def summary_rows(labels, values, colors):
+    """汇总表的各行 (任务名, 小时数, 颜色, 占比)"""
+    total = sum(values) or 1
+    return [(label, value, color, value / total) for label, value, color in zip(labels, values, colors)]
+
+
+class ClockToDoApp(Dataset):
+    def __init__(self, root, startup_profile=None, profile_name=DEFAULT_PROFILE):
         self.root = root
+        self.startup_profile = startup_profile or StartupProfile()
         self.root.resizable(False, False)
-        self.pastel_colors = PASTEL_COLORS
-        self.root.title('ClockToDo')
+        super().__init__(profile_path(profile_name))
+        # 当前的数据配置 (数据文件为 data_file)；最近用过的其他配置的数据留在缓存中
+        self.profile_name = profile_name
+        self.profiles = ProfileCache()
+        # 合并视图 (CombinedView)，各配置的数据版本不变时沿用已合并的汇总
+        self._combined = None
+        # 合并视图在统计线程中读取其他配置；读取失败的配置 {名称: 文件签名}，文件变化前不再重试
+        self._profile_future = None
+        self._failed_profiles = {}
+        self._set_title()
         try:
             icon_path = resource_path("clockToDo.ico")
             self.root.iconbitmap(icon_path)
         except tk.TclError:
             print("图标 'clockToDo.ico' 未找到，将使用默认图标。")
 
-        self.tasks = []
         self.load_data()
-        self.current_task = None
-        self.timer_running = False
-        self.start_time = None
+        self.startup_profile.mark('数据加载')
+        # 整体重写模式下尚未写出的变更，数据文件被外部修改时重新应用到新版本上
+        self._unsaved = []
+        self._reload_future = None
+        self._reload_failed = None
+        # 导入合并在统计线程中进行
+        self._import_future = None
+        self._open_storage()
+        self.root.protocol('WM_DELETE_WINDOW', self.on_close)
+        # 可同时进行多个计时，共用一个 tick 循环
+        self.timers = TimerSet(self.root.after, self.root.after_cancel, self._update_timer_labels,
+                               timers_path(self.data_file))
+        # 多个计时时每个计时一行：任务 id -> [标签, 当前文字]
+        self._timer_rows = {}
+        self._timer_text = None
         
         self.stats_period = '今日'
+        # “自定义”周期的范围：{'start', 'end' (含), 'granularity', 'tasks' (现存任务 id 集合或 None)}
+        self.custom_range = None
+        self.chart = None
+        self.summary_frame = None
+        self.plotting_ready = False
+        # 统计计算：单个工作线程 + 请求序号，过期结果直接丢弃
+        self.stats_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stats')
+        self.stats_request = 0
+        self._stats_future = None
+        self._pending_stats = None
+        self._deferred_force_day = None
         self.chart_type_var = tk.StringVar(value='饼图')
         self.sub_period_var = tk.StringVar(value='按天')
 
         self.build_ui()
+        self.startup_profile.mark('界面构建')
+        self.root.after_idle(self.recover_timers)
+        self.root.after_idle(self.startup_profile.mark, '首屏显示')
+
+    def _set_title(self):
+        self.root.title('ClockToDo' if self.profile_name == DEFAULT_PROFILE else f'ClockToDo - {self.profile_name}')
+
+    def _open_storage(self):
+        """为当前的数据文件创建文件监视、追加日志与写线程"""
+        # 其他程序 (同步盘、merge.py、手工编辑) 改写 todo.json 时增量载入；SQLite 由数据库自身处理并发
+        self.watcher = None
+        if STORAGE_MODE != 'sqlite':
+            self.watcher = FileWatcher(self.root.after, self.data_file, self.on_data_file_changed,
+                                       self.data_signature)
+        self.journal = Journal(self.data_file, self.journal_seq, self.watcher and self.watcher.replaced) \
+            if STORAGE_MODE == 'journal' else None
+        if self.journal and self.journal.pending:
+            self.journal.compact_async()
+        # 整体重写模式：由写线程合并连续的变更后写入
+        self.writer = SnapshotWriter(self.save_data) if STORAGE_MODE == 'json' else None
+
+    def _close_storage(self):
+        """写出尚未落盘的数据并释放当前的数据文件；写出失败时返回异常，此时写线程保持可用"""
+        if self.writer is not None:
+            self.writer.flush()
+            error = self.writer.pop_error()
+            if isinstance(error, ConflictError):
+                # 文件已被其他程序修改：载入这些修改并重放本地变更后再写出
+                error = self._save_after_reload()
+            if error is not None:
+                return error
+            self.writer.close()
+        if self.journal is not None:
+            # 等进行中的日志合并写完
+            with self.journal.exclusive():
+                self.journal.close()
+        if self.watcher is not None:
+            self.watcher.stop()
+        return None
 
     def build_ui(self):
         # 设置主窗口渐变背景色
@@ -59,9 +204,9 @@ class ClockToDoApp:
         w, h = self.root.winfo_width() or 900, self.root.winfo_height() or 600
         bg_canvas = tk.Canvas(self.root, width=w, height=h, highlightthickness=0)
         bg_canvas.place(x=0, y=0, relwidth=1, relheight=1)
-        for i in range(h):
-            color = f'#f7f7f7' if i < h//2 else f'#ffe4b2'
-            bg_canvas.create_line(0, i, w, i, fill=color)
+        # 上下两色各用一个矩形绘制，不再逐像素行画线
+        bg_canvas.create_rectangle(0, 0, w, h//2, fill='#f7f7f7', width=0)
+        bg_canvas.create_rectangle(0, h//2, w, h, fill='#ffe4b2', width=0)
         
         main_frame = tk.Frame(self.root, highlightthickness=0, bg='#f7f7f7')
         main_frame.grid(row=0, column=0, sticky='nsew')
@@ -78,9 +223,25 @@ class ClockToDoApp:
         title = tk.Label(left_frame, text='ClockToDo 任务管理',
                          font=('微软雅黑', 18, 'bold'), fg='#d35400', bg='#f7f7f7')
         title.pack(pady=(8, 8))
+
+        # 数据配置：切换时当前配置的数据留在缓存中
+        profile_frame = tk.Frame(left_frame, bg='#f7f7f7')
+        profile_frame.pack(pady=(0, 8))
+        tk.Label(profile_frame, text='配置:', font=('微软雅黑', 10), fg='#666', bg='#f7f7f7').pack(side=tk.LEFT)
+        self.profile_var = tk.StringVar(value=self.profile_name)
+        self.profile_box = ttk.Combobox(profile_frame, textvariable=self.profile_var, values=list_profiles(),
+                                        state='readonly', width=14, postcommand=self._refresh_profile_list)
+        self.profile_box.pack(side=tk.LEFT, padx=5)
+        self.profile_box.bind('<<ComboboxSelected>>', lambda e: self.switch_profile(self.profile_var.get()))
+        tk.Button(profile_frame, text='新建…', font=('微软雅黑', 9), relief='flat', bg='#eeeeee',
+                  command=self.new_profile).pack(side=tk.LEFT)
         
         # 日历区
         self.selected_calendar_date = None
+        self.calendar = None
+        # 日历上当前的标记：天序号 -> calevent id；已标记的 (汇总索引, 年, 月)
+        self._calendar_events = {}
+        self._calendar_marked = None
         try:
             import tkcalendar
             cal_frame = tk.Frame(left_frame)
@@ -96,11 +257,24 @@ class ClockToDoApp:
             )
             self.calendar.pack()
             self.calendar.bind('<<CalendarSelected>>', self.on_calendar_select)
+            self.calendar.bind('<<CalendarMonthChanged>>', self.on_calendar_month_changed)
+            for level, (_, color) in enumerate(CALENDAR_LEVELS):
+                self.calendar.tag_config(f'focus{level}', background=color, foreground='#333')
         except ImportError:
             tk.Label(left_frame, text='(可选)安装tkcalendar以显示日历',
                      font=('微软雅黑', 9), fg='#aaa', bg='#f7f7f7').pack(pady=(0, 8))
             
-        tk.Label(left_frame, text='任务列表', font=('微软雅黑', 12), fg='#333', bg='#f7f7f7').pack(anchor='w')
+        list_header = tk.Frame(left_frame, bg='#f7f7f7')
+        list_header.pack(fill='x')
+        tk.Label(list_header, text='任务列表', font=('微软雅黑', 12), fg='#333', bg='#f7f7f7').pack(side=tk.LEFT)
+        tk.Button(list_header, text='导入…', font=('微软雅黑', 9), relief='flat', bg='#eeeeee',
+                  command=self.import_data_files).pack(side=tk.RIGHT, padx=(5, 0))
+        # 任务筛选：输入时按名称子串收窄列表
+        self.task_filter_var = tk.StringVar()
+        self.task_filter_var.trace_add('write', lambda *_: self.refresh_task_list())
+        tk.Entry(list_header, textvariable=self.task_filter_var, font=('微软雅黑', 10), width=14,
+                 relief='flat').pack(side=tk.RIGHT, padx=5)
+        tk.Label(list_header, text='筛选:', font=('微软雅黑', 10), fg='#666', bg='#f7f7f7').pack(side=tk.RIGHT)
         
         # 任务列表 Treeview
         task_style = ttk.Style()
@@ -115,7 +289,22 @@ class ClockToDoApp:
             style='Task.Treeview', selectmode='browse'
         )
         self.task_tree.column('#0', anchor='center', width=220, stretch=True)
+        task_scroll = ttk.Scrollbar(self.task_tree_frame, orient='vertical', command=self.task_tree.yview)
+        self.task_tree.configure(yscrollcommand=task_scroll.set)
+        task_scroll.pack(side=tk.RIGHT, fill='y', pady=5)
         self.task_tree.pack(fill='x', expand=True, padx=5, pady=5)
+        self.task_tree.bind('<Double-1>', self.rename_task)
+        # 18 种颜色各对应一个标签，所有行共用
+        for i, color in enumerate(self.pastel_colors):
+            self.task_tree.tag_configure(f'color{i}', background=color)
+        # 列表中已有的行 (含筛选时暂时摘下的行)：id -> (显示文字, 颜色标签)
+        self._task_rows = {}
+        # 当前显示的行，按显示顺序
+        self._shown_tasks = []
+        self.name_index = NameIndex()
+        # 上次同步行时的 (任务表, 版本)；任务 id -> 在任务表中的位置
+        self._rows_state = None
+        self._task_order = {}
         self.refresh_task_list()
         
         btn_frame = tk.Frame(left_frame, bg='#f7f7f7')
@@ -128,7 +317,9 @@ class ClockToDoApp:
         tk.Button(btn_frame, text='结束计时', font=('微软雅黑', 10), bg='#b4a7d6', fg='white', width=12, command=self.stop_timer, relief='flat', activebackground='#d9d2e9').pack(side=tk.LEFT, padx=6)
 
         self.timer_label = tk.Label(left_frame, text='计时: 00:00:00', font=('微软雅黑', 16, 'bold'), fg='#3d85c6', bg='#f7f7f7')
-        self.timer_label.pack(pady=12)
+        self.timer_label.pack(pady=(12, 4))
+        self.timers_frame = tk.Frame(left_frame, bg='#f7f7f7')
+        self.timers_frame.pack(fill='x', padx=10, pady=(0, 8))
 
         # 右侧：统计
         right_frame = tk.Frame(main_frame, highlightthickness=0, bg='#ffe4b2')
@@ -147,6 +338,8 @@ class ClockToDoApp:
             tk.Button(period_frame, text=period, font=('微软雅黑', 10), bg=color, fg='white', width=8,
                       command=lambda p=period: self.set_stats_period_and_update(p, auto_update=True),
                       relief='flat', activebackground='#fff2ae').pack(side=tk.LEFT, padx=4)
+        tk.Button(period_frame, text='自定义', font=('微软雅黑', 10), bg='#8e7cc3', fg='white', width=8,
+                  command=self.choose_custom_range, relief='flat', activebackground='#fff2ae').pack(side=tk.LEFT, padx=4)
 
         # 图表类型选择
         chart_type_frame = tk.Frame(settings_frame, bg='#ffe4b2')
@@ -154,6 +347,10 @@ class ClockToDoApp:
         tk.Label(chart_type_frame, text='图表类型:', font=('微软雅黑', 11), fg='#333', bg='#ffe4b2').pack(side=tk.LEFT, padx=8)
         ttk.Radiobutton(chart_type_frame, text='饼图', variable=self.chart_type_var, value='饼图', command=self.show_statistics).pack(side=tk.LEFT)
         ttk.Radiobutton(chart_type_frame, text='折线图', variable=self.chart_type_var, value='折线图', command=self.show_statistics).pack(side=tk.LEFT, padx=10)
+        # 合并视图：把所有配置的汇总相加，任务显示为“配置/任务”
+        self.combined_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(chart_type_frame, text='合并全部配置', variable=self.combined_var,
+                        command=self.show_statistics).pack(side=tk.LEFT, padx=(10, 0))
 
         # 子周期选择器 (默认隐藏)
         self.sub_period_frame = tk.Frame(settings_frame, bg='#ffe4b2')
@@ -168,101 +365,285 @@ class ClockToDoApp:
         self.stats_canvas_frame = tk.Frame(right_frame, bg="#fffbe6")
         self.stats_canvas_frame.pack(fill='both', expand=True)
 
-        self.set_stats_period_and_update(self.stats_period, auto_update=True)
+        # 绘图库较重：先显示占位提示，后台导入完成后再绘制首张统计图
+        self.set_stats_period_and_update(self.stats_period)
+        self.loading_label = tk.Label(self.stats_canvas_frame, text='统计图加载中…', font=('微软雅黑', 14), fg='#999', bg='#fffbe6')
+        self.loading_label.pack(pady=50)
+        self._preload_thread = threading.Thread(target=preload_plotting, daemon=True)
+        self._preload_thread.start()
+        self.root.after(50, self._poll_plotting_ready)
+
+    def _poll_plotting_ready(self):
+        if self._preload_thread.is_alive():
+            self.root.after(50, self._poll_plotting_ready)
+            return
+        self.startup_profile.mark('绘图库就绪')
+        self.loading_label.destroy()
+        self.plotting_ready = True
+        self.show_statistics(force_day=self._deferred_force_day)
+        self.startup_profile.mark('首张统计图')
+        self.startup_profile.report()
 
+    @traced('refresh_task_list')
     def refresh_task_list(self):
-        for i in self.task_tree.get_children():
-            self.task_tree.delete(i)
-        
-        self.task_color_map = {}
-        n_colors = len(self.pastel_colors)
-        for i, task in enumerate(self.tasks):
-            self.task_color_map[task['name']] = self.pastel_colors[i % n_colors]
+        """按任务表与筛选条件增量更新列表：只插入、删除、摘下或改动有变化的行
+
+        任务表未变化时 (如筛选框中的每次按键) 只按 NameIndex 的查询结果排出显示的行，
+        不逐个检查全部任务与已有的行。
+        """
+        tree = self.task_tree
+        names = self.task_table.names
+        state = (self.task_table, self.task_table.version)
+        if state != self._rows_state:
+            self._sync_task_rows()
+            self._rows_state = state
+        query = self.task_filter_var.get().strip()
+        if query:
+            visible = sorted(self.name_index.search(query), key=self._task_order.__getitem__)
+        else:
+            visible = list(names)
 
-        for idx, task in enumerate(self.tasks):
-            tag = f'taskcolor{idx}'
-            color = self.task_color_map.get(task['name'])
-            self.task_tree.insert('', 'end', text=f" {task['name']}", tags=(tag,))
-            self.task_tree.tag_configure(tag, background=color)
+        # 仍显示的行中保持相对顺序的最长子序列原地不动，其余行先摘下再按位置放回
+        position = {task_id: i for i, task_id in enumerate(visible)}
+        staying = [task_id for task_id in self._shown_tasks if task_id in position]
+        keep = set(_increasing_subsequence(staying, position))
+        detached = [task_id for task_id in self._shown_tasks if task_id in names and task_id not in keep]
+        if detached:
+            tree.selection_remove(*map(str, detached))
+            tree.detach(*map(str, detached))
+        for i, task_id in enumerate(visible):
+            if task_id in keep:
+                continue
+            if task_id in self._task_rows:
+                tree.move(str(task_id), '', i)
+            else:
+                row = (f" {names[task_id]}", self.task_tag(task_id))
+                tree.insert('', i, iid=str(task_id), text=row[0], tags=(row[1],))
+                self._task_rows[task_id] = row
+        self._shown_tasks = visible
+
+    def _sync_task_rows(self):
+        """任务表变化后：删去已删除任务的行，更新改名的行，重建名称索引与显示顺序"""
+        tree = self.task_tree
+        names = self.task_table.names
+        self.name_index.sync(names)
+        self._task_order = {task_id: i for i, task_id in enumerate(names)}
+        removed = [task_id for task_id in self._task_rows if task_id not in names]
+        if removed:
+            tree.delete(*map(str, removed))
+            for task_id in removed:
+                del self._task_rows[task_id]
+        for task_id, row in self._task_rows.items():
+            new_row = (f" {names[task_id]}", self.task_tag(task_id))
+            if row != new_row:
+                tree.item(str(task_id), text=new_row[0], tags=(new_row[1],))
+                self._task_rows[task_id] = new_row
+
+    def task_tag(self, task_id):
+        return f'color{(task_id - 1) % len(self.pastel_colors)}'
+
+    def selected_task(self):
+        """任务列表中选中的任务 id，未选中时为 None"""
+        selection = self.task_tree.selection()
+        return int(selection[0]) if selection else None
 
     def add_task(self):
         name = simpledialog.askstring('添加任务', '请输入任务名称:')
         if name:
-            if any(t['name'] == name for t in self.tasks):
+            if name in self.task_table.index:
                 messagebox.showwarning('错误', '任务名称已存在！')
                 return
-            self.tasks.append({'name': name, 'records': []})
-            self.save_data()
+            with self.data_lock:
+                task_id = self.task_table.add(name)
+            self.commit({'op': 'add_task', 'id': task_id, 'name': name})
             self.refresh_task_list()
             self.show_statistics()
 
+    def rename_task(self, event=None):
+        """双击任务重命名；改为已有任务的名称时可把两者合并"""
+        task_id = self.selected_task()
+        if task_id is None:
+            return
+        old_name = self.task_table.names[task_id]
+        name = simpledialog.askstring('重命名任务', '请输入新的任务名称:', initialvalue=old_name)
+        if not name or name == old_name:
+            return
+        target = self.task_table.index.get(name)
+        if target is not None:
+            if not messagebox.askyesno('合并任务', f'任务“{name}”已存在，是否把“{old_name}”的计时记录并入该任务？'):
+                return
+            entry = {'op': 'merge_task', 'id': task_id, 'into': target}
+        else:
+            entry = {'op': 'rename_task', 'id': task_id, 'name': name}
+        # 只改任务表，记录按 id 引用任务，无需改动
+        with self.data_lock:
+            self.task_table.apply(entry)
+        self.commit(entry)
+        self.refresh_task_list()
+        self.show_statistics()
+
     def delete_task(self):
-        idxs = self.task_tree.selection()
-        if not idxs:
+        task_id = self.selected_task()
+        if task_id is None:
             messagebox.showwarning('提示', '请先选择要删除的任务')
             return
-        
-        idx = self.task_tree.index(idxs[0])
-        task_name = self.tasks[idx]['name']
 
-        if not self.tasks[idx]['records']:
-            if messagebox.askyesno('确认删除', f'确定要删除任务“{task_name}”？'):
-                del self.tasks[idx]
+        task_name = self.task_table.names[task_id]
+        keep_records = False
+
+        # 只加载了部分历史时无法断定任务没有更早的记录
+        has_records = self.store.count(self.task_table.ids_for({task_id})) > 0
+        if not has_records and self.history is None:
+            if not messagebox.askyesno('确认删除', f'确定要删除任务“{task_name}”？'):
+                return
         else:
             res = messagebox.askyesnocancel(
                 '删除任务', f'是否同时删除该任务的所有计时记录？\n是：删除任务及记录\n否：仅删除任务，保留记录到新任务“{task_name}_记录”\n取消：不删除')
             if res is None: return
-            elif res:
-                del self.tasks[idx]
+            keep_records = not res
+
+        with self.data_lock:
+            if keep_records:
+                # 改名或并入已有的“_记录”任务，记录与汇总索引都不用动
+                entry = self.task_table.archive(task_id)
             else:
-                records = self.tasks[idx]['records']
-                del self.tasks[idx]
-                self.tasks.append({'name': f'{task_name}_记录', 'records': records})
-        
-        self.save_data()
+                dropped = self.task_table.delete(task_id)
+                # 汇总索引按桶去掉这些任务；各列的记录留给统计线程筛除，
+                # 在此之前它们的 id 已解析不到现存任务，统计与载入时都会跳过
+                if self.rollups is not None:
+                    self.rollups.drop(dropped)
+                entry = {'op': 'delete_task', 'id': task_id}
+                self.stats_executor.submit(self._drop_records, self.store, dropped)
+        self.commit(entry)
         self.refresh_task_list()
         self.show_statistics()
 
+    def _drop_records(self, store, task_ids):
+        """在统计线程中去掉已删除任务的记录 (逐条筛选各列)；其间已重新载入或切换配置时不再处理"""
+        with self.data_lock:
+            if self.store is store and store.count(task_ids):
+                self.store = store.without(task_ids)
+
     def start_timer(self):
-        idxs = self.task_tree.selection()
-        if not idxs:
+        task_id = self.selected_task()
+        if task_id is None:
             messagebox.showwarning('提示', '请先选择一个任务')
             return
-        if self.timer_running:
-            messagebox.showinfo('提示', '已有计时在进行')
+        if task_id in self.timers:
+            messagebox.showinfo('提示', '该任务已在计时')
             return
-        
-        self.current_task = self.task_tree.index(idxs[0])
-        self.start_time = time.time()
-        self.timer_running = True
-        self.update_timer()
-
-    def update_timer(self):
-        if self.timer_running:
-            elapsed = int(time.time() - self.start_time)
-            h, m, s = elapsed // 3600, (elapsed % 3600) // 60, elapsed % 60
-            self.timer_label.config(text=f'计时: {h:02}:{m:02}:{s:02}')
-            self.root.after(1000, self.update_timer)
+        self.timers.start(task_id)
+
+    def _update_timer_labels(self, now):
+        """tick 回调：只改动文字有变化的标签；多个计时时每个计时单独一行"""
+        timers = self.timers.timers
+        if not timers:
+            text = '计时: 00:00:00'
+        elif len(timers) == 1:
+            text = f'计时: {format_elapsed(self.timers.elapsed(next(iter(timers.values())), now))}'
+        else:
+            text = f'计时中: {len(timers)} 项'
+        if text != self._timer_text:
+            self.timer_label.config(text=text)
+            self._timer_text = text
+
+        shown = timers if len(timers) > 1 else {}
+        for task_id in [t for t in self._timer_rows if t not in shown]:
+            self._timer_rows.pop(task_id)[0].destroy()
+        for task_id, timer in shown.items():
+            resolved = self.task_table.resolve(task_id)
+            name = self.task_table.names[resolved] if resolved is not None else '(已删除)'
+            text = f'{name}  {format_elapsed(self.timers.elapsed(timer, now))}'
+            row = self._timer_rows.get(task_id)
+            if row is None:
+                label = tk.Label(self.timers_frame, font=('微软雅黑', 11), fg='#333',
+                                 bg=self.task_color(resolved or task_id), anchor='w', padx=6)
+                label.pack(fill='x', pady=1)
+                row = self._timer_rows[task_id] = [label, None]
+            if row[1] != text:
+                row[0].config(text=text)
+                row[1] = text
 
     def stop_timer(self):
-        if not self.timer_running:
-            messagebox.showinfo('提示', '没有正在计时的任务')
+        """结束列表中选中任务的计时；只有一个计时时无需选择"""
+        task_id = self.selected_task()
+        if task_id not in self.timers:
+            if not self.timers:
+                messagebox.showinfo('提示', '没有正在计时的任务')
+                return
+            if len(self.timers) > 1:
+                messagebox.showinfo('提示', '有多个任务在计时，请先在列表中选择要结束的任务')
+                return
+            task_id = next(iter(self.timers.timers))
+
+        timer, elapsed = self.timers.stop(task_id)
+        if not self._save_timer_record(task_id, datetime.fromtimestamp(timer['start']), elapsed):
+            messagebox.showwarning('提示', '计时的任务已被删除，本次计时未保存')
             return
-        
-        end_time = time.time()
-        elapsed = int(end_time - self.start_time)
-        record = {
-            'start': datetime.fromtimestamp(self.start_time).isoformat(),
-            'end': datetime.fromtimestamp(end_time).isoformat(),
-            'duration': elapsed
-        }
-        self.tasks[self.current_task]['records'].append(record)
-        self.save_data()
-        self.timer_running = False
-        self.timer_label.config(text='计时: 00:00:00')
         messagebox.showinfo('完成', f'本次计时：{elapsed//60}分{elapsed%60}秒')
         self.show_statistics()
 
+    def _save_timer_record(self, task_id, start_dt, elapsed):
+        """保存一次计时；计时期间任务可能被合并或删除，已删除时返回 False"""
+        task_id = self.task_table.resolve(task_id)
+        if task_id is None:
+            return False
+        # 结束时刻由开始时刻加单调时钟测得的时长得出，不受期间系统时间调整的影响
+        end_dt = start_dt + timedelta(seconds=elapsed)
+        start_sec = to_seconds(start_dt)
+        with self.data_lock:
+            self.store.append(task_id, start_sec, start_sec + elapsed, elapsed)
+            if self.rollups is not None:
+                self.rollups.add(task_id, start_sec, start_sec + elapsed, elapsed)
+        if self.calendar is not None and self.rollups is not None:
+            for day in range(start_sec // DAY_SECONDS, (start_sec + max(elapsed, 1) - 1) // DAY_SECONDS + 1):
+                self._mark_calendar_day(day)
+        self.commit({
+            'op': 'record',
+            'task': task_id,
+            'date': start_dt.strftime('%Y-%m-%d'),
+            'start': start_dt.strftime('%H:%M:%S'),
+            'end': end_dt.strftime('%H:%M:%S'),
+            'duration': elapsed
+        })
+        return True
+
+    def recover_timers(self):
+        """启动时检查上次未结束的计时 (崩溃或计时中关闭窗口)：继续计时、按检查点保存或放弃"""
+        saved, timers = read_checkpoint(self.timers.checkpoint_path)
+        timers = [t for t in timers if self.task_table.resolve(t['task']) is not None]
+        if not timers:
+            self.timers.checkpoint()
+            return
+        names = '、'.join(self.task_table.names[self.task_table.resolve(t['task'])] for t in timers)
+        checkpoint = f'{datetime.fromtimestamp(saved):%m-%d %H:%M:%S}'
+        answer = messagebox.askyesnocancel(
+            '恢复计时', f'上次退出时有 {len(timers)} 个计时未结束：{names}\n'
+                        f'是：继续计时\n否：保存为计时记录（截至 {checkpoint}）\n取消：放弃这些计时')
+        if answer:
+            # 检查点之后程序未在运行 (关闭或崩溃)，这段时间默认不计入，由用户确认后才补上
+            downtime = max(0, time.time() - saved)
+            if downtime >= RECOVER_GAP_SECONDS and messagebox.askyesno(
+                    '恢复计时', f'程序自 {checkpoint} 起未运行（约 {downtime // 60:.0f} 分钟）。\n'
+                                f'是否把这段时间也计入这些计时？\n否：截至 {checkpoint} 的部分保存为计时记录，从现在重新开始计时'):
+                for timer in timers:
+                    self.timers.start(timer['task'], elapsed=timer['elapsed'] + downtime, start=timer['start'])
+                return
+            for timer in timers:
+                if downtime >= RECOVER_GAP_SECONDS:
+                    self._save_timer_record(timer['task'], datetime.fromtimestamp(timer['start']),
+                                            int(timer['elapsed']))
+                    self.timers.start(self.task_table.resolve(timer['task']))
+                else:
+                    self.timers.start(timer['task'], elapsed=timer['elapsed'], start=timer['start'])
+            self.show_statistics()
+            return
+        if answer is False:
+            for timer in timers:
+                self._save_timer_record(timer['task'], datetime.fromtimestamp(timer['start']), int(timer['elapsed']))
+            self.show_statistics()
+        self.timers.checkpoint()
+
     def set_stats_period_and_update(self, period, auto_update=False):
         self.stats_period = period
         
@@ -278,19 +659,55 @@ class ClockToDoApp:
     def on_calendar_select(self, event):
         date_str = self.calendar.get_date()
         self.selected_calendar_date = date_str
+        # 日历翻到尚未加载的月份时，按整月读入历史
+        self.ensure_history(date_str[:8] + '01')
         self.show_statistics(force_day=date_str)
 
+    @traced('calendar_month_changed')
+    def on_calendar_month_changed(self, event):
+        month, year = self.calendar.get_displayed_month()
+        self.ensure_history(f'{year}-{month:02}-01')
+        self.refresh_calendar_marks()
+
+    def refresh_calendar_marks(self):
+        """按每天的累计时长给日历当前显示的月份着色，只查该月 28–31 天的汇总"""
+        if self.calendar is None or self.rollups is None:
+            return
+        month, year = self.calendar.get_displayed_month()
+        state = (self.rollups, year, month)
+        if state == self._calendar_marked:
+            return
+        self._calendar_marked = state
+        self.calendar.calevent_remove('all')
+        self._calendar_events = {}
+        first = to_seconds(date(year, month, 1)) // DAY_SECONDS
+        last = to_seconds(date(year + month // 12, month % 12 + 1, 1)) // DAY_SECONDS
+        for day in range(first, last):
+            self._mark_calendar_day(day)
+
+    def _mark_calendar_day(self, day):
+        event = self._calendar_events.pop(day, None)
+        if event is not None:
+            self.calendar.calevent_remove(event)
+        seconds = self.rollups.totals.get(day, 0)
+        if seconds <= 0:
+            return
+        hours = seconds / 3600
+        level = max(i for i, (threshold, _) in enumerate(CALENDAR_LEVELS) if hours >= threshold)
+        self._calendar_events[day] = self.calendar.calevent_create(
+            day_to_date(day), f'专注 {format_hours(hours)}', f'focus{level}')
+
+    @traced('show_statistics')
     def show_statistics(self, force_day=None):
-        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-        import matplotlib
-        import matplotlib.pyplot as plt
-        import numpy as np
-        
-        matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS', 'sans-serif']
-        matplotlib.rcParams['axes.unicode_minus'] = False
-        
-        for widget in self.stats_canvas_frame.winfo_children():
-            widget.destroy()
+        if not self.plotting_ready:
+            # 绘图库尚在加载，就绪后按当前选择绘制
+            self._deferred_force_day = force_day
+            return
+        if self.chart is None:
+            # 图表引擎与提示标签只创建一次，之后原地更新
+            self.chart = ChartEngine(self.stats_canvas_frame)
+            self.empty_label = tk.Label(self.stats_canvas_frame, font=('微软雅黑', 16), fg='#e06666', bg='#fffbe6')
+            self.computing_label = tk.Label(self.stats_canvas_frame, text='计算中…', font=('微软雅黑', 12), fg='#999', bg='#fffbe6')
 
         # **BUG修复**: 将子周期选择器的UI更新逻辑移到这里
         # 这样每次刷新都会根据当前状态决定是否显示，并且不会重置用户的选择
@@ -310,290 +727,713 @@ class ClockToDoApp:
                 self.sub_month_rb.pack(side=tk.LEFT)
 
         now = datetime.now()
-        filtered_records = []
-        for task in self.tasks:
-            for rec in task.get('records', []):
-                try:
-                    start = datetime.fromisoformat(str(rec['start']))
-                    duration = int(float(rec['duration']))
-                except (ValueError, TypeError):
-                    continue
-                
-                is_in_period = False
-                if force_day:
-                    if start.strftime('%Y-%m-%d') == force_day: is_in_period = True
-                else:
-                    period_type = {'今日': 'day', '本周': 'week', '本月': 'month', '本年': 'year'}.get(self.stats_period)
-                    if period_type == 'day' and start.date() == now.date(): is_in_period = True
-                    elif period_type == 'week' and start.isocalendar()[:2] == now.isocalendar()[:2]: is_in_period = True
-                    elif period_type == 'month' and start.month == now.month and start.year == now.year: is_in_period = True
-                    elif period_type == 'year' and start.year == now.year: is_in_period = True
-                
-                if is_in_period:
-                    filtered_records.append({'start': start, 'duration': duration, 'task_name': task['name']})
-
-        if not filtered_records:
-            msg = f'{force_day} 暂无计时记录' if force_day else f'“{self.stats_period}”暂无计时记录'
-            tk.Label(self.stats_canvas_frame, text=msg, font=('微软雅黑', 16), fg='#e06666', bg='#fffbe6').pack(pady=50)
-            return
-
-        self.stats_fig = plt.Figure(figsize=(5, 5), dpi=100, facecolor='#fffbe6')
-        ax = self.stats_fig.add_subplot(111)
-        ax.set_facecolor('#fffbe6')
-        
         chart_type = self.chart_type_var.get()
-        title_prefix = f'{force_day}' if force_day else f'{self.stats_period}'
-
-        # 传递 force_day=force_day
-        if chart_type == '饼图':
-            self.stats_label.config(text=f'当前统计: {title_prefix}')
-            self._draw_pie_chart(ax, filtered_records, title_prefix)
-        else: # 折线图
-            self._draw_line_chart(ax, filtered_records, title_prefix, force_day=force_day)
-        
-        self.stats_canvas = FigureCanvasTkAgg(self.stats_fig, master=self.stats_canvas_frame)
-        self.stats_canvas.draw()
-        self.stats_canvas.get_tk_widget().pack(fill='both', expand=True)
-
-    def _draw_pie_chart(self, ax, records, title_prefix):
-        data = defaultdict(float)
-        for rec in records:
-            data[rec['task_name']] += rec['duration'] / 3600
-        
-        labels = list(data.keys())
-        values = list(data.values())
+        sub_period = self.sub_period_var.get()
+        # 最近看过的视图直接取缓存位图；日期或数据变化后键自然失效
+        custom = self.custom_range if self.stats_period == '自定义' else None
+        custom_key = custom and (custom['start'], custom['end'], custom['granularity'], custom['tasks'])
+        source, combined_key = self, None
+        if self.combined_var.get():
+            source = self._combined_view(force_day or (custom and custom['start']))
+            if source is None:
+                # 其他配置读完后 _poll_profiles 重新调用
+                self._deferred_force_day = force_day
+                self._pending_stats = None
+                self.stats_request += 1
+                self.computing_label.place(relx=0.5, rely=0.5, anchor='center')
+                return
+            combined_key = source.key
+        view_key = (self.stats_period, chart_type, sub_period, force_day, now.date(), self.data_version, custom_key,
+                    combined_key)
+        self.stats_request += 1
+        cached = self.chart.show_cached(view_key)
+        if cached is not None:
+            self._pending_stats = None
+            self.computing_label.place_forget()
+            label_text, table = cached
+            self.stats_label.config(text=label_text)
+            self._show_chart(table)
+            return
 
-        pie_colors = [self.task_color_map.get(name, '#cccccc') for name in labels]
-        wedges, _ = ax.pie(values, startangle=90, wedgeprops={'linewidth': 1, 'edgecolor': 'white'}, colors=pie_colors)
-        
-        import numpy as np
-        for i, wedge in enumerate(wedges):
-             ang = (wedge.theta2 + wedge.theta1) / 2.
-             angle_span = wedge.theta2 - wedge.theta1
-             r = 0.6
-             x, y = r * np.cos(np.deg2rad(ang)), r * np.sin(np.deg2rad(ang))
-             if angle_span < 15: continue
-             fontsize = int(8 + 4 * min(angle_span, 60) / 60)
-             display_ang = ang if not (90 < (ang % 360) < 270) else ang + 180
-             ax.text(x, y, labels[i], ha='center', va='center', fontsize=fontsize, color='#333', fontweight='bold', rotation=display_ang, rotation_mode='default')
-
-        for i, (wedge, value) in enumerate(zip(wedges, values)):
-            ang = (wedge.theta2 + wedge.theta1) / 2.
-            angle_span = wedge.theta2 - wedge.theta1
-            x, y = np.cos(np.deg2rad(ang)), np.sin(np.deg2rad(ang))
-            hours, minutes = int(value), int(round((value - int(value)) * 60))
-            time_str = f"{hours}h" + (f" {minutes}m" if minutes > 0 else "")
-            label = f"{labels[i]}\n{time_str}" if angle_span < 15 else time_str
-            ax.annotate(label, xy=(x, y), xytext=(1.35 * x, 1.10 * y), ha='center', va='center', fontsize=9,
-                        arrowprops=dict(arrowstyle='-', color='#888', lw=1, connectionstyle="angle3,angleA=0,angleB=90"),
-                        bbox=dict(boxstyle='round,pad=0.2', fc='white', ec='#ccc', lw=0.5, alpha=0.8))
-
-        ax.set_title(f'{title_prefix} 各任务专注时间占比', fontsize=14, pad=20)
-        
-        self._draw_summary_tables(labels, values)
+        # 聚合在后台线程中完成；计算进行中再次请求时只保留最新的一次
+        view = {'period': self.stats_period, 'chart_type': chart_type, 'sub_period': sub_period,
+                'force_day': force_day, 'now': now, 'custom': custom}
+        self._pending_stats = (self.stats_request, view_key, view, source)
+        if self._stats_future is None:
+            self._submit_statistics()
 
-    def _draw_line_chart(self, ax, records, title_prefix, force_day=None):
-        data = defaultdict(float)
-        now = datetime.now()
-        sub_period_type = self.sub_period_var.get()
-        x_labels, y_values = [], []
-        title = f'{title_prefix} '
-
-        if self.stats_period == '今日' or force_day:
-            title += '各任务用时分布'
-            for rec in records:
-                data[rec['task_name']] += rec['duration'] / 3600
-            sorted_tasks = sorted(data.keys(), key=lambda t: list(self.task_color_map.keys()).index(t) if t in self.task_color_map else -1)
-            x_labels = sorted_tasks
-            y_values = [data[t] for t in x_labels]
-            colors = [self.task_color_map.get(t, '#cccccc') for t in x_labels]
-            bars = ax.bar(x_labels, y_values, color=colors)
-            plt.setp(ax.get_xticklabels(), rotation=30, ha="right")
-            # **功能增强**: 添加数据注释
-            for bar in bars:
-                yval = bar.get_height()
-                if yval > 0:
-                    hours,minutes = int(yval), int(round((yval - int(yval)) * 60))
-                    ax.text(bar.get_x() + bar.get_width()/2.0, yval, f'{hours}h{minutes}m', va='bottom', ha='center', fontsize=9)
-        
-        else: # 非'今日'且非force_day的周期性图表
-            plot_color = '#6fa8dc' # 默认颜色
-            if self.stats_period == '本周':
-                title += '每日专注时长'
-                plot_color = '#6fa8dc'
-                start_of_week = now - timedelta(days=now.weekday())
-                for i in range(7): data[(start_of_week + timedelta(days=i)).strftime('%a(%d)')] = 0
-                for rec in records: data[rec['start'].strftime('%a(%d)')] += rec['duration'] / 3600
-            
-            elif self.stats_period == '本月':
-                plot_color = '#93c47d'
-                if sub_period_type == '按天':
-                    title += '每日专注时长 (按天)'
-                    days_in_month = (datetime(now.year, now.month + 1, 1) - timedelta(days=1)).day if now.month < 12 else 31
-                    for day in range(1, days_in_month + 1): data[day] = 0
-                    for rec in records: data[rec['start'].day] += rec['duration'] / 3600
-                elif sub_period_type == '按周':
-                    title += '每周专注时长'
-                    weeks_in_month = sorted(list(set(rec['start'].isocalendar()[1] for rec in records)))
-                    for week in weeks_in_month: data[f'W{week}'] = 0
-                    for rec in records: data[f'W{rec["start"].isocalendar()[1]}'] += rec['duration'] / 3600
-            
-            elif self.stats_period == '本年':
-                plot_color = '#e06666'
-                if sub_period_type == '按月':
-                    title += '每月专注时长'
-                    for month in range(1, 13): data[datetime(now.year, month, 1).strftime('%b')] = 0
-                    for rec in records: data[rec['start'].strftime('%b')] += rec['duration'] / 3600
-                elif sub_period_type == '按周':
-                    title += '每周专注时长'
-                    for week in range(1, 54): data[week] = 0
-                    for rec in records: data[rec['start'].isocalendar()[1]] += rec['duration'] / 3600
-                    data = {f'W{k}':v for k,v in data.items() if v > 0}
-                elif sub_period_type == '按天':
-                    title += '每日专注时长'
-                    for rec in records: data[rec['start'].strftime('%m-%d')] += rec['duration'] / 3600
-                    data = {k:v for k,v in sorted(data.items())}
-
-            x_labels = list(data.keys())
-            y_values = list(data.values())
-            ax.plot(x_labels, y_values, marker='o', linestyle='-', color=plot_color)
-            offset = max(y_values) * 0.01
-            # **功能增强**: 添加数据注释
-            for x, y in zip(x_labels, y_values):
-                if y > 0:
-                    hours,minutes = int(y), int(round((y - int(y)) * 60))
-                    ax.text(x, y+offset, f' {hours}h{minutes}m', va='bottom', ha='left' if str(x)[0] != 'W' else 'center', fontsize=9)
-            
-            if self.stats_period == '本年' and sub_period_type == '按天':
-                ax.xaxis.set_major_locator(plt.MaxNLocator(8))
-                plt.setp(ax.get_xticklabels(), rotation=30, ha="right")
-        
-        ax.set_title(title, fontsize=14, pad=20)
-        ax.set_ylabel('时长 (小时)')
-        ax.grid(True, linestyle='--', alpha=0.6)
-        self.stats_fig.tight_layout(pad=2.0)
-        self.stats_label.config(text=f'当前图表: {title.replace(" ", "")}')
-
-    def _draw_summary_tables(self, labels, values):
-        style = ttk.Style()
-        style.theme_use('default')
-        main_bg = '#fffbe6'
-        style.configure('Custom.Treeview', background=main_bg, fieldbackground=main_bg, borderwidth=0, relief='flat', rowheight=28, font=('微软雅黑', 11))
-        style.configure('Custom.Treeview.Heading', background='#fff2cc', foreground='#d35400', font=('微软雅黑', 11, 'bold'), borderwidth=0, relief='flat')
-        style.map('Custom.Treeview', background=[], foreground=[])
-        
-        table_frame = tk.Frame(self.stats_canvas_frame, bg=main_bg)
-        table_frame.pack(side=tk.BOTTOM, fill='x', pady=(10, 0), padx=10)
+    def _submit_statistics(self):
+        request_id, view_key, view, source = self._pending_stats
+        self._pending_stats = None
+        self._stats_future = self.stats_executor.submit(source._compute_statistics, view)
+        self._stats_future.request = (request_id, view_key)
+        self.root.after(STATS_POLL_MS, self._poll_statistics)
 
-        mid_index = (len(labels) + 1) // 2
-        left_data = list(zip(labels[:mid_index], values[:mid_index]))
-        right_data = list(zip(labels[mid_index:], values[mid_index:]))
-        
-        self._create_table_in_frame(table_frame, left_data, 'left')
-        if right_data:
-            self._create_table_in_frame(table_frame, right_data, 'right')
+    def _poll_statistics(self):
+        future = self._stats_future
+        if not future.done():
+            self.computing_label.place(relx=0.5, rely=0.5, anchor='center')
+            self.root.after(STATS_POLL_MS, self._poll_statistics)
+            return
+        self._stats_future = None
+        if self._pending_stats is not None:
+            # 已被更新的选择取代，丢弃本次结果
+            self._submit_statistics()
+            return
+        self.computing_label.place_forget()
+        request_id, view_key = future.request
+        if request_id != self.stats_request:
+            return
+        try:
+            spec = future.result()
+        except Exception as e:
+            messagebox.showerror('统计错误', f'统计数据失败：{e}')
+            return
+        self._render_statistics(view_key, spec)
 
-    def _create_table_in_frame(self, parent_frame, data, side):
-        frame = tk.Frame(parent_frame, bg='#fffbe6')
-        frame.pack(side=tk.LEFT if side == 'left' else tk.RIGHT, fill='x', expand=True, padx=(0, 5 if side == 'left' else 0))
-        
-        table = ttk.Treeview(
-            frame, columns=('计划', '累计时长'), show='headings',
-            height= 3,
-            style='Custom.Treeview', selectmode='none'
-        )
-        table.heading('计划', text='计划')
-        table.heading('累计时长', text='累计时长')
-        table.column('计划', width=120, anchor='center')
-        table.column('累计时长', width=100, anchor='center')
-        table.pack(side=tk.LEFT, fill='both', expand=True)
-
-        for label, value in data:
-            tag = f'rowcolor_{label.replace(" ", "_")}'
-            color = self.task_color_map.get(label, '#cccccc')
-            hours, minutes = int(value), int(round((value - int(value)) * 60))
-            time_str = f"{hours}h" + (f" {minutes}m" if minutes > 0 else "")
-            table.insert('', 'end', values=(label, time_str), tags=(tag,))
-            table.tag_configure(tag, background=color)
+    def choose_custom_range(self):
+        """弹出自定义统计范围对话框：起止日期 (可跨年)、粒度与任务子集"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title('自定义统计范围')
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        current = self.custom_range or {}
+        today = datetime.now().date()
+        start_default = current.get('start', today.replace(month=1, day=1).isoformat())
+        end_default = current.get('end', today.isoformat())
 
-    def save_data(self):
+        form = tk.Frame(dialog, padx=12, pady=10)
+        form.pack(fill='both', expand=True)
+        date_inputs = []
+        for row, (text, value) in enumerate((('开始日期:', start_default), ('结束日期:', end_default))):
+            tk.Label(form, text=text, font=('微软雅黑', 10)).grid(row=row, column=0, sticky='w', pady=2)
+            try:
+                from tkcalendar import DateEntry
+                entry = DateEntry(form, date_pattern='yyyy-mm-dd', width=12)
+                entry.set_date(date.fromisoformat(value))
+            except ImportError:
+                entry = ttk.Entry(form, width=14)
+                entry.insert(0, value)
+            entry.grid(row=row, column=1, sticky='w', pady=2)
+            date_inputs.append(entry)
+
+        tk.Label(form, text='粒度:', font=('微软雅黑', 10)).grid(row=2, column=0, sticky='w', pady=2)
+        granularity_var = tk.StringVar(value=GRANULARITY_NAMES[current.get('granularity', 'day')])
+        ttk.Combobox(form, textvariable=granularity_var, values=list(GRANULARITY_NAMES.values()),
+                     state='readonly', width=11).grid(row=2, column=1, sticky='w', pady=2)
+
+        tk.Label(form, text='任务 (不选即全部):', font=('微软雅黑', 10)).grid(row=3, column=0, columnspan=2, sticky='w', pady=(6, 2))
+        list_frame = tk.Frame(form)
+        list_frame.grid(row=4, column=0, columnspan=2, sticky='nsew')
+        task_list = tk.Listbox(list_frame, selectmode='extended', height=8, exportselection=False)
+        scroll = ttk.Scrollbar(list_frame, orient='vertical', command=task_list.yview)
+        task_list.configure(yscrollcommand=scroll.set)
+        task_list.pack(side=tk.LEFT, fill='both', expand=True)
+        scroll.pack(side=tk.RIGHT, fill='y')
+        task_ids = list(self.task_table)
+        for i, task_id in enumerate(task_ids):
+            task_list.insert('end', self.task_table.names[task_id])
+            if current.get('tasks') and task_id in current['tasks']:
+                task_list.selection_set(i)
+
+        def apply():
+            try:
+                start, end = (date.fromisoformat(entry.get().strip()) for entry in date_inputs)
+            except ValueError:
+                messagebox.showwarning('提示', '日期格式应为 YYYY-MM-DD', parent=dialog)
+                return
+            if start > end:
+                messagebox.showwarning('提示', '开始日期不能晚于结束日期', parent=dialog)
+                return
+            granularity = next(k for k, v in GRANULARITY_NAMES.items() if v == granularity_var.get())
+            selected = frozenset(task_ids[i] for i in task_list.curselection())
+            dialog.destroy()
+            self.custom_range = {'start': start.isoformat(), 'end': end.isoformat(),
+                                 'granularity': granularity, 'tasks': selected or None}
+            # 范围可能早于已加载的历史
+            self.ensure_history(start.isoformat())
+            self.set_stats_period_and_update('自定义', auto_update=True)
+
+        buttons = tk.Frame(form)
+        buttons.grid(row=5, column=0, columnspan=2, pady=(8, 0))
+        tk.Button(buttons, text='确定', width=8, command=apply).pack(side=tk.LEFT, padx=6)
+        tk.Button(buttons, text='取消', width=8, command=dialog.destroy).pack(side=tk.LEFT, padx=6)
+        dialog.grab_set()
+
+    def _render_statistics(self, view_key, spec):
+        """在主线程中把聚合结果画到常驻画布上"""
+        # 汇总索引此时已在工作线程中建好
+        self.refresh_calendar_marks()
+        if spec is None:
+            force_day, custom_key = view_key[3], view_key[6]
+            if force_day:
+                msg = f'{force_day} 暂无计时记录'
+            elif custom_key:
+                msg = f'{custom_key[0]} 至 {custom_key[1]} 暂无计时记录'
+            else:
+                msg = f'“{self.stats_period}”暂无计时记录'
+            self.chart.widget.pack_forget()
+            if self.summary_frame is not None:
+                self.summary_frame.pack_forget()
+            self.empty_label.config(text=msg)
+            self.empty_label.pack(pady=50)
+            return
+
+        with span(f"chart.{spec['kind']}", count=len(spec['values'])):
+            self.chart.render(spec, view_key)
+        # 饼图下方显示汇总表
+        table = (spec['labels'], spec['values'], spec['colors']) if spec['kind'] == 'pie' else None
+        self.stats_label.config(text=spec['label_text'])
+
+        self._show_chart(table)
+        self.chart.draw(view_key, (spec['label_text'], table))
+
+    def _show_chart(self, table):
+        """显示画布；table 为 (labels, values, colors) 时在下方显示汇总表"""
+        self.empty_label.pack_forget()
+        self.chart.widget.pack(fill='both', expand=True)
+        if table:
+            self._draw_summary_tables(*table)
+        elif self.summary_frame is not None:
+            self.summary_frame.pack_forget()
+
+    @traced('summary_tables')
+    def _draw_summary_tables(self, labels, values, colors):
+        """饼图下方的汇总表：列出全部任务，可按列排序；只填充可见的几行"""
+        if self.summary_frame is None:
+            style = ttk.Style()
+            style.theme_use('default')
+            main_bg = '#fffbe6'
+            style.configure('Custom.Treeview', background=main_bg, fieldbackground=main_bg, borderwidth=0, relief='flat', rowheight=28, font=('微软雅黑', 11))
+            style.configure('Custom.Treeview.Heading', background='#fff2cc', foreground='#d35400', font=('微软雅黑', 11, 'bold'), borderwidth=0, relief='flat')
+            style.map('Custom.Treeview', background=[], foreground=[])
+
+            self.summary_frame = tk.Frame(self.stats_canvas_frame, bg=main_bg)
+            self.summary_table = create_summary_table(self.summary_frame)
+        if not self.summary_frame.winfo_manager():
+            self.summary_frame.pack(side=tk.BOTTOM, fill='x', pady=(10, 0), padx=10, before=self.chart.widget)
+
+        self.summary_table.set_rows(summary_rows(labels, values, colors))
+
+    @traced('commit')
+    def commit(self, entry):
+        """持久化一次变更：SQLite 模式写入数据库，日志模式下只追加一条日志，否则整体重写数据文件"""
+        self.data_version += 1
+        if self.db is not None:
+            try:
+                self.db.apply(entry)
+            except Exception as e:
+                messagebox.showerror('保存错误', f'写入数据库失败：{e}')
+            return
+        if self.journal is None:
+            with self.data_lock:
+                self._unsaved.append(entry)
+            error = self.writer.pop_error()
+            if isinstance(error, ConflictError):
+                # 上次写入时发现文件已被外部修改：载入后会重新写出，未检测到修改时直接重试
+                if self.watcher.check():
+                    return
+            elif error is not None:
+                messagebox.showerror('保存错误', f'保存数据失败：{error}')
+            self.writer.request()
+            return
         try:
-            # 重构为按天记录的格式
-            daily_records = {}
-            task_list = []
-            
-            # 收集所有任务名称
-            for task in self.tasks:
-                task_list.append({"name": task["name"]})
-                for record in task.get("records", []):
-                    date = datetime.fromisoformat(record["start"]).strftime("%Y-%m-%d")
-                    if date not in daily_records:
-                        daily_records[date] = []
-                        
-                    daily_records[date].append({
-                        "task": task["name"],
-                        "start": datetime.fromisoformat(record["start"]).strftime("%H:%M:%S"),
-                        "end": datetime.fromisoformat(record["end"]).strftime("%H:%M:%S"),
-                        "duration": record["duration"]
-                    })
-            
-            # 按日期排序
-            sorted_data = {
-                "tasks": task_list,
-                "daily_records": dict(sorted(daily_records.items(), reverse=True))
-            }
-            
-            with open(DATA_FILE, 'w', encoding='utf-8') as f:
-                json.dump(sorted_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            messagebox.showerror('保存错误', f'保存数据失败：{e}')
+            self.journal.append(entry)
+        except OSError as e:
+            messagebox.showerror('保存错误', f'写入日志失败：{e}')
+            return
+        if self.journal.pending >= COMPACT_THRESHOLD:
+            self.journal.compact_async()
 
     def load_data(self):
-        if os.path.exists(DATA_FILE):
+        """读取当前配置的 data_file；读取失败时数据为空并弹窗提示"""
+        try:
+            super().load_data()
+        except LoadError as e:
+            messagebox.showerror('读取错误', str(e))
+
+    def ensure_history(self, date_str):
+        """按需读入 date_str 之后的历史 (见 Dataset.ensure_history)，读入后日历重新着色"""
+        try:
+            loaded = super().ensure_history(date_str)
+        except LoadError as e:
+            messagebox.showerror('读取错误', str(e))
+            return False
+        if loaded:
+            self._calendar_marked = None
+        return loaded
+
+    @traced('save_data')
+    def save_data(self):
+        """整体写出数据文件 (临时文件 + fsync + 原子重命名) 及其二进制副本，在写线程中调用
+
+        数据文件在上次读取或写出后被其他程序修改时不覆盖，抛出 ConflictError (见 on_data_file_changed)。
+        """
+        with self.data_lock:
+            saved = len(self._unsaved)
+            base = self.watcher.known if self.watcher is not None else None
+        copied = self.copy_data()
+        data = self.snapshot(copied)
+        if self.watcher is None:
+            written = write_json_atomic(self.data_file, data)
+        else:
+            written = self.watcher.write(lambda: write_json_atomic(self.data_file, data), base)
+        with self.data_lock:
+            del self._unsaved[:saved]
+        save_binary(self.data_file, *copied, written)
+
+    def on_data_file_changed(self, signature):
+        """数据文件被其他程序修改：在后台读取新版本 (按需加载时只读已加载的范围) 并与内存中的记录逐天比对"""
+        since = self.history.loaded_from if self.history is not None else None
+        with self.data_lock:
+            unsaved = list(self._unsaved)
+        copied = self.copy_data()
+        self._reload_future = self.stats_executor.submit(self._read_changes, since, copied, unsaved)
+        self._reload_future.request = (signature, self.data_version)
+        self.root.after(STATS_POLL_MS, self._poll_reload)
+
+    def _poll_reload(self):
+        future = self._reload_future
+        if not future.done():
+            self.root.after(STATS_POLL_MS, self._poll_reload)
+            return
+        self._reload_future = None
+        signature, version = future.request
+        try:
+            changes = future.result()
+        except (OSError, ValueError) as e:
+            if self._reload_failed != signature:
+                # 可能正被写到一半，下次检查时重试
+                self._reload_failed = signature
+                self.watcher.skip()
+                return
+            # 同一版本两次都读不了：保留当前数据，之后的保存会覆盖该文件
+            self._reload_failed = None
+            self.watcher.loaded(signature)
+            messagebox.showwarning('读取错误', f'数据文件已被其他程序修改，但无法读取：{e}\n将继续使用当前数据。')
+            return
+        self._reload_failed = None
+        if version != self.data_version:
+            # 读取期间本地又有变更，按最新的数据重新比对
+            self.on_data_file_changed(signature)
+            return
+        changed, rebased = self._apply_changes(signature, changes)
+        if changed:
+            self._calendar_marked = None
+            self.refresh_calendar_marks()
+            self.refresh_task_list()
+            self.show_statistics()
+        if rebased:
+            self.writer.request()
+            messagebox.showinfo('数据已更新', f'数据文件已被其他程序修改。已载入这些修改，'
+                                            f'本地尚未保存的 {rebased} 项变更已在其基础上重新保存。')
+
+    @traced('reload_data')
+    def _read_changes(self, since, copied, unsaved):
+        """读取数据文件并重放本地未写出的变更，返回与 copied 相比有变化的天 {天序号: 新记录} 等"""
+        data, last_seq, history = read_data(self.data_file, since)
+        table, daily_records = data['table'], data['daily_records']
+        unsaved, remap = rebase_entries(table, daily_records, unsaved)
+        resolve = table.resolve
+        new_days = {}
+        for date, records in daily_records.items():
             try:
-                with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # 初始化任务列表
-                self.tasks = []
-                task_dict = {}
-                
-                # 创建任务
-                for task in data.get("tasks", []):
-                    task_dict[task["name"]] = {"name": task["name"], "records": []}
-                    self.tasks.append(task_dict[task["name"]])
-                
-                # 加载每日记录
-                for date, records in data.get("daily_records", {}).items():
-                    for record in records:
-                        task_name = record["task"]
-                        if task_name in task_dict:
-                            # 转换回程序内部格式
-                            start_time = f"{date}T{record['start']}"
-                            end_time = f"{date}T{record['end']}"
-                            
-                            task_dict[task_name]["records"].append({
-                                "start": start_time,
-                                "end": end_time,
-                                "duration": record["duration"]
-                            })
-                            
-            except (json.JSONDecodeError, TypeError) as e:
-                messagebox.showerror('读取错误', f'读取数据文件失败，文件可能已损坏：{e}')
-                self.tasks = []
-            except Exception as e:
-                messagebox.showerror('读取错误', f'读取数据时发生未知错误：{e}')
-                self.tasks = []
+                day_base = day_seconds(date)
+            except (ValueError, TypeError):
+                continue
+            new_days[day_base // DAY_SECONDS] = parse_records(day_base, records, resolve)
+
+        # 内存中的记录按开始时间排序，各天用二分取出；只比较读入范围内的天
+        _, columns, _ = copied
+        starts = columns.starts
+        days = set(new_days)
+        if since is None:
+            days.update(start // DAY_SECONDS for start in starts)
+        else:
+            first = bisect.bisect_left(starts, day_seconds(since))
+            days.update(start // DAY_SECONDS for start in starts[first:])
+        changed = {}
+        for day in days:
+            lo = bisect.bisect_left(starts, day * DAY_SECONDS)
+            hi = bisect.bisect_left(starts, (day + 1) * DAY_SECONDS)
+            old = sorted((task_id, start, end, duration) for task_id, start, end, duration in
+                         zip(map(resolve, columns.task_ids[lo:hi]), starts[lo:hi], columns.ends[lo:hi],
+                             columns.durations[lo:hi]) if task_id is not None)
+            rows = new_days.get(day, [])
+            if sorted(rows) != old:
+                changed[day] = rows
+        return table, last_seq, history, changed, unsaved, remap
+
+    def _apply_changes(self, signature, changes):
+        """只替换有变化的天并增量更新汇总索引，返回 (数据是否有变化, 重新应用的本地变更数)"""
+        table, last_seq, history, changed, unsaved, remap = changes
+        with self.data_lock:
+            changed_tasks = table.to_data() != self.task_table.to_data()
+            self.task_table = table
+            self.history = history
+            self.journal_seq = last_seq
+            if self.journal is not None:
+                # 其他程序合并过更新的日志时，之后追加的条目序号须大于快照中的序号
+                self.journal.seq = max(self.journal.seq, last_seq)
+            for day, rows in changed.items():
+                old = self.store.replace_range(day * DAY_SECONDS, (day + 1) * DAY_SECONDS, rows)
+                if self.rollups is not None:
+                    for record in old:
+                        self.rollups.remove(*record)
+                    for record in rows:
+                        self.rollups.add(*record)
+            rebased = len(self._unsaved)
+            self._unsaved = unsaved
+            if changed or changed_tasks:
+                self.data_version += 1
+            # 与数据一起更新，写线程据此判断复制的数据是否已包含这次载入的内容
+            self.watcher.loaded(signature)
+        for task_id, new_id in remap.items():
+            self.timers.rekey(task_id, new_id)
+        if BINARY_SNAPSHOT and not rebased:
+            # 二进制快照已与新的 todo.json 不符；有本地变更时随下一次写入一起生成
+            rebuild_binary_async(self.data_file)
+        return bool(changed or changed_tasks), rebased
+
+    def import_data_files(self):
+        """把其他设备上的数据文件合并进当前数据：任务按名称取并集，重复的计时记录只保留一条
+
+        合并与重新读取在统计线程中进行，期间显示提示窗口 (模态) 以免本地再有变更。
+        """
+        if self.timers or self._reload_future is not None or self._profile_future is not None:
+            if self.timers:
+                messagebox.showwarning('提示', '请先结束进行中的计时再导入')
+            else:
+                messagebox.showinfo('提示', '正在载入数据文件，请稍后再导入')
+            return
+        paths = filedialog.askopenfilenames(title='选择要合并的数据文件',
+                                            filetypes=[('ClockToDo 数据', '*.json'), ('所有文件', '*.*')])
+        if not paths:
+            return
+        progress = tk.Toplevel(self.root)
+        progress.title('导入')
+        progress.resizable(False, False)
+        progress.transient(self.root)
+        tk.Label(progress, text='正在合并数据文件…', font=('微软雅黑', 11), padx=24, pady=16).pack()
+        progress.protocol('WM_DELETE_WINDOW', lambda: None)
+        progress.grab_set()
+        self._import_future = self.stats_executor.submit(self._import_files, list(paths))
+        self._import_future.progress = progress
+        self.root.after(STATS_POLL_MS, self._poll_import)
+
+    def _import_files(self, paths):
+        """在统计线程中合并数据文件并重新读取，返回 (合并报告, 读入的 Dataset)"""
+        report = self._merge_into_data(paths)
+        merged = Dataset(self.data_file)
+        merged.load_data()
+        return report, merged
+
+    def _poll_import(self):
+        future = self._import_future
+        if not future.done():
+            self.root.after(STATS_POLL_MS, self._poll_import)
+            return
+        self._import_future = None
+        future.progress.destroy()
+        try:
+            report, merged = future.result()
+        except (OSError, ValueError) as e:
+            messagebox.showerror('导入错误', f'合并数据文件失败：{e}')
+            return
+        except LoadError as e:
+            messagebox.showerror('读取错误', str(e))
+            return
+        previous_db = self.db
+        with self.data_lock:
+            for field in ('task_table', 'store', 'rollups', 'history', 'journal_seq', 'data_signature', 'db'):
+                setattr(self, field, getattr(merged, field))
+            self._unsaved.clear()
+            self._calendar_marked = None
+            self.data_version += 1
+        if previous_db is not None:
+            # 重新读取时打开了新的数据库连接
+            previous_db.close()
+        if self.watcher is not None:
+            self.watcher.loaded(self.data_signature)
+        self.refresh_task_list()
+        self.show_statistics()
+        message = (f"新增 {report['added_tasks']} 个任务，合并后共 {report['records']} 条记录，"
+                   f"去除重复 {report['duplicates']} 条")
+        if report['skipped']:
+            message += f"，跳过无效记录 {report['skipped']} 条"
+        if report['conflicts']:
+            names = '\n'.join('、'.join(conflict['names'].values()) for conflict in report['conflicts'][:10])
+            message += f"\n\n以下任务在不同文件中名称不同，已分别保留：\n{names}"
+        messagebox.showinfo('导入完成', message)
+
+    def _merge_into_data(self, paths):
+        """以当前数据为第一个输入调用 merge_files，写回数据文件 (SQLite 模式下写回数据库)"""
+        if self.db is not None:
+            with tempfile.TemporaryDirectory() as tmp:
+                current = os.path.join(tmp, 'current.json')
+                merged = os.path.join(tmp, 'merged.json')
+                write_json_atomic(current, self.db.export_data())
+                report = merge_files([current, *paths], merged)
+                with open(merged, 'r', encoding='utf-8') as f:
+                    self.db.import_data(json.load(f), replace=True)
+            return report
+        if self.writer is not None:
+            self.writer.flush()
+            error = self.writer.pop_error()
+            if error is not None:
+                raise OSError(f'保存当前数据失败：{error}')
+        reports = []
+
+        def merge():
+            if not os.path.exists(self.data_file):
+                write_json_atomic(self.data_file, self.snapshot())
+            reports.append(merge_files([self.data_file, *paths], self.data_file))
+            return file_signature(self.data_file)
+
+        # 经文件监视写入：与写线程的保存互斥，文件已被其他程序修改时抛出 ConflictError
+        if self.journal is None:
+            self.watcher.write(merge)
         else:
-            # 如果文件不存在，则初始化为空列表
-            self.tasks = []
+            # 写回时保留日志序号，未合并的日志不会被重复应用；期间不做日志合并
+            with self.journal.exclusive():
+                self.watcher.write(merge)
+        return reports[0]
+
+    def _refresh_profile_list(self):
+        self.profile_box.configure(values=list_profiles())
+
+    def new_profile(self):
+        """新建配置 (即 profiles/ 下的一个目录) 并切换过去"""
+        name = simpledialog.askstring('新建配置', '请输入配置名称 (如“学习”):')
+        if not name:
+            return
+        try:
+            name = check_name(name)
+            create_profile(name)
+        except (OSError, ValueError) as e:
+            messagebox.showwarning('错误', f'无法创建配置：{e}')
+            return
+        self.switch_profile(name)
+
+    def switch_profile(self, name):
+        """切换到配置 name：写出当前配置后把其数据留在缓存中；目标配置在缓存中时直接换入，否则读取"""
+        if name == self.profile_name:
+            return True
+        if (self.timers or self._reload_future is not None or self._profile_future is not None
+                or self._import_future is not None):
+            if self.timers:
+                messagebox.showwarning('提示', '请先结束进行中的计时再切换配置')
+            else:
+                messagebox.showinfo('提示', '正在载入数据文件，请稍后再切换')
+            self.profile_var.set(self.profile_name)
+            return False
+        error = self._close_storage()
+        if error is not None:
+            messagebox.showerror('保存错误', f'保存数据失败，未切换配置：{error}')
+            self.profile_var.set(self.profile_name)
+            return False
+        self.timers.close()
+        target = self.profiles.pop(name)
+        if target is None:
+            # 在锁外读取，统计线程不必等待读取 (及读取失败时的提示)
+            target = ProfileData(name, create_profile(name))
+            try:
+                target.load_data()
+            except LoadError as e:
+                messagebox.showerror('读取错误', str(e))
+        self._failed_profiles.pop(name, None)
+        with self.data_lock:
+            if self.journal is not None:
+                # 之后追加的日志序号须接着本次会话已写出的序号
+                self.journal_seq = self.journal.seq
+            if self.watcher is not None:
+                self.data_signature = self.watcher.known
+            current = ProfileData.take(self)
+            target.give(self)
+            self.profile_name = name
+            self._calendar_marked = None
+            self.data_version += 1
+        self.profiles.put(current.name, current)
+        # 缓存期间文件若被外部修改，新的文件监视首次检查时按差异增量载入
+        self._open_storage()
+        self.timers.checkpoint_path = timers_path(self.data_file)
+        self.profile_var.set(name)
+        self._set_title()
+        self.refresh_task_list()
+        self.refresh_calendar_marks()
+        self.show_statistics()
+        # 该配置上次未结束的计时
+        self.root.after_idle(self.recover_timers)
+        return True
+
+    def _combined_view(self, since=None):
+        """合并视图的数据源：当前配置直接使用，其他配置取自缓存
+
+        未缓存、文件已变化或需要读入 since 之前历史的配置交给统计线程读取，此时返回 None，
+        读完后由 _poll_profiles 放进缓存并重新统计。读取失败的配置只提示一次，文件不变时之后跳过。
+        """
+        if since:
+            self.ensure_history(since)
+        sources, pending = [(self.profile_name, self)], []
+        for name in list_profiles():
+            if name == self.profile_name:
+                continue
+            path = profile_path(name)
+            signature = file_signature(path)
+            if name in self._failed_profiles and self._failed_profiles[name] == signature:
+                continue
+            profile = self.profiles.get(name)
+            if profile is None or profile.data_signature != signature:
+                pending.append((name, path, None))
+            elif since and profile.history is not None and since < profile.history.loaded_from:
+                pending.append((name, path, profile))
+            else:
+                sources.append((name, profile))
+        if pending:
+            if self._profile_future is None:
+                self._profile_future = self.stats_executor.submit(_load_profiles, pending, since)
+                self.root.after(STATS_POLL_MS, self._poll_profiles)
+            return None
+        key = tuple((name, getattr(source, 'serial', 0), source.data_version) for name, source in sources)
+        if self._combined is None or self._combined.key != key:
+            self._combined = CombinedView(sources, key)
+        return self._combined
+
+    def _poll_profiles(self):
+        future = self._profile_future
+        if not future.done():
+            self.root.after(STATS_POLL_MS, self._poll_profiles)
+            return
+        self._profile_future = None
+        try:
+            loaded, failed = future.result()
+        except Exception as e:
+            messagebox.showerror('读取错误', f'读取其他配置失败：{e}')
+            return
+        for name, profile in loaded:
+            self.profiles.put(name, profile)
+        if failed:
+            for name, signature, _ in failed:
+                self._failed_profiles[name] = signature
+            messagebox.showerror('读取错误', '以下配置读取失败，合并视图中已跳过：\n' +
+                                 '\n'.join(f'{name}：{error}' for name, _, error in failed))
+        if self.combined_var.get():
+            self.show_statistics(self._deferred_force_day)
+
+    def on_close(self):
+        """关闭窗口：进行中的计时留作检查点，写出尚未落盘的数据并释放文件后退出"""
+        self.timers.close()
+        error = self._close_storage()
+        if error is not None:
+            messagebox.showerror('保存错误', f'保存数据失败：{error}')
+        if self.db is not None:
+            self.db.close()
+        self.profiles.close()
+        self.stats_executor.shutdown(wait=False)
+        self.root.destroy()
+
+    def _save_after_reload(self):
+        """关闭窗口时同步完成 on_data_file_changed 的流程并写出，返回写入失败的异常"""
+        try:
+            signature = file_signature(self.data_file)
+            with self.data_lock:
+                unsaved = list(self._unsaved)
+            since = self.history.loaded_from if self.history is not None else None
+            self._apply_changes(signature, self._read_changes(since, self.copy_data(), unsaved))
+            self.save_data()
+        except Exception as e:
+            return e
+        return None
+
+
+def _load_profiles(pending, since):
+    """在统计线程中读取合并视图所需的配置 [(名称, 路径, 已缓存的 ProfileData 或 None)]
+
+    返回 ([(名称, ProfileData)], [(名称, 文件签名, 错误)])；已缓存的配置只读入 since 之后的历史。
+    """
+    loaded, failed = [], []
+    for name, path, profile in pending:
+        fresh = profile is None
+        if fresh:
+            profile = ProfileData(name, path)
+        try:
+            if fresh:
+                profile.load_data()
+            if since:
+                profile.ensure_history(since)
+        except LoadError as e:
+            failed.append((name, profile.data_signature, str(e)))
+            if fresh:
+                profile.close()
+            continue
+        loaded.append((name, profile))
+    return loaded, failed
 
 
+def _increasing_subsequence(items, position):
+    """items 中按 position 递增的一个最长子序列 (O(n log n))"""
+    tails, tail_items, parents = [], [], {}
+    for item in items:
+        i = bisect.bisect_left(tails, position[item])
+        parents[item] = tail_items[i - 1] if i else None
+        if i == len(tails):
+            tails.append(position[item])
+            tail_items.append(item)
+        else:
+            tails[i] = position[item]
+            tail_items[i] = item
+    result = []
+    item = tail_items[-1] if tail_items else None
+    while item is not None:
+        result.append(item)
+        item = parents[item]
+    return result[::-1]
+
 
 def main():
+    if sys.argv[1:2] == ['report']:
+        # clocktodo report：无界面报表，不创建窗口
+        import report
+        sys.exit(report.main_cli(sys.argv[2:]))
+    if sys.argv[1:2] == ['serve']:
+        # clocktodo serve：只运行本地统计接口
+        import stats_server
+        sys.exit(stats_server.main_cli(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description='ClockToDo 番茄 ToDo')
+    parser.add_argument('--startup-profile', action='store_true',
+                        help='输出启动各阶段耗时 (首屏目标 %d ms)' % StartupProfile.FIRST_PAINT_TARGET_MS)
+    parser.add_argument('--trace', nargs='?', const='', metavar='文件',
+                        help='记录热点路径耗时；给出文件时退出前写出 Chrome trace JSON')
+    parser.add_argument('--trace-overlay', action='store_true', help='显示最近各操作耗时的调试浮窗 (隐含 --trace)')
+    parser.add_argument('--serve', nargs='?', type=int, const=0, metavar='端口',
+                        help='同时在 127.0.0.1 上提供只读统计接口 (见 stats_server.py)')
+    parser.add_argument('--profile', default=os.environ.get('CLOCKTODO_PROFILE', DEFAULT_PROFILE), metavar='名称',
+                        help=f'使用的数据配置 (默认“{DEFAULT_PROFILE}”，即 {profile_path(DEFAULT_PROFILE)}；见 profiles.py)')
+    args = parser.parse_args()
+    try:
+        profile_name = check_name(args.profile)
+        create_profile(profile_name)
+    except (OSError, ValueError) as e:
+        parser.error(f'无法使用配置：{e}')
+
+    tracing.enable_from_env()
+    if args.trace is not None or args.trace_overlay:
+        tracing.enable(args.trace)
+
     root = tk.Tk()
-    app = ClockToDoApp(root)
+    app = ClockToDoApp(root, StartupProfile(args.startup_profile), profile_name)
+    if args.trace_overlay or os.environ.get('CLOCKTODO_TRACE_OVERLAY') == '1':
+        tracing.TraceOverlay(root, tracing.enable())
+    server = None
+    port = args.serve if args.serve is not None else os.environ.get('CLOCKTODO_SERVE_PORT')
+    if port is not None:
+        # 统计接口在后台线程中自行读取 (启动时所用配置的) 数据文件，界面的每次保存都会使其缓存失效
+        import stats_server
+        server = stats_server.start_background(app.data_file, int(port) or stats_server.DEFAULT_PORT)
     root.mainloop()
+    if server is not None:
+        server.stop()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""合并多台设备上的数据文件：按日期流式 k 路归并，去除重复的计时记录
+
+    python merge.py 本机/todo.json 笔记本/todo.json [更多文件 ...] -o merged.json [--report 报告.json]
+
+- 输入为当前的 {"tasks", "daily_records"} 快照 (记录按 id 或按名称引用任务均可)，
+  同名的 `.journal` 中尚未合并的日志一并计入。旧版任务列表格式请先用 migrate.py 迁移。
+- 任务按名称取并集：第一个文件的任务保留原 id，其他文件中新出现的任务依次追加。
+  同一 id 在不同文件中名称不同 (多半是在某台设备上改过名) 时作为冲突列在报告中，两者各自保留。
+- 各文件的 daily_records 按日期倒序保存，用堆对 N 个流按日期归并，每次只在内存中
+  保留一天的记录；同一天中 (任务, 开始, 结束) 相同的记录只保留一条。
+- 输出与第一个输入是同一文件时 (主程序中的“导入”)，保留其日志序号，未合并的日志不会被重复应用。
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import date
+
+from migrate import write_snapshot_stream
+from stats import clock_seconds
+from storage import JsonStream, SnapshotReader, legacy_name_ids, replay_journal
+from tasks import TaskTable
+
+# 报告中最多列出的冲突条数
+MAX_CONFLICTS = 1000
+
+
+def _clock(seconds):
+    return f'{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}'
+
+
+class Source:
+    """一个输入文件：任务表 (已重放同名日志中的任务变更) 与按日期倒序的逐天记录流"""
+
+    def __init__(self, path):
+        self.path = path
+        if JsonStream(path).first_char() != '{':
+            raise ValueError(f'{path} 不是当前的快照格式，请先用 migrate.py 迁移')
+        header, journal_seq = self._read_header()
+        self.table = TaskTable.from_data(header)
+        # 旧版快照中记录按名称引用任务
+        self.name_ids = legacy_name_ids(header)
+        # 同名日志中尚未合并的记录 (一般只有最近几天)
+        self.journal_days = {}
+        self.last_seq = replay_journal(path, self.table, self.journal_days, journal_seq)
+        self.records = 0
+
+    def _read_header(self):
+        # 任务表一般写在 daily_records 之前，读到第一天即可；写在后面时先完整扫一遍
+        reader = SnapshotReader(self.path)
+        stream = reader.days()
+        next(stream, None)
+        stream.close()
+        if 'tasks' not in reader.header and not reader.exhausted:
+            reader = SnapshotReader(self.path)
+            for _ in reader.days():
+                pass
+        return reader.header, reader.journal_seq
+
+    def resolve(self, task):
+        """记录中的任务 (id 或旧版的名称) -> 现存任务名，任务已删除时为 None"""
+        if isinstance(task, str):
+            task = self.name_ids.get(task) if self.name_ids else self.table.index.get(task)
+        task_id = self.table.resolve(task) if task is not None else None
+        return self.table.names[task_id] if task_id is not None else None
+
+    def days(self):
+        """按日期倒序逐天产出 (date, records)，快照与日志中的同一天分两次产出"""
+        return heapq.merge(self._snapshot_days(), sorted(self.journal_days.items(), reverse=True),
+                           key=lambda item: item[0], reverse=True)
+
+    def _snapshot_days(self):
+        previous = None
+        for day, records in SnapshotReader(self.path).days():
+            if previous is not None and day >= previous:
+                raise ValueError(f'{self.path} 的 daily_records 未按日期倒序保存，请先用 migrate.py 迁移')
+            previous = day
+            yield day, records
+
+
+class Merge:
+    """合并结果：任务表、统计与冲突"""
+
+    def __init__(self, sources):
+        self.sources = sources
+        self.table = TaskTable()
+        self.conflicts = []
+        self.report = {'files': [], 'days': 0, 'records': 0, 'duplicates': 0, 'skipped': 0, 'tasks': 0,
+                       'added_tasks': 0, 'conflicts': self.conflicts}
+        self._union_tasks()
+        # 各输入中的任务 (id 或名称) -> 合并后的 id
+        self._task_maps = [{} for _ in sources]
+
+    def _union_tasks(self):
+        base = self.sources[0].table
+        for task_id in base:
+            self.table.add(base.names[task_id], task_id)
+        self.table.next_id = max(self.table.next_id, base.next_id)
+        for source in self.sources[1:]:
+            for task_id in source.table:
+                name = source.table.names[task_id]
+                if name not in self.table.index:
+                    self.table.add(name)
+                    self.report['added_tasks'] += 1
+                base_name = base.names.get(task_id)
+                if (base_name is not None and base_name != name and name not in base.index
+                        and base_name not in source.table.index and len(self.conflicts) < MAX_CONFLICTS):
+                    self.conflicts.append({'id': task_id, 'names': {self.sources[0].path: base_name, source.path: name}})
+        self.report['tasks'] = len(self.table.names)
+
+    def _task_id(self, index, task):
+        mapping = self._task_maps[index]
+        if task not in mapping:
+            name = self.sources[index].resolve(task)
+            mapping[task] = self.table.index[name] if name is not None else None
+        return mapping[task]
+
+    @staticmethod
+    def _tagged(index, source):
+        for day, records in source.days():
+            yield day, index, records
+
+    def days(self):
+        """按日期倒序产出合并去重后的 (date, records)，同一天的记录按开始时间排序"""
+        streams = [self._tagged(i, source) for i, source in enumerate(self.sources)]
+        merged = heapq.merge(*streams, key=lambda item: item[0], reverse=True)
+        for day, group in itertools.groupby(merged, key=lambda item: item[0]):
+            try:
+                date.fromisoformat(day)
+            except (ValueError, TypeError):
+                self.report['skipped'] += sum(len(records) for _, _, records in group)
+                continue
+            seen = set()
+            rows = []
+            for _, index, records in group:
+                self.sources[index].records += len(records)
+                for record in records:
+                    try:
+                        task_id = self._task_id(index, record['task'])
+                        start, end = clock_seconds(record['start']), clock_seconds(record['end'])
+                        duration = int(float(record['duration']))
+                    except (KeyError, ValueError, TypeError, AttributeError):
+                        task_id = None
+                    if task_id is None:
+                        self.report['skipped'] += 1
+                        continue
+                    key = (task_id, start, end)
+                    if key in seen:
+                        self.report['duplicates'] += 1
+                        continue
+                    seen.add(key)
+                    rows.append((start, task_id, end, duration))
+            if not rows:
+                continue
+            rows.sort()
+            self.report['days'] += 1
+            self.report['records'] += len(rows)
+            yield day, [{'task': task_id, 'start': _clock(start), 'end': _clock(end), 'duration': duration}
+                        for start, task_id, end, duration in rows]
+
+
+def merge_files(paths, output_path):
+    """合并 paths 中的数据文件并写到 output_path，返回报告"""
+    t0 = time.perf_counter()
+    sources = [Source(path) for path in paths]
+    merge = Merge(sources)
+    # 写回第一个输入时保留其日志序号，旁边的日志不会再被重放一次
+    same = os.path.exists(output_path) and os.path.samefile(output_path, paths[0])
+    write_snapshot_stream(output_path, merge.table, merge.days(), sources[0].last_seq if same else 0)
+    merge.report['files'] = [{'path': s.path, 'tasks': len(s.table.names), 'records': s.records} for s in sources]
+    merge.report['output'] = output_path
+    merge.report['seconds'] = round(time.perf_counter() - t0, 3)
+    return merge.report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ClockToDo 数据合并：把多台设备上的数据文件合并为一个')
+    parser.add_argument('files', nargs='+', help='待合并的数据文件，第一个文件的任务 id 保持不变')
+    parser.add_argument('-o', '--output', required=True, help='输出文件 (可以是第一个输入文件)')
+    parser.add_argument('--report', help='JSON 报告输出路径')
+    args = parser.parse_args()
+
+    try:
+        report = merge_files(args.files, args.output)
+    except (OSError, ValueError) as e:
+        print(f'合并失败：{e}', file=sys.stderr)
+        return 1
+    print(f"合并完成：{len(args.files)} 个文件，{report['tasks']} 个任务 (新增 {report['added_tasks']} 个)，"
+          f"{report['records']} 条记录，去除重复 {report['duplicates']} 条，跳过 {report['skipped']} 条，"
+          f"用时 {report['seconds']} 秒", file=sys.stderr)
+    for conflict in report['conflicts']:
+        names = '、'.join(f'{path}: {name}' for path, name in conflict['names'].items())
+        print(f"任务 id {conflict['id']} 名称不一致 ({names})，已分别保留", file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
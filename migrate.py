@@ -0,0 +1,381 @@
+"""数据迁移：把旧版任务列表、当前快照或追加日志统一迁移为当前的按天记录格式
+
+    python migrate.py [文件 ...] [--workers N] [--output-dir 目录] [--report 报告.json] [--dry-run]
+
+- 自动识别输入格式：旧版 [{"name", "records"}] 列表、{"tasks", "daily_records"} 快照
+  (记录按名称或按 id 引用任务)，或 `<名>.journal` 追加日志 (重放到同名快照
+  `<名>.json` 上后写出该快照)。输出统一为记录按任务 id 引用任务的版本 2 快照。
+- 流式读取输入并逐条校验记录，无效记录跳过并写入报告。
+- 幂等：已是当前格式且无需修正的文件不会被改写。
+- 原地迁移时先把原文件备份为 `<文件>.bak` (已存在则依次用 .bak.1、.bak.2 …)，
+  新文件经临时文件 + fsync + 原子重命名写入。
+- 多个文件由进程池并行处理；报告为 JSON，包含各文件的格式、状态、跳过的记录与吞吐量。
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+from storage import FORMAT_VERSION, JsonStream, SnapshotReader, read_data
+from tasks import TaskTable
+
+# 报告中每个文件最多列出的问题条数
+MAX_ISSUES = 1000
+
+
+def detect_format(path):
+    """返回 'legacy' / 'current' / 'journal'，无法识别时返回 None"""
+    first = JsonStream(path).first_char()
+    if first == '[':
+        return 'legacy'
+    if first != '{':
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        line = f.readline(1 << 16)
+    try:
+        entry = json.loads(line)
+    except json.JSONDecodeError:
+        return 'current'
+    return 'journal' if isinstance(entry, dict) and 'op' in entry and 'seq' in entry else 'current'
+
+
+def _clock(value):
+    """校验并规范为 'HH:MM:SS'"""
+    return datetime.strptime(value[:8], '%H:%M:%S').strftime('%H:%M:%S')
+
+
+def _duration(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f'无效时长 {value!r}')
+    return value
+
+
+class Migration:
+    """单个文件的迁移结果：任务表、按天记录 (按任务 id 引用任务) 与报告"""
+
+    def __init__(self, path, fmt, output_path):
+        self.path = path
+        self.output_path = output_path
+        self.table = TaskTable()
+        self.days = {}
+        self.journal_seq = 0
+        # 输出与输入是否不同；为 False 时原地迁移不改写文件
+        self.changed = False
+        self.report = {'path': path, 'format': fmt, 'tasks': 0, 'records': 0, 'skipped': 0, 'issues': []}
+
+    def issue(self, reason, **where):
+        self.report['skipped'] += 1
+        if len(self.report['issues']) < MAX_ISSUES:
+            self.report['issues'].append(dict(where, reason=reason))
+
+    def add_task(self, task):
+        """登记一个任务并返回其 id，无效任务返回 None；旧格式的任务 (无 id) 按顺序编号"""
+        name = task.get('name') if isinstance(task, dict) else None
+        if not isinstance(name, str) or not name:
+            self.changed = True
+            self.issue('无效任务名', task=str(name))
+            return None
+        task_id = task.get('id')
+        table = self.table
+        if name in table.index:
+            # 重名任务合并为一个，其 id 作为别名保留
+            self.changed = True
+            existing = table.index[name]
+            if isinstance(task_id, int) and task_id not in table.names and task_id not in table.aliases:
+                table.aliases[task_id] = existing
+                table.next_id = max(table.next_id, task_id + 1)
+            return existing
+        if task_id is not None and (not isinstance(task_id, int) or isinstance(task_id, bool) or task_id < 1
+                                    or task_id in table.names or task_id in table.aliases):
+            self.changed = True
+            self.issue('无效任务 id，已重新编号', task=name)
+            task_id = None
+        return table.add(name, task_id)
+
+    def add_header(self, header):
+        """快照的顶层键：任务列表、合并别名与 next_id"""
+        if header.get('version', 1) < FORMAT_VERSION:
+            self.changed = True
+        for task in header.get('tasks', []):
+            self.add_task(task)
+        for alias, target in (header.get('aliases') or {}).items():
+            try:
+                alias = int(alias)
+            except ValueError:
+                alias = None
+            if alias is None or target not in self.table.names or alias in self.table.names:
+                self.changed = True
+                self.issue('无效合并别名', alias=str(alias), target=str(target))
+                continue
+            self.table.aliases[alias] = target
+            self.table.next_id = max(self.table.next_id, alias + 1)
+        next_id = header.get('next_id')
+        if isinstance(next_id, int) and next_id > self.table.next_id:
+            self.table.next_id = next_id
+
+    def _record_task(self, task):
+        """记录中的任务引用 -> 任务 id；名称 (旧格式) 未登记时补登该任务"""
+        if isinstance(task, str) and task:
+            task_id = self.table.index.get(task)
+            if task_id is None:
+                # 任务列表中缺失的任务补回，否则这些记录在程序中不可见
+                self.changed = True
+                task_id = self.add_task({'name': task})
+            return task_id
+        if isinstance(task, int) and not isinstance(task, bool) and self.table.resolve(task) is not None:
+            return task
+        raise ValueError(f'未知任务 {task!r}')
+
+    def add_record(self, day, clean, original=None):
+        if original is not None and original != clean:
+            self.changed = True
+        self.days.setdefault(day, []).append(clean)
+        self.report['records'] += 1
+
+    def add_day(self, day, records):
+        """快照中的一天"""
+        try:
+            day = date.fromisoformat(day).isoformat()
+        except (TypeError, ValueError):
+            self.changed = True
+            self.issue('无效日期', date=day, count=len(records) if isinstance(records, list) else None)
+            return
+        if not isinstance(records, list):
+            self.changed = True
+            self.issue('记录不是列表', date=day)
+            return
+        for i, record in enumerate(records):
+            try:
+                clean = {
+                    'task': self._record_task(record['task']),
+                    'start': _clock(record['start']),
+                    'end': _clock(record['end']),
+                    'duration': _duration(record['duration']),
+                }
+            except (KeyError, TypeError, ValueError) as e:
+                self.changed = True
+                self.issue(f'无效记录: {e}', date=day, index=i)
+                continue
+            self.add_record(day, clean, record)
+
+    def add_legacy_task(self, task):
+        """旧格式中的一个任务及其 ISO 时间记录"""
+        task_id = self.add_task(task)
+        if task_id is None:
+            return
+        for i, record in enumerate(task.get('records') or []):
+            try:
+                start = datetime.fromisoformat(record['start'])
+                end = datetime.fromisoformat(record['end'])
+                duration = record.get('duration')
+                if duration is None:
+                    duration = int((end - start).total_seconds())
+                clean = {
+                    'task': task_id,
+                    'start': start.strftime('%H:%M:%S'),
+                    'end': end.strftime('%H:%M:%S'),
+                    'duration': _duration(duration),
+                }
+            except (KeyError, TypeError, ValueError) as e:
+                self.issue(f'无效记录: {e}', task=task['name'], index=i)
+                continue
+            self.add_record(start.strftime('%Y-%m-%d'), clean)
+
+
+def _read_legacy(migration):
+    migration.changed = True
+    for task in JsonStream(migration.path).items():
+        migration.add_legacy_task(task)
+
+
+def _read_current(migration):
+    reader = SnapshotReader(migration.path)
+    days = reader.days()
+    first = next(days, None)
+    if first is not None and not {'tasks', 'next_id'} <= reader.header.keys():
+        # 任务表 (或 next_id) 写在 daily_records 之后：先读完各天，拿到全部顶层键后再解析记录，
+        # 输出时改为任务表在前的标准顺序
+        migration.changed = True
+        days = [first, *days]
+    elif first is not None:
+        days = itertools.chain([first], days)
+    else:
+        days = []
+    migration.add_header(reader.header)
+    previous = None
+    for day, records in days:
+        # 日期须按倒序保存 (按需加载依赖这一点)
+        if previous is not None and str(day) >= previous:
+            migration.changed = True
+        previous = str(day)
+        migration.add_day(day, records)
+    migration.journal_seq = reader.journal_seq
+
+
+def _read_journal(migration):
+    # 日志需要重放到快照上，按 read_data 的方式整体读取
+    snapshot = migration.output_path
+    snapshot_seq = SnapshotReader(snapshot).journal_seq if os.path.exists(snapshot) else 0
+    data, last_seq, _ = read_data(snapshot)
+    table = data['table']
+    migration.add_header(dict(table.to_data(), version=FORMAT_VERSION))
+    for day, records in sorted(data['daily_records'].items(), reverse=True):
+        migration.add_day(day, records)
+    migration.journal_seq = last_seq
+    if last_seq > snapshot_seq or not os.path.exists(snapshot):
+        migration.changed = True
+
+
+def _journal_snapshot(path):
+    base = path[:-len('.old')] if path.endswith('.old') else path
+    return os.path.splitext(base)[0] + '.json'
+
+
+def _backup(path):
+    backup, n = f'{path}.bak', 0
+    while os.path.exists(backup):
+        n += 1
+        backup = f'{path}.bak.{n}'
+    shutil.copy2(path, backup)
+    return backup
+
+
+def _dumps(value, indent):
+    # 与 json.dump(indent=2) 的嵌套缩进一致
+    return json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n' + ' ' * indent)
+
+
+def write_snapshot(path, table, days, journal_seq=0):
+    """逐天写出快照 (日期倒序，与 storage.snapshot_data 的键顺序一致)，经临时文件 + fsync + 原子重命名替换目标文件"""
+    write_snapshot_stream(path, table, ((day, days[day]) for day in sorted(days, reverse=True)), journal_seq)
+
+
+def write_snapshot_stream(path, table, days, journal_seq=0):
+    """同 write_snapshot，days 为按日期倒序产出 (date, records) 的可迭代对象，边产出边写入"""
+    tmp_path = f'{path}.tmp'
+    header = dict({'version': FORMAT_VERSION}, **table.to_data())
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for key, value in header.items():
+            f.write(f'\n  {json.dumps(key)}: ' + _dumps(value, 2) + ',')
+        f.write('\n  "daily_records": {')
+        empty = True
+        for day, records in days:
+            f.write(('' if empty else ',') + f'\n    {json.dumps(day)}: ' + _dumps(records, 4))
+            empty = False
+        f.write('}' if empty else '\n  }')
+        if journal_seq:
+            f.write(f',\n  "journal_seq": {journal_seq}')
+        f.write('\n}')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def migrate_file(path, output_dir=None, dry_run=False):
+    """迁移单个文件并返回其报告"""
+    t0 = time.perf_counter()
+    fmt = None
+    try:
+        fmt = detect_format(path)
+        if fmt is None:
+            raise ValueError('无法识别的文件格式')
+        migration = Migration(path, fmt, _journal_snapshot(path) if fmt == 'journal' else path)
+        {'legacy': _read_legacy, 'current': _read_current, 'journal': _read_journal}[fmt](migration)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return {'path': path, 'format': fmt, 'status': 'failed', 'error': str(e),
+                'seconds': round(time.perf_counter() - t0, 3)}
+
+    report = migration.report
+    report['tasks'] = len(migration.table)
+    output = migration.output_path
+    if output_dir:
+        output = os.path.join(output_dir, os.path.basename(output))
+    if not migration.changed and output == migration.output_path:
+        report['status'] = 'unchanged'
+    elif dry_run:
+        report['status'] = 'would_migrate'
+    else:
+        try:
+            if output == migration.output_path and os.path.exists(output):
+                report['backup'] = _backup(output)
+            write_snapshot(output, migration.table, migration.days, migration.journal_seq)
+        except OSError as e:
+            report.update(status='failed', error=str(e))
+        else:
+            report.update(status='migrated', output=output)
+
+    seconds = time.perf_counter() - t0
+    size = os.path.getsize(path)
+    report.update(bytes=size, seconds=round(seconds, 3),
+                  records_per_second=round(report['records'] / seconds) if seconds else None,
+                  mb_per_second=round(size / seconds / 2**20, 2) if seconds else None)
+    return report
+
+
+def migrate_files(paths, workers=None, output_dir=None, dry_run=False):
+    """迁移多个文件，多于一个文件时用进程池并行处理；返回完整报告"""
+    t0 = time.perf_counter()
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            files = list(pool.map(migrate_file, paths, [output_dir] * len(paths), [dry_run] * len(paths)))
+    else:
+        files = [migrate_file(path, output_dir, dry_run) for path in paths]
+
+    seconds = time.perf_counter() - t0
+    records = sum(f.get('records', 0) for f in files)
+    statuses = {}
+    for f in files:
+        statuses[f['status']] = statuses.get(f['status'], 0) + 1
+    return {
+        'files': files,
+        'summary': {
+            'files': len(files),
+            'statuses': statuses,
+            'records': records,
+            'skipped': sum(f.get('skipped', 0) for f in files),
+            'bytes': sum(f.get('bytes', 0) for f in files),
+            'workers': workers,
+            'seconds': round(seconds, 3),
+            'records_per_second': round(records / seconds) if seconds else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ClockToDo 数据迁移：统一转换为当前的按天记录格式')
+    parser.add_argument('files', nargs='*', default=['todo.json'], help='待迁移的文件 (默认 todo.json)')
+    parser.add_argument('--workers', type=int, default=None, help='并行进程数 (默认 CPU 核数)')
+    parser.add_argument('--output-dir', help='写到该目录下而非原地替换')
+    parser.add_argument('--report', default='-', help='JSON 报告输出路径，- 表示标准输出')
+    parser.add_argument('--dry-run', action='store_true', help='只校验并生成报告，不写文件')
+    args = parser.parse_args()
+
+    report = migrate_files(args.files, args.workers, args.output_dir, args.dry_run)
+    for f in report['files']:
+        line = f"{f['path']}: {f['status']}"
+        if f['status'] == 'failed':
+            line += f" ({f['error']})"
+        else:
+            line += f" [{f['format']}] {f['records']} 条记录，跳过 {f['skipped']} 条"
+        print(line, file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report == '-':
+        print(text)
+    else:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    return 1 if report['summary']['statuses'].get('failed') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""命名的数据配置 (如“工作”“学习”“项目”)：每个配置一套独立的数据文件，可在界面与命令行中切换
+
+    python main.py --profile 学习            # 或设置 CLOCKTODO_PROFILE=学习
+    python main.py report --profile 学习 --period 本月
+    python main.py serve --profile 学习
+
+默认配置仍使用工作目录下的 todo.json；其他配置的数据文件为 profiles/<名称>/todo.json，
+日志、二进制快照、计时检查点与数据库 (todo.journal / todo.bin / todo.timers / todo.db) 随之放在同一目录。
+
+最近用过的几个配置已解析的数据 (任务表、列式记录、汇总索引) 保存在 ProfileCache 中，
+最多 CLOCKTODO_PROFILE_CACHE 个 (默认 4)，按最近使用淘汰；切换回来时无需重新读取与解析。
+各配置的数据与合并视图都是 dataset.Dataset，不依赖界面。
+"""
+import itertools
+import os
+from collections import OrderedDict
+
+from dataset import Dataset
+from stats import Rollups
+
+DEFAULT_PROFILE = '默认'
+PROFILES_DIR = 'profiles'
+DATA_NAME = 'todo.json'
+# 缓存的非当前配置个数上限
+CACHE_SIZE = int(os.environ.get('CLOCKTODO_PROFILE_CACHE', 4))
+# 随配置切换的 Dataset 属性 (界面与 ProfileData 之间交换)：解析后的数据及其对应的文件版本
+STATE_FIELDS = ('data_file', 'task_table', 'store', 'rollups', 'history', 'journal_seq', 'data_signature', '_unsaved', 'db')
+
+
+def check_name(name):
+    """配置名称即目录名：去掉首尾空白后返回，不能为空或含路径分隔符"""
+    name = (name or '').strip()
+    if not name or name in ('.', '..') or any(c in name for c in '/\\:'):
+        raise ValueError(f'无效的配置名称：{name!r}')
+    return name
+
+
+def profile_path(name):
+    """配置 name 的数据文件路径"""
+    name = check_name(name)
+    if name == DEFAULT_PROFILE:
+        return DATA_NAME
+    return os.path.join(PROFILES_DIR, name, DATA_NAME)
+
+
+def list_profiles():
+    """默认配置在前，其余按名称排序"""
+    try:
+        names = sorted(entry.name for entry in os.scandir(PROFILES_DIR)
+                       if entry.is_dir() and entry.name != DEFAULT_PROFILE)
+    except OSError:
+        names = []
+    return [DEFAULT_PROFILE, *names]
+
+
+def create_profile(name):
+    """建立配置目录 (已存在时不报错)，返回数据文件路径"""
+    path = profile_path(name)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return path
+
+
+class ProfileCache:
+    """非当前配置的已解析数据 {名称: 数据}，超过 size 个时淘汰最久未用的
+
+    数据对象需提供 close() (释放数据库连接等)，被淘汰或 pop 以外的方式移出时调用。
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+
+    def __contains__(self, name):
+        return name in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def values(self):
+        return list(self._items.values())
+
+    def get(self, name):
+        item = self._items.get(name)
+        if item is not None:
+            self._items.move_to_end(name)
+        return item
+
+    def put(self, name, item):
+        old = self._items.pop(name, None)
+        if old is not None and old is not item:
+            old.close()
+        self._items[name] = item
+        while len(self._items) > max(self.size, 0):
+            _, evicted = self._items.popitem(last=False)
+            evicted.close()
+
+    def pop(self, name):
+        """取出 name 的数据 (交由调用方使用，不关闭)，不在缓存中时为 None"""
+        return self._items.pop(name, None)
+
+    def close(self):
+        for item in self._items.values():
+            item.close()
+        self._items.clear()
+
+
+class ProfileData(Dataset):
+    """一个非当前配置的已解析数据，不创建窗口：放在 ProfileCache 中，也是合并视图的数据源
+
+    切换配置时与界面交换 STATE_FIELDS 中的属性；读取与按需读入历史即 Dataset 的 load_data / ensure_history。
+    """
+    _serials = itertools.count(1)
+
+    def __init__(self, name, data_file=None):
+        super().__init__(data_file)
+        self.name = name
+        # 区分先后读入的同一配置，合并视图据此判断是否需要重新合并
+        self.serial = next(self._serials)
+        self._unsaved = []
+
+    @classmethod
+    def take(cls, app):
+        """把界面当前配置的数据移入新的 ProfileData (调用方持 app.data_lock)"""
+        profile = cls(app.profile_name)
+        for field in STATE_FIELDS:
+            setattr(profile, field, getattr(app, field))
+        return profile
+
+    def give(self, app):
+        """把数据换入界面，成为当前配置"""
+        for field in STATE_FIELDS:
+            setattr(app, field, getattr(self, field))
+
+
+class CombinedView(Dataset):
+    """合并视图：各配置的汇总索引按 (配置, 任务) 相加，不拼接各配置的原始记录
+
+    任务显示为“配置/任务”；自定义范围同样由按天的汇总查询，最细到天。
+    合并在统计线程中首次用到时进行，代价与各配置的汇总桶数成正比，与记录数无关。
+    """
+
+    def __init__(self, sources, key):
+        super().__init__()
+        # [(配置名, 当前配置的 Dataset)]，第一个为当前配置
+        self.sources = sources
+        self.key = key
+        # 配置名 -> {该配置中的任务 id: 合并后的 id}
+        self.task_maps = {}
+
+    def _merge(self):
+        rollups = Rollups()
+        for name, source in self.sources:
+            with source.data_lock:
+                table = source.task_table
+                ids = self.task_maps[name] = {}
+                for task_id in table:
+                    ids[task_id] = self.task_table.add(f'{name}/{table.names[task_id]}')
+                resolve = table.resolve
+                rollups.merge(source.get_rollups(), lambda task_id: ids.get(resolve(task_id)))
+        self.rollups = rollups
+
+    def _compute_statistics(self, view):
+        with self.data_lock:
+            if self.rollups is None:
+                self._merge()
+        return super()._compute_statistics(view)
+
+    def _custom_statistics(self, view):
+        custom = view['custom']
+        # 对话框中选的是当前配置的任务
+        ids = self.task_maps[self.sources[0][0]]
+        tasks = custom['tasks'] and frozenset(ids[task_id] for task_id in custom['tasks'] if task_id in ids)
+        granularity = 'day' if custom['granularity'] == 'hour' else custom['granularity']
+        return super()._custom_statistics(dict(view, custom=dict(custom, tasks=tasks or None,
+                                                                 granularity=granularity)))
+
+    def _range_query(self, lo, hi, task_ids, granularity):
+        # 没有合并的原始记录，区间查询也只读汇总
+        return self.rollups.query(lo, hi, task_ids, granularity)
+
+    def _pie_chart_data(self, task_totals, title_prefix, pie=None):
+        return super()._pie_chart_data(task_totals, f'全部配置 {title_prefix}', pie)
+
+    def _line_chart_data(self, task_totals, title_prefix, view, period_start, period_end):
+        return super()._line_chart_data(task_totals, f'全部配置 {title_prefix}', view, period_start, period_end)
@@ -0,0 +1,235 @@
+"""无界面报表：按任意周期与任务导出 CSV 合计、PNG/SVG 统计图与 HTML 汇总
+
+    python main.py report [--profile 学习] [--period 本月 2025 2025-03 2025-03-08 2025-01-01~2025-06-30 ...]
+                          [--tasks 高数 英语] [--split month] [--per-task] [--granularity day]
+                          [--chart pie line] [--format png svg] [--output report] [--workers N]
+                          [--pie-top 10] [--pie-min-share 0.02]
+
+统计与绘图沿用主界面的代码：数据由 dataset.Dataset 读取，区间聚合即“自定义”周期的 _custom_statistics，
+图表由 ChartEngine.render 画在 Agg 画布上。图表较多时
+(例如一年中每月每个任务一张) 由进程池并行渲染。
+
+输出目录中包含 totals.csv (各周期各任务的累计时长)、charts/ 下的图表与 index.html。
+"""
+import argparse
+import csv
+import html
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import matplotlib
+matplotlib.use('Agg')
+
+from charts import PIE_MIN_SHARE, PIE_TOP_N, ChartEngine, format_hours
+from dataset import Dataset, LoadError
+from profiles import DEFAULT_PROFILE, profile_path
+from stats import GRANULARITIES, auto_granularity, next_month, parse_period
+
+# 图表数不少于该值时才启用进程池
+PARALLEL_MIN_CHARTS = 4
+
+
+def split_period(period, unit):
+    """把 (名称, 起, 止) 按 'month' / 'week' / 'day' 拆成若干子周期"""
+    _, start, end = period
+    parts = []
+    while start <= end:
+        if unit == 'month':
+            stop = min(next_month(start) - timedelta(days=1), end)
+            label = start.strftime('%Y-%m') if start.day == 1 and stop == next_month(start) - timedelta(days=1) \
+                else f'{start}~{stop}'
+        elif unit == 'week':
+            stop = min(start + timedelta(days=6 - start.weekday()), end)
+            label = f'{start}~{stop}'
+        else:
+            stop = start
+            label = start.isoformat()
+        parts.append((label, start, stop))
+        start = stop + timedelta(days=1)
+    return parts
+
+
+def _slug(label):
+    return re.sub(r'[^\w.-]+', '_', label).strip('_')
+
+
+def _render_chart(job):
+    """在 (工作进程中的) Agg 画布上绘制一张图并按各格式保存，返回保存的路径"""
+    global _worker_chart
+    if _worker_chart is None:
+        _worker_chart = ChartEngine()
+    spec, base_path, formats = job
+    _worker_chart.kind = None
+    _worker_chart.render(spec)
+    paths = []
+    for fmt in formats:
+        path = f'{base_path}.{fmt}'
+        _worker_chart.fig.savefig(path, format=fmt, facecolor=_worker_chart.fig.get_facecolor())
+        paths.append(path)
+    return paths
+
+
+_worker_chart = None
+
+
+def render_charts(jobs, workers=None):
+    """渲染全部图表；图表较多时分给进程池"""
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers > 1 and len(jobs) >= PARALLEL_MIN_CHARTS:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_render_chart, jobs, chunksize=chunksize)), workers
+    return [_render_chart(job) for job in jobs], 1
+
+
+def build_report(app, periods, task_ids=None, granularity=None, kinds=('pie', 'line'), per_task=False,
+                 formats=('png',), output_dir='report', workers=None, pie=None):
+    """聚合各周期并写出报表，返回摘要 {'periods', 'charts', 'workers', 'seconds'}
+
+    kinds 为要画的图表类型；pie 为扇形图的 (top_n, min_share)，None 时用 charts 中的默认值。
+    扇区在主进程中合并好后随图表数据一起交给渲染进程。
+    """
+    t0 = time.perf_counter()
+    chart_dir = os.path.join(output_dir, 'charts')
+    os.makedirs(chart_dir, exist_ok=True)
+    earliest = min(start for _, start, _ in periods)
+    app.ensure_history(earliest.isoformat())
+
+    sections, jobs = [], []
+    for label, start, end in periods:
+        custom = {'start': start.isoformat(), 'end': end.isoformat(),
+                  'granularity': granularity or auto_granularity(start, end),
+                  'tasks': frozenset(task_ids) if task_ids else None}
+        view = {'period': '自定义', 'chart_type': '饼图', 'sub_period': '按天', 'force_day': None,
+                'now': datetime.now(), 'custom': custom, 'pie': pie}
+        totals = app._custom_statistics(view)
+        section = {'label': label, 'start': start, 'end': end, 'totals': totals, 'charts': []}
+        sections.append(section)
+        if totals is None:
+            continue
+        slug = _slug(label)
+        if 'pie' in kinds:
+            jobs.append((section, totals, os.path.join(chart_dir, f'{slug}_pie')))
+        if 'line' in kinds:
+            spec = app._custom_statistics(dict(view, chart_type='折线图'))
+            jobs.append((section, spec, os.path.join(chart_dir, f'{slug}_line')))
+        if per_task:
+            for name in totals['labels']:
+                task_id = app.task_table.index[name]
+                spec = app._custom_statistics(dict(view, chart_type='折线图', custom=dict(custom, tasks=frozenset([task_id]))))
+                spec['title'] = f'{name} {spec["title"]}'
+                jobs.append((section, spec, os.path.join(chart_dir, f'{slug}_task{task_id}_line')))
+
+    results, used_workers = render_charts([(spec, path, formats) for _, spec, path in jobs], workers)
+    for (section, _, _), paths in zip(jobs, results):
+        section['charts'].append(paths)
+
+    write_csv(os.path.join(output_dir, 'totals.csv'), sections)
+    write_html(os.path.join(output_dir, 'index.html'), sections, output_dir)
+    return {'periods': len(sections), 'charts': len(jobs), 'workers': used_workers,
+            'seconds': round(time.perf_counter() - t0, 3)}
+
+
+def write_csv(path, sections):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['周期', '开始', '结束', '任务', '秒数', '小时'])
+        for section in sections:
+            totals = section['totals']
+            if totals is None:
+                continue
+            for name, hours in zip(totals['labels'], totals['values']):
+                writer.writerow([section['label'], section['start'], section['end'], name,
+                                 round(hours * 3600), f'{hours:.2f}'])
+
+
+def write_html(path, sections, output_dir):
+    parts = ['<!DOCTYPE html>', '<html lang="zh-CN"><head><meta charset="utf-8"><title>ClockToDo 报表</title>',
+             '<style>body{font-family:"Microsoft YaHei",sans-serif;background:#fffbe6;color:#333;margin:24px}'
+             'h1,h2{color:#d35400}table{border-collapse:collapse;margin:8px 0}'
+             'td,th{padding:4px 12px;border-bottom:1px solid #f6b26b;text-align:left}'
+             'th{background:#fff2cc}img{max-width:480px;margin:4px}</style></head><body>',
+             f'<h1>ClockToDo 报表</h1><p>生成时间：{datetime.now():%Y-%m-%d %H:%M}</p>']
+    for section in sections:
+        parts.append(f'<h2>{html.escape(section["label"])}</h2><p>{section["start"]} 至 {section["end"]}</p>')
+        totals = section['totals']
+        if totals is None:
+            parts.append('<p>暂无计时记录</p>')
+            continue
+        total = sum(totals['values'])
+        parts.append('<table><tr><th>任务</th><th>累计时长</th><th>占比</th></tr>')
+        for name, hours, color in zip(totals['labels'], totals['values'], totals['colors']):
+            parts.append(f'<tr><td><span style="color:{color}">■</span> {html.escape(name)}</td>'
+                         f'<td>{format_hours(hours)}</td><td>{hours / total:.1%}</td></tr>')
+        parts.append(f'<tr><th>合计</th><th>{format_hours(total)}</th><th></th></tr></table>')
+        for paths in section['charts']:
+            # 网页中优先引用矢量图
+            image = next((p for p in paths if p.endswith('.svg')), paths[0])
+            parts.append(f'<img src="{html.escape(os.path.relpath(image, output_dir))}">')
+    parts.append('</body></html>')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(parts) + '\n')
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(prog='clocktodo report', description='ClockToDo 无界面报表')
+    parser.add_argument('--data', help=f'数据文件 (默认为 --profile 所指配置的数据文件，即 {profile_path(DEFAULT_PROFILE)})')
+    parser.add_argument('--profile', default=os.environ.get('CLOCKTODO_PROFILE', DEFAULT_PROFILE), metavar='名称',
+                        help=f'数据配置 (默认“{DEFAULT_PROFILE}”，见 profiles.py)')
+    parser.add_argument('--period', nargs='+', default=['本月'],
+                        help='周期：今日/本周/本月/本年、YYYY、YYYY-MM、YYYY-MM-DD 或 起~止 (默认 本月)')
+    parser.add_argument('--today', type=date.fromisoformat, default=None, help='计算“本月”等相对周期的基准日期')
+    parser.add_argument('--split', choices=['month', 'week', 'day'], help='把每个周期再拆分为月/周/天')
+    parser.add_argument('--tasks', nargs='+', help='只统计这些任务 (按名称)')
+    parser.add_argument('--per-task', action='store_true', help='另为每个任务画一张折线图')
+    parser.add_argument('--granularity', choices=GRANULARITIES, help='折线图粒度 (默认按周期长度自动选择)')
+    parser.add_argument('--chart', nargs='+', choices=['pie', 'line'], default=['pie', 'line'], help='图表类型')
+    parser.add_argument('--format', nargs='+', choices=['png', 'svg'], default=['png'], help='图表格式')
+    parser.add_argument('--output', default='report', help='输出目录 (默认 report)')
+    parser.add_argument('--workers', type=int, default=None, help='渲染进程数 (默认 CPU 核数)')
+    parser.add_argument('--pie-top', type=int, default=PIE_TOP_N,
+                        help=f'扇形图最多单独显示的任务数，0 为不限 (默认 {PIE_TOP_N})')
+    parser.add_argument('--pie-min-share', type=float, default=PIE_MIN_SHARE,
+                        help=f'单独显示所需的最小占比，其余并为“其他” (默认 {PIE_MIN_SHARE})')
+    args = parser.parse_args(argv)
+    try:
+        data_file = args.data or profile_path(args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+
+    today = args.today or date.today()
+    try:
+        periods = [parse_period(text, today) for text in args.period]
+    except ValueError as e:
+        parser.error(f'无法识别的周期：{e}')
+    if args.split:
+        periods = [part for period in periods for part in split_period(period, args.split)]
+
+    app = Dataset(data_file)
+    try:
+        app.load_data()
+        task_ids = None
+        if args.tasks:
+            unknown = [name for name in args.tasks if name not in app.task_table.index]
+            if unknown:
+                parser.error(f'任务不存在：{", ".join(unknown)}')
+            task_ids = [app.task_table.index[name] for name in args.tasks]
+        summary = build_report(app, periods, task_ids, args.granularity, args.chart, args.per_task,
+                               args.format, args.output, args.workers, (args.pie_top, args.pie_min_share))
+    except LoadError as e:
+        # 无界面运行，读取失败时不弹窗
+        print(f'报表生成失败：{e}', file=sys.stderr)
+        return 1
+    finally:
+        app.close()
+    print(f"报表已写入 {args.output}：{summary['periods']} 个周期，{summary['charts']} 张图 "
+          f"({summary['workers']} 个进程，{summary['seconds']} 秒)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,281 @@
+"""SQLite 存储后端：任务与计时记录保存在 `<数据文件名>.db`，可与 todo.json 互相导入导出
+
+设置环境变量 CLOCKTODO_STORAGE=sqlite 启用。数据库使用 WAL 模式，记录表在
+开始时间与任务上各有一个索引，按加载窗口与按需读入历史都走开始时间索引；
+按周期的统计与其他存储方式一样由内存中的汇总索引完成 (见 stats.Rollups)。
+时间列保存“本地时间秒”(见 stats.py)，导出时还原为按天分组的 JSON 格式。
+记录按任务 id 引用任务，被合并任务的旧 id 记在 aliases 表中 (见 tasks.py)。
+
+命令行：
+    python sqlite_store.py import todo.json todo.db
+    python sqlite_store.py export todo.db todo.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from stats import DAY_SECONDS, day_seconds, clock_seconds, day_to_date
+from storage import load_snapshot, snapshot_data, write_json_atomic
+from tasks import TaskTable
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    task_id INTEGER NOT NULL REFERENCES tasks(id),
+    start_sec INTEGER NOT NULL,
+    end_sec INTEGER NOT NULL,
+    duration INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    id INTEGER PRIMARY KEY,
+    target INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_start ON records(start_sec);
+CREATE INDEX IF NOT EXISTS idx_records_task ON records(task_id, start_sec);
+"""
+
+
+def db_path(data_file):
+    return os.path.splitext(data_file)[0] + '.db'
+
+
+def _clock(seconds):
+    """本地时间秒 -> 'HH:MM:SS'"""
+    seconds %= DAY_SECONDS
+    return f'{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}'
+
+
+def _record_row(date, record):
+    """JSON 中的一条记录 -> (开始, 结束, 时长)，跨零点时结束时间顺延一天"""
+    base = day_seconds(date)
+    start = base + clock_seconds(record['start'])
+    end = base + clock_seconds(record['end'])
+    if end < start:
+        end += DAY_SECONDS
+    return start, end, record['duration']
+
+
+def _legacy_days(tasks):
+    """旧格式 [{"name", "records": [{"start", "end", "duration"} (ISO 时间)]}] -> {date: [按名称引用任务的记录]}"""
+    daily_records = {}
+    for task in tasks:
+        for record in task.get('records', []):
+            try:
+                start = datetime.fromisoformat(record['start'])
+                end = datetime.fromisoformat(record['end'])
+            except (KeyError, ValueError, TypeError):
+                continue
+            daily_records.setdefault(start.strftime('%Y-%m-%d'), []).append({
+                'task': task['name'],
+                'start': start.strftime('%H:%M:%S'),
+                'end': end.strftime('%H:%M:%S'),
+                'duration': record.get('duration', int((end - start).total_seconds())),
+            })
+    return daily_records
+
+
+class SQLiteStore:
+    """与 ClockToDoApp 的持久化操作一一对应：加载、追加记录、删除任务、按周期查询"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    # ---- 读取 ----
+    def task_table(self):
+        table = TaskTable()
+        for task_id, name in self.conn.execute('SELECT id, name FROM tasks ORDER BY position'):
+            table.add(name, task_id)
+        for alias, target in self.conn.execute('SELECT id, target FROM aliases'):
+            table.aliases[alias] = target
+            table.next_id = max(table.next_id, alias + 1)
+        return table
+
+    def load(self, since=None, until=None):
+        """返回 {"table", "daily_records"} (与 storage.read_data 相同)；可只取 [since, until) 内的天"""
+        with self._lock:
+            return {'table': self.task_table(), 'daily_records': self._daily_records(since, until)}
+
+    def _daily_records(self, since=None, until=None):
+        where, params = [], []
+        if since:
+            where.append('start_sec >= ?')
+            params.append(day_seconds(since))
+        if until:
+            where.append('start_sec < ?')
+            params.append(day_seconds(until))
+        sql = ('SELECT task_id, start_sec, end_sec, duration FROM records'
+               + (' WHERE ' + ' AND '.join(where) if where else '')
+               + ' ORDER BY start_sec / 86400 DESC, id')
+        daily_records = {}
+        day, records = None, None
+        for task_id, start, end, duration in self.conn.execute(sql, params):
+            if start // DAY_SECONDS != day:
+                day = start // DAY_SECONDS
+                records = daily_records.setdefault(day_to_date(day).isoformat(), [])
+            records.append({'task': task_id, 'start': _clock(start), 'end': _clock(end), 'duration': duration})
+        return daily_records
+
+    def first_date(self):
+        """最早一条记录的日期，没有记录时为 None"""
+        with self._lock:
+            start, = self.conn.execute('SELECT MIN(start_sec) FROM records').fetchone()
+        return None if start is None else day_to_date(start // DAY_SECONDS).isoformat()
+
+    # ---- 写入 ----
+    def apply(self, entry):
+        """执行一次变更，条目格式与 storage 中的日志条目相同"""
+        op = entry.get('op')
+        with self._lock, self.conn:
+            if op == 'add_task':
+                self.conn.execute(
+                    'INSERT OR IGNORE INTO tasks (id, name, position)'
+                    ' VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM tasks))',
+                    (entry['id'], entry['name']))
+            elif op == 'record':
+                self.conn.execute('INSERT INTO records (task_id, start_sec, end_sec, duration) VALUES (?, ?, ?, ?)',
+                                  (entry['task'], *_record_row(entry['date'], entry)))
+            elif op == 'rename_task':
+                self.conn.execute('UPDATE tasks SET name = ? WHERE id = ?', (entry['name'], entry['id']))
+                if entry.get('to_end'):
+                    self.conn.execute('UPDATE tasks SET position = (SELECT MAX(position) + 1 FROM tasks) WHERE id = ?',
+                                      (entry['id'],))
+            elif op == 'merge_task':
+                # 只改别名，记录保持原 id
+                self.conn.execute('UPDATE aliases SET target = ? WHERE target = ?', (entry['into'], entry['id']))
+                self.conn.execute('INSERT OR REPLACE INTO aliases (id, target) VALUES (?, ?)', (entry['id'], entry['into']))
+                self.conn.execute('DELETE FROM tasks WHERE id = ?', (entry['id'],))
+            elif op == 'delete_task':
+                task_id = entry['id']
+                self.conn.execute('DELETE FROM records WHERE task_id = ? OR task_id IN (SELECT id FROM aliases WHERE target = ?)',
+                                  (task_id, task_id))
+                self.conn.execute('DELETE FROM aliases WHERE target = ?', (task_id,))
+                self.conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+
+    # ---- 导入导出 ----
+    def import_data(self, data, replace=False):
+        """批量导入快照 (新旧格式、read_data 的结果或旧的任务列表格式)，返回 (导入条数, 跳过条数)
+
+        按名称与库中已有任务对应，其余任务尽量沿用原 id；合并别名在导入时直接解析。
+        replace 为真时在同一事务中先清空库中的任务与记录 (用合并结果整体替换)。
+        """
+        if isinstance(data, list):
+            data = {'tasks': [{'name': t['name']} for t in data], 'daily_records': _legacy_days(data)}
+        if 'table' in data:
+            # storage.read_data 的结果
+            table, daily_records = data['table'], data['daily_records']
+        else:
+            table, daily_records, _ = load_snapshot(data)
+        skipped = 0
+        with self._lock, self.conn:
+            if replace:
+                self.conn.execute('DELETE FROM records')
+                self.conn.execute('DELETE FROM aliases')
+                self.conn.execute('DELETE FROM tasks')
+            existing = self.task_table()
+            used = set(existing.names) | set(existing.aliases)
+            id_map = {}
+            for task_id, name in table.names.items():
+                new_id = existing.index.get(name)
+                if new_id is None:
+                    new_id = task_id if task_id not in used else max(used) + 1
+                    used.add(new_id)
+                    self.conn.execute(
+                        'INSERT INTO tasks (id, name, position)'
+                        ' VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM tasks))',
+                        (new_id, name))
+                id_map[task_id] = new_id
+            rows = []
+            for date, records in daily_records.items():
+                for record in records:
+                    try:
+                        task_id = id_map[table.resolve(record['task'])]
+                        rows.append((task_id, *_record_row(date, record)))
+                    except (KeyError, ValueError, TypeError):
+                        skipped += 1
+            self.conn.executemany('INSERT INTO records (task_id, start_sec, end_sec, duration) VALUES (?, ?, ?, ?)', rows)
+        return len(rows), skipped
+
+    def export_data(self):
+        """导出为 todo.json 的格式，日期倒序"""
+        data = self.load()
+        return snapshot_data(data['table'], data['daily_records'])
+
+
+class SQLiteHistory:
+    """SQLite 模式下按需加载的更早历史，接口与 storage.HistoryWindow 相同"""
+
+    def __init__(self, db, loaded_from):
+        self.db = db
+        self.loaded_from = loaded_from
+
+    def load_before(self, date_str):
+        if date_str >= self.loaded_from:
+            return {}
+        days = self.db.load(date_str, self.loaded_from)['daily_records']
+        first = self.db.first_date()
+        self.loaded_from = '' if first is None or first >= date_str else date_str
+        return days
+
+    @property
+    def complete(self):
+        return self.loaded_from == ''
+
+
+def import_json(json_path, path):
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    store = SQLiteStore(path)
+    try:
+        return store.import_data(data)
+    finally:
+        store.close()
+
+
+def export_json(path, json_path):
+    store = SQLiteStore(path)
+    try:
+        data = store.export_data()
+    finally:
+        store.close()
+    write_json_atomic(json_path, data)
+    return sum(len(records) for records in data['daily_records'].values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ClockToDo 数据在 todo.json 与 SQLite 数据库之间导入导出')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('import', help='把 todo.json 导入数据库')
+    p.add_argument('json_file')
+    p.add_argument('db_file')
+    p = sub.add_parser('export', help='把数据库导出为 todo.json 格式')
+    p.add_argument('db_file')
+    p.add_argument('json_file')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        imported, skipped = import_json(args.json_file, args.db_file)
+        print(f'导入完成：{imported} 条记录' + (f'，跳过无效记录 {skipped} 条' if skipped else ''))
+    else:
+        count = export_json(args.db_file, args.json_file)
+        print(f'导出完成：{count} 条记录')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,485 @@
+"""统计与可视化支持模块：计时记录的列式存储与按周期聚合
+
+记录中的时间统一换算为“本地时间秒”：把本地墙上时间当作 UTC 计算出的
+1970-01-01 起的秒数。这样按天分桶只需整除 86400，不受时区与夏令时影响，
+也与 todo.json 中按本地日期保存的格式一一对应。
+"""
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+import operator
+import re
+from datetime import date, datetime, timedelta
+
+DAY_SECONDS = 86400
+HOUR_SECONDS = 3600
+# 查询粒度
+GRANULARITIES = ('hour', 'day', 'week', 'month', 'year')
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def day_seconds(date_str):
+    """'YYYY-MM-DD' -> 当日零点的本地时间秒"""
+    return (date.fromisoformat(date_str).toordinal() - EPOCH_ORDINAL) * DAY_SECONDS
+
+
+def clock_seconds(time_str):
+    """'HH:MM:SS' -> 当日已过的秒数"""
+    h, m, s = time_str.split(':')
+    return int(h) * 3600 + int(m) * 60 + int(float(s))
+
+
+def to_seconds(dt):
+    """datetime/date -> 本地时间秒"""
+    base = (dt.toordinal() - EPOCH_ORDINAL) * DAY_SECONDS
+    if isinstance(dt, datetime):
+        base += dt.hour * 3600 + dt.minute * 60 + dt.second
+    return base
+
+
+def from_seconds(seconds):
+    """本地时间秒 -> datetime"""
+    return datetime(1970, 1, 1) + timedelta(seconds=int(seconds))
+
+
+def day_to_date(day_index):
+    """天序号(本地时间秒 // 86400) -> date"""
+    return date.fromordinal(int(day_index) + EPOCH_ORDINAL)
+
+
+def period_bounds(period_type, now, force_day=None):
+    """返回统计周期的 [起, 止) 本地时间秒
+
+    period_type 取 'day' / 'week' / 'month' / 'year'；给出 force_day 时统计该日。
+    """
+    if force_day:
+        lo = day_seconds(force_day)
+        return lo, lo + DAY_SECONDS
+    today = now.date()
+    if period_type == 'week':
+        lo = today - timedelta(days=today.weekday())
+        hi = lo + timedelta(days=7)
+    elif period_type == 'month':
+        lo = today.replace(day=1)
+        hi = date(lo.year + 1, 1, 1) if lo.month == 12 else date(lo.year, lo.month + 1, 1)
+    elif period_type == 'year':
+        lo = date(today.year, 1, 1)
+        hi = date(today.year + 1, 1, 1)
+    else:
+        lo = today
+        hi = today + timedelta(days=1)
+    return to_seconds(lo), to_seconds(hi)
+
+
+# 报表与统计接口中周期的中文写法
+PERIOD_TYPES = {'今日': 'day', '本周': 'week', '本月': 'month', '本年': 'year'}
+
+
+def parse_period(text, today):
+    """周期描述 -> (名称, 起始日期, 结束日期 (含))
+
+    支持 今日/本周/本月/本年、YYYY、YYYY-MM、YYYY-MM-DD，以及用 ~ 连接的两者 (取前者的起点、后者的终点)。
+    """
+    if '~' in text:
+        first, last = text.split('~', 1)
+        return text, parse_period(first, today)[1], parse_period(last, today)[2]
+    if text in PERIOD_TYPES:
+        lo, hi = period_bounds(PERIOD_TYPES[text], datetime.combine(today, datetime.min.time()))
+        return text, day_to_date(lo // DAY_SECONDS), day_to_date(hi // DAY_SECONDS - 1)
+    if re.fullmatch(r'\d{4}', text):
+        year = int(text)
+        return text, date(year, 1, 1), date(year, 12, 31)
+    if re.fullmatch(r'\d{4}-\d{2}', text):
+        start = date.fromisoformat(text + '-01')
+        return text, start, next_month(start) - timedelta(days=1)
+    day = date.fromisoformat(text)
+    return text, day, day
+
+
+def next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def auto_granularity(start, end):
+    """按周期长度 (date，含两端) 选择分桶粒度"""
+    days = (end - start).days + 1
+    if days <= 1:
+        return 'hour'
+    if days <= 92:
+        return 'day'
+    if days <= 3 * 366:
+        return 'week'
+    return 'month'
+
+
+def split_record(start, end, duration, unit=DAY_SECONDS):
+    """把一条记录按 unit 秒对齐的桶拆分，返回 [(桶序号, 秒数)]
+
+    跨桶时按各桶内的实际时长比例分配 duration，余数归入最后一个桶。
+    """
+    first, last = start // unit, (max(end, start + 1) - 1) // unit
+    if first == last:
+        return [(first, duration)]
+    pieces = []
+    remaining = duration
+    for bucket in range(first, last + 1):
+        if bucket == last:
+            seconds = remaining
+        else:
+            overlap = min(end, (bucket + 1) * unit) - max(start, bucket * unit)
+            seconds = duration * overlap // (end - start)
+        remaining -= seconds
+        pieces.append((bucket, seconds))
+    return pieces
+
+
+def bucket_key(granularity, day):
+    """天序号 -> 所在桶的键：'day' 为天序号，'week' 为该周周一的天序号，'month' 为 (年, 月)，'year' 为年"""
+    if granularity == 'day':
+        return day
+    d = day_to_date(day)
+    if granularity == 'week':
+        return day - d.weekday()
+    if granularity == 'month':
+        return (d.year, d.month)
+    return d.year
+
+
+def bucket_keys(lo, hi, granularity):
+    """[lo, hi) 内的全部桶键 (含没有记录的桶)，按时间顺序"""
+    if granularity == 'hour':
+        return list(range(lo // HOUR_SECONDS, (hi - 1) // HOUR_SECONDS + 1))
+    keys = []
+    for day in range(lo // DAY_SECONDS, (hi - 1) // DAY_SECONDS + 1):
+        key = bucket_key(granularity, day)
+        if not keys or keys[-1] != key:
+            keys.append(key)
+    return keys
+
+
+def bucket_label(granularity, key):
+    if granularity == 'hour':
+        return from_seconds(key * HOUR_SECONDS).strftime('%Y-%m-%d %H:00')
+    if granularity in ('day', 'week'):
+        return day_to_date(key).isoformat()
+    if granularity == 'month':
+        return f'{key[0]}-{key[1]:02}'
+    return str(key)
+
+
+class QueryResult:
+    """RecordStore.query 的结果：按桶与按任务的累计秒数
+
+    buckets 为 {桶键: {任务 id: 秒数}}，totals 为 {任务 id: 秒数}，任务 id 为记录中的原始 id。
+    """
+
+    def __init__(self, granularity):
+        self.granularity = granularity
+        self.buckets = {}
+        self.totals = {}
+        self.records = 0
+
+    def add(self, key, task_id, seconds):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = {}
+        bucket[task_id] = bucket.get(task_id, 0) + seconds
+        self.totals[task_id] = self.totals.get(task_id, 0) + seconds
+
+    def bucket_total(self, key):
+        return sum(self.buckets.get(key, {}).values())
+
+
+class RecordStore:
+    """计时记录的列式存储
+
+    每条记录占用四列紧凑数组：任务 id、开始/结束本地时间秒、时长(秒)。
+    数据在 load_data 中解析一次，汇总索引由 arrays() 的 NumPy 副本向量化构建，
+    不再逐条解析 ISO 字符串。query 前各列按开始时间排序，范围查找用二分。
+    """
+
+    def __init__(self):
+        self.task_ids = array('i')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.durations = array('q')
+        self._arrays = None
+        # 各任务 id 的记录条数，判断任务是否有记录时不必扫描各列
+        self.counts = Counter()
+        # 各列是否按开始时间有序；最长一条记录的跨度，用于向前扩展查询范围
+        self.is_sorted = True
+        self.max_span = 0
+
+    def __len__(self):
+        return len(self.starts)
+
+    def append(self, task_id, start, end, duration):
+        if self.is_sorted and self.starts and start < self.starts[-1]:
+            self.is_sorted = False
+        self.max_span = max(self.max_span, end - start)
+        self.counts[task_id] += 1
+        self.task_ids.append(task_id)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.durations.append(duration)
+        self._arrays = None
+
+    def extend(self, task_ids, starts, ends, durations, is_sorted=False):
+        """批量追加四列 (array 或 memoryview)；is_sorted 表示新记录已按开始时间排序"""
+        if not len(starts):
+            return
+        if not is_sorted or (self.starts and starts[0] < self.starts[-1]):
+            self.is_sorted = False
+        self.max_span = max(self.max_span, max(map(operator.sub, ends, starts)))
+        self.counts.update(task_ids)
+        self.task_ids.extend(task_ids)
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+        self.durations.extend(durations)
+        self._arrays = None
+
+    def replace_range(self, lo, hi, rows):
+        """把开始时间在 [lo, hi) 内的记录替换为 rows [(任务 id, 开始, 结束, 时长)]，返回被替换的记录
+
+        rows 的开始时间须都落在 [lo, hi) 内；各列有序时整段替换，保持有序。
+        """
+        self.ensure_sorted()
+        first = bisect_left(self.starts, lo)
+        last = bisect_left(self.starts, hi)
+        old = list(zip(self.task_ids[first:last], self.starts[first:last], self.ends[first:last],
+                       self.durations[first:last]))
+        rows = sorted(rows, key=lambda row: row[1])
+        self.counts.subtract(self.task_ids[first:last])
+        self.counts.update(row[0] for row in rows)
+        self.counts += Counter()  # 去掉条数归零的 id
+        self.task_ids[first:last] = array('i', [row[0] for row in rows])
+        self.starts[first:last] = array('q', [row[1] for row in rows])
+        self.ends[first:last] = array('q', [row[2] for row in rows])
+        self.durations[first:last] = array('q', [row[3] for row in rows])
+        if rows:
+            self.max_span = max(self.max_span, max(row[2] - row[1] for row in rows))
+        self._arrays = None
+        return old
+
+    def without(self, task_ids):
+        """去掉属于 task_ids 中任务的记录，返回新的存储"""
+        store = RecordStore()
+        for record in zip(self.task_ids, self.starts, self.ends, self.durations):
+            if record[0] not in task_ids:
+                store.append(*record)
+        return store
+
+    def count(self, task_ids):
+        """task_ids 中各任务 id 的记录总数"""
+        return sum(self.counts.get(task_id, 0) for task_id in task_ids)
+
+    def ensure_sorted(self):
+        """按开始时间重排各列 (稳定排序)；新的计时通常追加在末尾，无需重排"""
+        if self.is_sorted:
+            return
+        order = sorted(range(len(self.starts)), key=self.starts.__getitem__)
+        self.task_ids = array('i', [self.task_ids[i] for i in order])
+        self.starts = array('q', [self.starts[i] for i in order])
+        self.ends = array('q', [self.ends[i] for i in order])
+        self.durations = array('q', [self.durations[i] for i in order])
+        self._arrays = None
+        self.is_sorted = True
+
+    def query(self, lo, hi, task_ids=None, granularity='day'):
+        """统计 [lo, hi) (本地时间秒) 内的专注时长，返回 QueryResult
+
+        task_ids 为记录中的任务 id 集合，None 表示全部任务；granularity 取 GRANULARITIES 之一。
+        跨过桶边界的记录按比例拆分 (与 Rollups 一致)，只计入落在 [lo, hi) 内的部分。
+        按开始时间二分定位，代价为 O(log n + k)。
+        """
+        self.ensure_sorted()
+        unit = HOUR_SECONDS if granularity == 'hour' else DAY_SECONDS
+        result = QueryResult(granularity)
+        # 开始于 lo 之前的记录可能延续到范围内
+        first = bisect_left(self.starts, lo - self.max_span)
+        last = bisect_left(self.starts, hi)
+        calendar = {}
+        for i in range(first, last):
+            task_id = self.task_ids[i]
+            if task_ids is not None and task_id not in task_ids:
+                continue
+            start, end = self.starts[i], self.ends[i]
+            if max(end, start + 1) <= lo:
+                continue
+            result.records += 1
+            for bucket, seconds in split_record(start, end, self.durations[i], unit):
+                if not lo <= bucket * unit < hi:
+                    continue
+                if unit == DAY_SECONDS:
+                    key = calendar.get(bucket)
+                    if key is None:
+                        key = calendar[bucket] = bucket_key(granularity, bucket)
+                else:
+                    key = bucket
+                result.add(key, task_id, seconds)
+        return result
+
+    def arrays(self):
+        """返回四列的 NumPy 副本 (缓存至下次追加)"""
+        if self._arrays is None:
+            import numpy as np
+            self._arrays = (
+                np.array(self.task_ids, dtype=np.int32),
+                np.array(self.starts, dtype=np.int64),
+                np.array(self.ends, dtype=np.int64),
+                np.array(self.durations, dtype=np.int64),
+            )
+        return self._arrays
+
+
+# 累计秒数在此误差内视为零 (按比例拆分或合并后的值可能是浮点数)
+ZERO_SECONDS = 1e-6
+
+
+def _subtract(totals, key, seconds):
+    """totals[key] 减去 seconds，结果在误差内为零时删去该项"""
+    value = totals.get(key, 0) - seconds
+    if abs(value) <= ZERO_SECONDS:
+        totals.pop(key, None)
+    else:
+        totals[key] = value
+
+
+class Rollups:
+    """按 任务 × 天 / ISO 周 / 月 / 年 累计秒数的汇总索引
+
+    加载时由 RecordStore 一次性构建，新增记录以 add 增量更新。
+    跨过零点的记录按实际落在各天的时长拆分。各层级均为 {键: {任务 id: 秒数}}，
+    键分别为天序号、(ISO 年, ISO 周)、(年, 月)、年；另有按天的全部任务合计
+    totals {天序号: 秒数}，供日历标记与按天折线图直接查表。
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.days = defaultdict(dict)
+        self.weeks = defaultdict(dict)
+        self.months = defaultdict(dict)
+        self.years = defaultdict(dict)
+        self._calendar = {}
+
+    @classmethod
+    def from_store(cls, store):
+        rollups = cls()
+        if not len(store):
+            return rollups
+        import numpy as np
+        task_ids, starts, ends, durations = store.arrays()
+        days = starts // DAY_SECONDS
+        crossing = ends > (days + 1) * DAY_SECONDS
+        # 不跨天的记录先按 (天, 任务) 合并，再逐个桶写入
+        n = int(task_ids.max()) + 1
+        keys, inverse = np.unique(days[~crossing] * n + task_ids[~crossing], return_inverse=True)
+        sums = np.bincount(inverse, weights=durations[~crossing], minlength=len(keys))
+        for key, seconds in zip(keys.tolist(), sums.tolist()):
+            rollups._add_day(key // n, key % n, int(seconds))
+        for i in np.flatnonzero(crossing).tolist():
+            rollups.add(int(task_ids[i]), int(starts[i]), int(ends[i]), int(durations[i]))
+        return rollups
+
+    def add(self, task_id, start, end, duration):
+        """记入一条记录，跨天时按各天实际时长比例拆分 duration"""
+        for day, seconds in split_record(start, end, duration):
+            self._add_day(day, task_id, seconds)
+
+    def remove(self, task_id, start, end, duration):
+        """撤销 add 记入的一条记录，累计归零的项与变空的桶一并去掉；没有对应累计时忽略"""
+        for day, seconds in split_record(start, end, duration):
+            if task_id not in self.days.get(day, ()):
+                continue
+            week, month, year = self._calendar_keys(day)
+            _subtract(self.totals, day, seconds)
+            for level, key in ((self.days, day), (self.weeks, week), (self.months, month), (self.years, year)):
+                bucket = level.get(key)
+                if bucket is None:
+                    continue
+                _subtract(bucket, task_id, seconds)
+                if not bucket:
+                    del level[key]
+
+    def drop(self, task_ids):
+        """去掉 task_ids 中任务的全部累计 (任务连同记录删除时)；代价与桶数成正比，不逐条扫描记录"""
+        for day, bucket in list(self.days.items()):
+            seconds = sum(bucket.pop(task_id, 0) for task_id in task_ids)
+            if seconds:
+                _subtract(self.totals, day, seconds)
+        for level in (self.days, self.weeks, self.months, self.years):
+            for key, bucket in list(level.items()):
+                for task_id in task_ids:
+                    bucket.pop(task_id, None)
+                if not bucket:
+                    del level[key]
+
+    def _add_day(self, day, task_id, seconds):
+        week, month, year = self._calendar_keys(day)
+        self.totals[day] = self.totals.get(day, 0) + seconds
+        for level, key in ((self.days, day), (self.weeks, week), (self.months, month), (self.years, year)):
+            bucket = level[key]
+            bucket[task_id] = bucket.get(task_id, 0) + seconds
+
+    def _calendar_keys(self, day):
+        keys = self._calendar.get(day)
+        if keys is None:
+            d = day_to_date(day)
+            keys = self._calendar[day] = (tuple(d.isocalendar()[:2]), (d.year, d.month), d.year)
+        return keys
+
+    def period_totals(self, period_type, now, force_day=None):
+        """统计周期内各任务的累计秒数 {任务 id: 秒数}"""
+        if force_day:
+            return self.days.get(day_seconds(force_day) // DAY_SECONDS, {})
+        today = now.date()
+        if period_type == 'week':
+            return self.weeks.get(tuple(today.isocalendar()[:2]), {})
+        if period_type == 'month':
+            return self.months.get((today.year, today.month), {})
+        if period_type == 'year':
+            return self.years.get(today.year, {})
+        return self.days.get(to_seconds(today) // DAY_SECONDS, {})
+
+    def day_total(self, day):
+        """某天所有任务的累计秒数"""
+        return self.totals.get(day, 0)
+
+    def merge(self, other, task_map):
+        """把另一份汇总索引 (如另一个配置的) 累加进来；其任务 id 经 task_map(id) 换成本索引中的 id，为 None 的跳过"""
+        ids = {}
+        for mine, theirs in ((self.days, other.days), (self.weeks, other.weeks),
+                             (self.months, other.months), (self.years, other.years)):
+            for key, bucket in theirs.items():
+                target = None
+                for task_id, seconds in bucket.items():
+                    if task_id not in ids:
+                        ids[task_id] = task_map(task_id)
+                    new_id = ids[task_id]
+                    if new_id is None:
+                        continue
+                    if target is None:
+                        target = mine[key]
+                    target[new_id] = target.get(new_id, 0) + seconds
+        for day, bucket in other.days.items():
+            seconds = sum(s for task_id, s in bucket.items() if ids[task_id] is not None)
+            if seconds:
+                self.totals[day] = self.totals.get(day, 0) + seconds
+
+    def query(self, lo, hi, task_ids=None, granularity='day'):
+        """与 RecordStore.query 相同的区间查询，但只读按天的汇总 (records 不计)
+
+        [lo, hi) 按整天计；汇总最细到天，不支持 granularity='hour'。
+        """
+        if granularity == 'hour':
+            raise ValueError('汇总索引最细到天，不能按小时统计')
+        result = QueryResult(granularity)
+        for day in range(lo // DAY_SECONDS, -(-hi // DAY_SECONDS)):
+            bucket = self.days.get(day)
+            if not bucket:
+                continue
+            key = bucket_key(granularity, day)
+            for task_id, seconds in bucket.items():
+                if task_ids is None or task_id in task_ids:
+                    result.add(key, task_id, seconds)
+        return result
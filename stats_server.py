@@ -0,0 +1,388 @@
+"""本地只读统计接口：asyncio 实现的 HTTP/JSON 服务，只监听 127.0.0.1
+
+    python main.py serve [--port 8765] [--profile 学习 | --data todo.json]
+    python main.py --serve [端口]          # 随主界面一起在后台线程中启动 (或设置 CLOCKTODO_SERVE_PORT)
+
+接口均为 GET，返回 UTF-8 JSON，时长单位为秒：
+    /totals?period=本周[&tasks=高数,英语]                  周期内各任务的累计时长与合计
+    /buckets?period=2025&granularity=month[&tasks=...]    按桶 (hour/day/week/month/year) 的合计与分任务时长，
+                                                          granularity 缺省时按周期长度选择
+    /tasks                                                现存任务
+    /status                                               数据文件签名、记录数与缓存命中情况
+period 的写法与报表相同：今日/本周/本月/本年、YYYY、YYYY-MM、YYYY-MM-DD 或 起~止，缺省为今日。
+
+数据只在内存中加载一次 (沿用 Dataset 的解析：二进制快照、日志重放或 SQLite)，各查询的
+响应按 (接口, 周期, 任务, 粒度, 当天日期) 缓存。请求到来时最多每 CHECK_SECONDS 秒检查一次
+数据文件及其日志的 (大小, 修改时间)，有变化时在线程中重新加载并清空缓存；重新加载期间
+到来的请求等待同一次加载，不会各自读文件。响应带 ETag，轮询的客户端可用 If-None-Match 得到 304。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from urllib.parse import parse_qs, urlsplit
+
+from dataset import Dataset
+from profiles import DEFAULT_PROFILE, profile_path
+from stats import (RecordStore, GRANULARITIES, DAY_SECONDS, auto_granularity, bucket_keys, bucket_label,
+                   parse_period, to_seconds)
+from storage import STORAGE_MODE, file_signature, journal_path, read_binary, read_data
+from tasks import TaskTable
+
+HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 两次检查数据文件是否变化的最小间隔，秒
+CHECK_SECONDS = 1.0
+# 缓存的响应个数上限
+CACHE_SIZE = 256
+# 请求头的长度上限与空闲连接的保持时间，秒
+MAX_HEADER_BYTES = 8192
+IDLE_SECONDS = 30
+# 不带 Host 头的请求 (如 HTTP/1.0 客户端) 不会来自网页，一并接受
+LOCAL_HOSTS = {'127.0.0.1', 'localhost', '[::1]', ''}
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+           405: 'Method Not Allowed'}
+
+
+def _watched_paths(data_file):
+    if STORAGE_MODE == 'sqlite':
+        from sqlite_store import db_path
+        path = db_path(data_file)
+        return [path, path + '-wal']
+    journal = journal_path(data_file)
+    return [data_file, journal, journal + '.old']
+
+
+def data_signature(data_file):
+    """数据文件及其日志的 (大小, 修改时间)，任一变化即需重新加载"""
+    return tuple(file_signature(path) for path in _watched_paths(data_file))
+
+
+def load_records(data_file):
+    """完整读取数据，返回 (TaskTable, 按开始时间排序的 RecordStore)"""
+    loader = Dataset()
+    if STORAGE_MODE == 'sqlite':
+        from sqlite_store import SQLiteStore, db_path
+        path = db_path(data_file)
+        if not os.path.exists(path):
+            return loader.task_table, loader.store
+        db = SQLiteStore(path)
+        try:
+            data = db.load()
+        finally:
+            db.close()
+    else:
+        data = (read_binary(data_file) or read_data(data_file))[0]
+    loader.task_table = data['table']
+    if 'columns' in data:
+        loader._load_columns(data['columns'])
+    loader._load_days(data['daily_records'])
+    loader.store.ensure_sorted()
+    return loader.task_table, loader.store
+
+
+def _host_name(host):
+    """Host 请求头去掉端口"""
+    if host.startswith('['):
+        return host[:host.find(']') + 1]
+    return host.rsplit(':', 1)[0]
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class StatsCache:
+    """内存中的任务表与记录，以及按查询缓存的响应；只在事件循环线程中使用"""
+
+    def __init__(self, data_file, check_seconds=CHECK_SECONDS, size=CACHE_SIZE):
+        self.data_file = data_file
+        self.check_seconds = check_seconds
+        self.size = size
+        self.table = TaskTable()
+        self.store = RecordStore()
+        self.signature = None
+        self.version = 0
+        self.loaded_at = None
+        self.error = None
+        self.responses = OrderedDict()
+        self.hits = self.misses = self.loads = 0
+        self._next_check = 0
+        self._loading = None
+
+    async def refresh(self):
+        """数据文件有变化时重新加载；正在加载时等待同一次加载完成"""
+        loop = asyncio.get_running_loop()
+        if self._loading is None and loop.time() >= self._next_check:
+            self._next_check = loop.time() + self.check_seconds
+            signature = data_signature(self.data_file)
+            if signature != self.signature:
+                self._loading = asyncio.ensure_future(self._reload(signature))
+        if self._loading is not None:
+            await asyncio.shield(self._loading)
+
+    async def _reload(self, signature):
+        # 签名在读取之前取得：读取期间文件再有变化，下次检查时会再加载一次
+        try:
+            self.table, self.store = await asyncio.get_running_loop().run_in_executor(
+                None, load_records, self.data_file)
+            self.error = None
+            self.loaded_at = datetime.now().isoformat(timespec='seconds')
+            self.loads += 1
+        except Exception as e:
+            # 保留上次加载的数据，文件再次变化时重试
+            self.error = f'读取数据失败：{e}'
+        finally:
+            self.signature = signature
+            self.version += 1
+            self.responses.clear()
+            self._loading = None
+
+    def etag(self, today):
+        return f'"{self.version}-{today.isoformat()}"'
+
+    def response(self, path, query, today):
+        """(接口, 查询参数) -> JSON 字节串，命中缓存时直接返回"""
+        key = (path, tuple(sorted((name, tuple(values)) for name, values in query.items())), today)
+        body = self.responses.get(key)
+        if body is not None:
+            self.responses.move_to_end(key)
+            self.hits += 1
+            return body
+        self.misses += 1
+        body = json.dumps(self._compute(path, query, today), ensure_ascii=False).encode('utf-8')
+        # 状态接口每次都现算，不占缓存
+        if path != '/status':
+            self.responses[key] = body
+            if len(self.responses) > self.size:
+                self.responses.popitem(last=False)
+        return body
+
+    def _compute(self, path, query, today):
+        if path == '/tasks':
+            return {'tasks': [{'id': task_id, 'name': name} for task_id, name in self.table.names.items()]}
+        if path == '/status':
+            return {'data_file': os.path.abspath(self.data_file), 'storage': STORAGE_MODE,
+                    'loaded_at': self.loaded_at, 'loads': self.loads, 'error': self.error,
+                    'tasks': len(self.table.names), 'records': len(self.store),
+                    'cache': {'entries': len(self.responses), 'hits': self.hits, 'misses': self.misses}}
+        if path not in ('/totals', '/buckets'):
+            raise RequestError(404, f'没有这个接口：{path}')
+
+        label, start, end, task_ids = self._parse_range(query, today)
+        lo, hi = to_seconds(start), to_seconds(end) + DAY_SECONDS
+        granularity = query.get('granularity', [None])[-1] or auto_granularity(start, end)
+        if granularity not in GRANULARITIES:
+            raise RequestError(400, f'granularity 应为 {"/".join(GRANULARITIES)} 之一')
+        result = self.store.query(lo, hi, self.table.ids_for(task_ids) if task_ids else None,
+                                  granularity if path == '/buckets' else 'day')
+        names = self.table.names
+        totals = self.table.combine(result.totals)
+        data = {'period': label, 'start': start.isoformat(), 'end': end.isoformat(),
+                'total': sum(totals.values()), 'records': result.records}
+        if path == '/totals':
+            data['tasks'] = [{'id': task_id, 'name': names[task_id], 'seconds': seconds}
+                             for task_id, seconds in sorted(totals.items(), key=lambda item: -item[1])]
+            return data
+        data['granularity'] = granularity
+        data['buckets'] = []
+        for key in bucket_keys(lo, hi, granularity):
+            bucket = self.table.combine(result.buckets.get(key, {}))
+            data['buckets'].append({'key': bucket_label(granularity, key), 'total': sum(bucket.values()),
+                                    'tasks': {names[task_id]: seconds for task_id, seconds in bucket.items()}})
+        return data
+
+    def _parse_range(self, query, today):
+        try:
+            label, start, end = parse_period(query.get('period', ['今日'])[-1], today)
+        except ValueError as e:
+            raise RequestError(400, f'无法识别的周期：{e}')
+        if start > end:
+            raise RequestError(400, '开始日期不能晚于结束日期')
+        task_ids = None
+        names = [name for value in query.get('tasks', []) for name in value.split(',') if name]
+        if names:
+            unknown = [name for name in names if name not in self.table.index]
+            if unknown:
+                raise RequestError(400, f'任务不存在：{", ".join(unknown)}')
+            task_ids = {self.table.index[name] for name in names}
+        return label, start, end, task_ids
+
+
+class StatsServer:
+    """HTTP/1.1 (支持 keep-alive) 的最小实现，只处理 GET / HEAD"""
+
+    def __init__(self, data_file, port=DEFAULT_PORT, host=HOST):
+        self.cache = StatsCache(data_file)
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEADER_BYTES)
+        # 端口为 0 时由系统分配
+        self.port = self.server.sockets[0].getsockname()[1]
+        # 启动时先加载一次，首个请求不必等待
+        await self.cache.refresh()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), IDLE_SECONDS)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                        ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                request = lines[0].split(' ')
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(':')
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                if len(request) != 3:
+                    await self._send(writer, 400, {'error': '无法解析的请求'}, keep_alive=False)
+                    break
+                method, target, version = request
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                if method not in ('GET', 'HEAD') or 'content-length' in headers or 'transfer-encoding' in headers:
+                    await self._send(writer, 405, {'error': '只支持 GET'}, keep_alive=False)
+                    break
+                await self._respond(writer, method, target, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, method, target, headers, keep_alive):
+        # 只接受以本机名访问，防止网页通过 DNS 重绑定读取数据
+        if _host_name(headers.get('host', '')) not in LOCAL_HOSTS:
+            await self._send(writer, 403, {'error': '只接受本机访问'}, keep_alive, method=method)
+            return
+        url = urlsplit(target)
+        await self.cache.refresh()
+        today = date.today()
+        etag = self.cache.etag(today)
+        if url.path != '/status' and headers.get('if-none-match') == etag:
+            await self._send(writer, 304, None, keep_alive, etag=etag, method=method)
+            return
+        try:
+            body = self.cache.response(url.path, parse_qs(url.query), today)
+        except RequestError as e:
+            await self._send(writer, e.status, {'error': str(e)}, keep_alive, method=method)
+            return
+        await self._send(writer, 200, body, keep_alive, etag=etag, method=method)
+
+    async def _send(self, writer, status, body, keep_alive, etag=None, method='GET'):
+        if isinstance(body, dict):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        body = body or b''
+        head = [f'HTTP/1.1 {status} {REASONS[status]}', 'Cache-Control: no-cache',
+                f'Connection: {"keep-alive" if keep_alive else "close"}']
+        if status != 304:
+            head += ['Content-Type: application/json; charset=utf-8', f'Content-Length: {len(body)}']
+        if etag is not None:
+            head.append(f'ETag: {etag}')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        if method != 'HEAD' and status != 304:
+            writer.write(body)
+        await writer.drain()
+
+    async def serve_forever(self, stop=None):
+        """一直服务，直到 stop (asyncio.Event) 被设置"""
+        async with self.server:
+            if stop is None:
+                await self.server.serve_forever()
+            else:
+                await stop.wait()
+
+
+class BackgroundServer:
+    """在后台线程的事件循环中运行 StatsServer，供主界面一起启动"""
+
+    def __init__(self, data_file, port=DEFAULT_PORT):
+        self.server = StatsServer(data_file, port)
+        self.error = None
+        self._loop = None
+        self._stop = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stats-server', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        try:
+            await self.server.start()
+        except OSError as e:
+            self.error = e
+            return
+        finally:
+            self._ready.set()
+        await self.server.serve_forever(self._stop)
+
+    def stop(self, timeout=1):
+        if self.error is None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+            self._thread.join(timeout)
+
+
+def start_background(data_file, port=DEFAULT_PORT):
+    """启动后台服务；端口被占用等情况只打印提示，不影响主界面"""
+    server = BackgroundServer(data_file, port)
+    if server.error is not None:
+        print(f'统计接口启动失败：{server.error}', file=sys.stderr)
+        return None
+    print(f'统计接口：http://{HOST}:{server.server.port}/', file=sys.stderr)
+    return server
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(prog='clocktodo serve', description='ClockToDo 本地只读统计接口')
+    parser.add_argument('--data', help=f'数据文件 (默认为 --profile 所指配置的数据文件，即 {profile_path(DEFAULT_PROFILE)})')
+    parser.add_argument('--profile', default=os.environ.get('CLOCKTODO_PROFILE', DEFAULT_PROFILE), metavar='名称',
+                        help=f'数据配置 (默认“{DEFAULT_PROFILE}”，见 profiles.py)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'监听端口 (默认 {DEFAULT_PORT})')
+    args = parser.parse_args(argv)
+    try:
+        data_file = args.data or profile_path(args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+
+    async def run():
+        server = StatsServer(data_file, args.port)
+        t0 = time.perf_counter()
+        await server.start()
+        cache = server.cache
+        print(f'统计接口：http://{HOST}:{server.port}/  ({len(cache.store)} 条记录，'
+              f'加载 {time.perf_counter() - t0:.3f} 秒)', file=sys.stderr)
+        if cache.error:
+            print(cache.error, file=sys.stderr)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except OSError as e:
+        print(f'统计接口启动失败：{e}', file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
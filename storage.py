@@ -0,0 +1,761 @@
+"""本地数据存储：todo.json 快照 + 追加式日志 (journal)
+
+日志模式下，每次变更只向 `<数据文件名>.journal` 追加一行 JSON 并 fsync，
+后台线程定期把日志合并 (compact) 进 {"tasks", "daily_records"} 快照，
+快照经临时文件 + 原子重命名写入，崩溃时不会留下半截文件。
+读取时以快照为基础，按序号 (seq) 重放尚未合并的日志。
+
+快照 (版本 2) 中的记录按 id 引用任务 (见 tasks.py)：
+    {"version": 2, "tasks": [{"id": 1, "name": "高数"}], "aliases": {"4": 1}, "next_id": 5,
+     "daily_records": {"2025-08-21": [{"task": 1, "start": "08:38:45", "end": "09:39:38", "duration": 5789}]},
+     "journal_seq": 12}
+旧版快照 (记录按名称引用任务) 在读取时按任务列表顺序编号并升级。
+
+日志条目：
+    {"seq": 1, "op": "add_task", "id": 1, "name": "高数"}
+    {"seq": 2, "op": "record", "task": 1, "date": "2025-08-21",
+     "start": "08:38:45", "end": "09:39:38", "duration": 5789}
+    {"seq": 3, "op": "rename_task", "id": 1, "name": "高数_记录", "to_end": true}
+以及 merge_task / delete_task，见 TaskTable.apply。
+
+快照旁另存一份二进制副本 (见 binsnap.py)，读取时优先使用，过期时在后台重新生成。
+"""
+import codecs
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import binsnap
+from binsnap import Columns, binary_path, columns_from_days, open_binary, write_binary
+from stats import day_seconds
+from tasks import TaskTable
+from tracing import traced
+
+# 快照格式版本：2 起记录按 id 引用任务
+FORMAT_VERSION = 2
+# 'journal'：追加日志 + 后台合并；'json'：每次变更整体重写数据文件
+STORAGE_MODE = os.environ.get('CLOCKTODO_STORAGE', 'journal')
+# 未合并的日志条数达到该值时触发后台合并
+COMPACT_THRESHOLD = 200
+# 整体重写模式下，等待该秒数把连续的变更合并为一次写入
+SAVE_COALESCE_SECONDS = 0.2
+# 启动时只加载最近一段历史 (日志模式下生效)，更早的记录按需读取
+LAZY_LOAD = os.environ.get('CLOCKTODO_LAZY_LOAD', '1') != '0'
+# 启动加载的天数；未设置时加载本年 (及跨年的本周)
+LOAD_WINDOW_DAYS = int(os.environ.get('CLOCKTODO_LOAD_DAYS', '0'))
+# 是否维护并优先读取二进制快照 (json 与 journal 模式)
+BINARY_SNAPSHOT = os.environ.get('CLOCKTODO_BINARY', '1') != '0' and binsnap.SUPPORTED
+
+
+def load_window_start(today):
+    """启动时加载窗口的起始日期 'YYYY-MM-DD'"""
+    if LOAD_WINDOW_DAYS > 0:
+        start = today - timedelta(days=LOAD_WINDOW_DAYS)
+    else:
+        start = date(today.year, 1, 1)
+    # 本周可能跨年，窗口至少覆盖本周
+    return min(start, today - timedelta(days=today.weekday())).isoformat()
+
+
+def journal_path(data_file):
+    return os.path.splitext(data_file)[0] + '.journal'
+
+
+def data_exists(data_file):
+    """快照或任一日志文件存在即视为已有数据"""
+    journal = journal_path(data_file)
+    return any(os.path.exists(p) for p in (data_file, journal, journal + '.old'))
+
+
+@traced('write_json')
+def write_json_atomic(path, data):
+    """写入临时文件并 fsync 后原子替换目标文件，返回写出文件的 (大小, 修改时间)"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+        # 重命名不改变修改时间，此时取得的签名即替换后目标文件的签名
+        st = os.fstat(f.fileno())
+    os.replace(tmp_path, path)
+    return st.st_size, st.st_mtime_ns
+
+
+def read_journal(path):
+    """逐条读取日志；末尾被截断的半行 (写入中途崩溃) 直接忽略"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                break
+
+
+def legacy_name_ids(header):
+    """旧版快照中任务名 -> 升级时分配的 id；新格式返回空 dict"""
+    if header.get('version', 1) >= FORMAT_VERSION:
+        return {}
+    return dict(TaskTable.from_data(header).index)
+
+
+def upgrade_records(records, name_ids):
+    """旧版按名称引用任务的记录改为按 id 引用 (name_ids 为空时原样返回)，任务列表中没有的记录丢弃"""
+    if not name_ids:
+        return records
+    upgraded = []
+    for record in records:
+        task_id = name_ids.get(record['task'])
+        if task_id is not None:
+            upgraded.append(dict(record, task=task_id))
+    return upgraded
+
+
+def load_snapshot(raw):
+    """快照 dict -> (TaskTable, daily_records, 旧版的 {任务名: id})"""
+    table = TaskTable.from_data(raw)
+    name_ids = legacy_name_ids(raw)
+    daily_records = {}
+    for date_str, records in raw.get('daily_records', {}).items():
+        records = upgrade_records(records, name_ids)
+        if records:
+            daily_records[date_str] = records
+    return table, daily_records, name_ids
+
+
+def snapshot_data(table, daily_records, journal_seq=0):
+    """组装写入快照的 dict，daily_records 按日期倒序"""
+    data = {'version': FORMAT_VERSION}
+    data.update(table.to_data())
+    data['daily_records'] = dict(sorted(daily_records.items(), reverse=True))
+    if journal_seq:
+        data['journal_seq'] = journal_seq
+    return data
+
+
+def apply_entry(table, daily_records, entry):
+    """把一条日志应用到任务表与按天记录上"""
+    if entry.get('op') != 'record':
+        dropped = table.apply(entry)
+        if dropped:
+            # 不保留记录的删除：只有这一种变更需要改动记录
+            for date_str in list(daily_records):
+                kept = [r for r in daily_records[date_str] if r['task'] not in dropped]
+                if kept:
+                    daily_records[date_str] = kept
+                else:
+                    del daily_records[date_str]
+        return
+    task_id = entry['task']
+    if isinstance(task_id, str):
+        # 旧版条目按名称引用任务
+        task_id = table.index.get(task_id)
+    if task_id is None:
+        return
+    daily_records.setdefault(entry['date'], []).append({
+        'task': task_id,
+        'start': entry['start'],
+        'end': entry['end'],
+        'duration': entry['duration'],
+    })
+
+
+def rebase_entries(table, daily_records, entries):
+    """把本地尚未写出的变更重新应用到被外部修改过的快照上，返回调整后的条目与 {原 id: 新 id}
+
+    本地新建任务的 id 已被外部的其他任务占用时改用新 id (同名任务已存在时直接对应到它)，
+    之后引用该 id 的条目一并改写；同一天中任务与起止时间都相同的记录不再重复添加。
+    """
+    remap = {}
+    rebased = []
+    for entry in entries:
+        entry = {key: remap.get(value, value) if key in ('id', 'into', 'task') else value
+                 for key, value in entry.items()}
+        op = entry.get('op')
+        if op == 'add_task':
+            existing = table.index.get(entry['name'])
+            if existing is not None:
+                remap[entry['id']] = existing
+                continue
+            if entry['id'] in table.names or entry['id'] in table.aliases:
+                remap[entry['id']] = entry['id'] = table.next_id
+        elif op == 'record':
+            day = daily_records.get(entry['date'], [])
+            if any(r['task'] == entry['task'] and r['start'] == entry['start'] and r['end'] == entry['end']
+                   for r in day):
+                continue
+        apply_entry(table, daily_records, entry)
+        rebased.append(entry)
+    return rebased, remap
+
+
+def file_signature(path):
+    """(大小, 修改时间)，用于判断文件是否已被替换；文件不存在时为 None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class JsonStream:
+    """按块解码的 JSON 流式读取基础：逐个解析顶层容器中的值
+
+    每次只解码一个缓冲块，内存占用与单个值的大小相关而与文件大小无关。
+    offset 记录最近一次 _commit 时的字节位置，可据此从中途继续读取。
+    """
+    CHUNK_SIZE = 1 << 16
+    _WHITESPACE = ' \t\r\n'
+
+    def __init__(self, path, offset=0):
+        self.path = path
+        self.offset = offset
+        self.exhausted = False
+        self._decoder = json.JSONDecoder()
+        self._file = None
+
+    def _open(self):
+        self._file = open(self.path, 'rb')
+        self._file.seek(self.offset)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        # 补读时已从缓冲中丢弃、尚未计入 offset 的字节数
+        self._dropped = 0
+        self._eof = False
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _fill(self):
+        chunk = self._file.read(self.CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        self._dropped += len(self._buf[:self._pos].encode('utf-8'))
+        self._buf = self._buf[self._pos:] + self._utf8.decode(chunk)
+        self._pos = 0
+        return True
+
+    def _commit(self):
+        # 丢弃已解析的前缀，并把其字节数计入 offset
+        self.offset += self._dropped + len(self._buf[:self._pos].encode('utf-8'))
+        self._dropped = 0
+        self._buf = self._buf[self._pos:]
+        self._pos = 0
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in self._WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise json.JSONDecodeError(f'Expecting {char!r}', self._buf, self._pos)
+        self._pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # 值恰好结束在缓冲末尾时可能被截断 (如数字)，再读一块确认
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def items(self):
+        """逐个产出顶层数组中的元素"""
+        self._open()
+        try:
+            self._expect('[')
+            while True:
+                char = self._peek()
+                if char == ',':
+                    self._pos += 1
+                    continue
+                if char in (']', None):
+                    self.exhausted = True
+                    return
+                value = self._value()
+                self._commit()
+                yield value
+        finally:
+            self.close()
+
+    def first_char(self):
+        """首个非空白字符，用于区分顶层是数组还是对象"""
+        self._open()
+        try:
+            return self._peek()
+        finally:
+            self.close()
+
+
+class SnapshotReader(JsonStream):
+    """流式读取快照中的 daily_records，按文件中的顺序 (日期倒序) 逐天产出
+
+    offset 记录最后一个完整产出的日期之后的字节位置，可据此从中途继续读取。
+    """
+
+    def __init__(self, path, resume_offset=None):
+        super().__init__(path, resume_offset or 0)
+        self.signature = file_signature(path)
+        # daily_records 以外的顶层键 (tasks、version 等)
+        self.header = {}
+        self.journal_seq = 0
+        self._resume = resume_offset is not None
+        if not self._resume:
+            self.journal_seq = self._tail_journal_seq()
+
+    def _tail_journal_seq(self):
+        # 合并写出的快照把 journal_seq 放在末尾，只需读最后一小段
+        with open(self.path, 'rb') as f:
+            f.seek(max(0, self.signature[0] - 128))
+            tail = f.read().decode('utf-8', errors='ignore')
+        match = re.search(r'"journal_seq"\s*:\s*(\d+)\s*}\s*$', tail)
+        return int(match.group(1)) if match else 0
+
+    @property
+    def tasks(self):
+        return self.header.get('tasks', [])
+
+    def _header(self):
+        """解析到 daily_records 对象内部；文件中没有 daily_records 时返回 False"""
+        self._expect('{')
+        return self._members()
+
+    def _members(self):
+        # 逐个解析顶层键值，遇到 daily_records 时停在其内部并返回 True
+        while True:
+            char = self._peek()
+            if char == ',':
+                self._pos += 1
+                continue
+            if char in ('}', None):
+                return False
+            key = self._value()
+            self._expect(':')
+            if key == 'daily_records':
+                self._expect('{')
+                return True
+            value = self._value()
+            self.header[key] = value
+            if key == 'journal_seq':
+                self.journal_seq = value
+
+    def days(self):
+        """逐天产出 (date, records)；读完后 exhausted 为 True"""
+        self._open()
+        try:
+            if not self._resume and not self._header():
+                self.exhausted = True
+                return
+            self._commit()
+            while True:
+                char = self._peek()
+                if char == ',':
+                    self._pos += 1
+                    continue
+                if char in ('}', None):
+                    # daily_records 之后的顶层键 (如 tasks 写在后面的情况)
+                    self._pos += 1
+                    self._members()
+                    self.exhausted = True
+                    return
+                date = self._value()
+                self._expect(':')
+                records = self._value()
+                self._commit()
+                yield date, records
+        finally:
+            self.close()
+
+
+class HistoryWindow:
+    """按需加载的更早历史：记录快照中已读到的位置
+
+    记录按稳定的任务 id 引用任务，之后的重命名、合并与删除都在任务表中解析，
+    读入更早的记录时无需重放任何操作。
+    """
+
+    def __init__(self, data_file, reader, loaded_from, name_ids):
+        self.data_file = data_file
+        self.offset = reader.offset
+        self.signature = reader.signature
+        self.loaded_from = loaded_from
+        # 旧版快照中任务名 -> id
+        self.name_ids = name_ids
+
+    def load_before(self, date_str):
+        """读入早于 loaded_from 且不早于 date_str 的各天，返回 {date: records}
+
+        快照在此期间被合并替换时，从新快照开头重新定位。
+        """
+        if date_str >= self.loaded_from:
+            return {}
+        days = {}
+        if not os.path.exists(self.data_file):
+            self.loaded_from = ''
+            return days
+        reopened = file_signature(self.data_file) != self.signature
+        if reopened:
+            reader = SnapshotReader(self.data_file)
+        else:
+            reader = SnapshotReader(self.data_file, resume_offset=self.offset)
+        stream = reader.days()
+        for day, records in stream:
+            if reopened:
+                # 合并写出的新快照总是新格式
+                self.name_ids = legacy_name_ids(reader.header)
+                reopened = False
+            if day >= self.loaded_from:
+                continue
+            self.loaded_from = day
+            records = upgrade_records(records, self.name_ids)
+            if records:
+                days[day] = records
+            if day <= date_str:
+                break
+        stream.close()
+        self.offset, self.signature = reader.offset, reader.signature
+        if reader.exhausted:
+            self.loaded_from = ''
+        return days
+
+    @property
+    def complete(self):
+        return self.loaded_from == ''
+
+
+def replay_journal(data_file, table, daily_records, last_seq):
+    """把 seq 大于 last_seq 的日志应用到任务表与按天记录上，返回最后一条日志的 seq"""
+    journal = journal_path(data_file)
+    # .old 为合并进行中被轮换出来的日志，其条目早于当前日志
+    for path in (journal + '.old', journal):
+        for entry in read_journal(path):
+            if entry.get('seq', 0) <= last_seq:
+                continue
+            apply_entry(table, daily_records, entry)
+            last_seq = entry['seq']
+    return last_seq
+
+
+@traced('read_data')
+def read_data(data_file, since=None):
+    """读取快照并重放未合并的日志，返回 (data, 最后一条日志的 seq, HistoryWindow 或 None)
+
+    data 为 {"table": TaskTable, "daily_records": {date: [记录]}}，记录按 id 引用任务。
+    给出 since ('YYYY-MM-DD') 时流式读取快照，只解析不早于 since 的天 (依赖
+    daily_records 按日期倒序保存)，更早的部分由返回的 HistoryWindow 按需加载；
+    全部读完时第三项为 None。
+    """
+    raw = {}
+    reader = None
+    if os.path.exists(data_file):
+        if since is None:
+            with open(data_file, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+        else:
+            reader = SnapshotReader(data_file)
+            raw_days = {}
+            previous = None
+            stream = reader.days()
+            for date_str, records in stream:
+                raw_days[date_str] = records
+                # 日期若未按倒序保存则无法提前停止，退化为完整读取
+                if previous is not None and date_str > previous:
+                    since = ''
+                previous = date_str
+                if date_str < since:
+                    break
+            stream.close()
+            raw = dict(reader.header, daily_records=raw_days, journal_seq=reader.journal_seq)
+    table, daily_records, name_ids = load_snapshot(raw)
+    # 快照中已读到的最早日期 (日志重放可能补入更早的天，不计入)
+    loaded_from = min(raw.get('daily_records', {}), default=since)
+    last_seq = replay_journal(data_file, table, daily_records, raw.get('journal_seq', 0))
+
+    history = None
+    if reader is not None and not reader.exhausted:
+        history = HistoryWindow(data_file, reader, loaded_from, name_ids)
+    return {'table': table, 'daily_records': daily_records}, last_seq, history
+
+
+class BinaryHistory:
+    """二进制快照模式下按需加载的更早历史，接口与 HistoryWindow 相同
+
+    load_before 返回 binsnap.Columns。每次读取时重新映射文件，不长期占用；
+    快照在此期间过期 (如 todo.json 被外部修改) 时先同步重建。
+    """
+
+    def __init__(self, data_file, loaded_from):
+        self.data_file = data_file
+        self.loaded_from = loaded_from
+
+    def load_before(self, date_str):
+        if date_str >= self.loaded_from:
+            return Columns()
+        snapshot = open_binary(self.data_file)
+        if snapshot is None:
+            rebuild_binary(self.data_file)
+            snapshot = open_binary(self.data_file)
+            if snapshot is None:
+                raise OSError('二进制快照不可用')
+        with snapshot:
+            columns = snapshot.range(day_seconds(date_str), day_seconds(self.loaded_from))
+            first = snapshot.first_start()
+        # 记录按开始时间排序，最早一条已读入即完整
+        if first is None or first >= day_seconds(date_str):
+            self.loaded_from = ''
+        else:
+            self.loaded_from = date_str
+        return columns
+
+    @property
+    def complete(self):
+        return self.loaded_from == ''
+
+
+@traced('read_binary')
+def read_binary(data_file, since=None):
+    """从二进制快照读取并重放未合并的日志，返回值同 read_data；快照不可用时返回 None
+
+    data 中另有 "columns" (binsnap.Columns)：快照中开始时间不早于 since 的记录；
+    "daily_records" 只含日志重放补入的记录。
+    """
+    if not BINARY_SNAPSHOT:
+        return None
+    snapshot = open_binary(data_file)
+    if snapshot is None:
+        return None
+    with snapshot:
+        table = snapshot.table
+        lo = day_seconds(since) if since else None
+        columns = snapshot.range(lo)
+        first = snapshot.first_start()
+        journal_seq = snapshot.journal_seq
+    daily_records = {}
+    last_seq = replay_journal(data_file, table, daily_records, journal_seq)
+    history = None
+    if lo is not None and first is not None and first < lo:
+        history = BinaryHistory(data_file, since)
+    return {'table': table, 'daily_records': daily_records, 'columns': columns}, last_seq, history
+
+
+@traced('write_binary')
+def save_binary(data_file, table, columns, journal_seq=0, source=None):
+    """按刚写出的 todo.json 生成二进制快照；只是缓存，写入失败时忽略
+
+    source 为写出时取得的 todo.json 签名，省略时现取 (期间被外部替换会记错来源)。
+    """
+    if not BINARY_SNAPSHOT:
+        return
+    try:
+        write_binary(binary_path(data_file), table, columns, journal_seq, source or file_signature(data_file))
+    except OSError:
+        pass
+
+
+def rebuild_binary(data_file):
+    """完整读取 todo.json (不含日志) 并重新生成二进制快照"""
+    if not BINARY_SNAPSHOT or not os.path.exists(data_file):
+        return
+    source = file_signature(data_file)
+    with open(data_file, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    table, daily_records, _ = load_snapshot(raw)
+    if file_signature(data_file) != source:
+        # 读取期间被替换，由写入新文件的一方负责生成
+        return
+    try:
+        write_binary(binary_path(data_file), table, columns_from_days(daily_records),
+                     raw.get('journal_seq', 0), source)
+    except OSError:
+        pass
+
+
+def rebuild_binary_async(data_file):
+    """在后台线程中重新生成二进制快照"""
+    def run():
+        try:
+            rebuild_binary(data_file)
+        except (OSError, ValueError):
+            pass
+    threading.Thread(target=run, name='binsnap', daemon=True).start()
+
+
+class Journal:
+    """追加式日志写入与后台合并"""
+
+    def __init__(self, data_file, last_seq=0, on_write=None):
+        self.data_file = data_file
+        self.path = journal_path(data_file)
+        # 合并写出快照后以 (写出前的签名, 写出后的签名) 调用，供文件监视区分自己的写入
+        self.on_write = on_write
+        self.seq = last_seq
+        self.pending = sum(1 for path in (self.path + '.old', self.path) for _ in read_journal(path))
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._fp = None
+
+    def append(self, entry):
+        """追加一条日志并落盘，返回其 seq"""
+        with self._lock:
+            self.seq += 1
+            line = json.dumps(dict(entry, seq=self.seq), ensure_ascii=False)
+            if self._fp is None:
+                self._fp = open(self.path, 'a', encoding='utf-8')
+            self._fp.write(line + '\n')
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+            self.pending += 1
+            return self.seq
+
+    def compact_async(self):
+        """在后台线程中合并日志，已有合并在进行时直接返回"""
+        if self._compact_lock.locked():
+            return
+        threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        """把日志合并进快照：轮换日志 -> 重放 -> 原子写快照 -> 删除旧日志"""
+        if not self._compact_lock.acquire(blocking=False):
+            return
+        try:
+            old_path = self.path + '.old'
+            with self._lock:
+                # 上次合并中断时 .old 仍在，先把它合并掉，本轮不再轮换
+                if not os.path.exists(old_path) and os.path.exists(self.path):
+                    if self._fp is not None:
+                        self._fp.close()
+                        self._fp = None
+                    os.replace(self.path, old_path)
+                    self.pending = 0
+            if not os.path.exists(old_path):
+                return
+
+            # 读取与写回之间快照被其他程序替换时重读，不覆盖外部的修改
+            while True:
+                source = file_signature(self.data_file)
+                raw = {}
+                if source is not None:
+                    with open(self.data_file, 'r', encoding='utf-8') as f:
+                        raw = json.load(f)
+                table, daily_records, _ = load_snapshot(raw)
+                last_seq = raw.get('journal_seq', 0)
+                for entry in read_journal(old_path):
+                    if entry.get('seq', 0) <= last_seq:
+                        continue
+                    apply_entry(table, daily_records, entry)
+                    last_seq = entry['seq']
+                if file_signature(self.data_file) == source:
+                    break
+
+            written = write_json_atomic(self.data_file, snapshot_data(table, daily_records, last_seq))
+            if self.on_write is not None:
+                self.on_write(source, written)
+            save_binary(self.data_file, table, columns_from_days(daily_records), last_seq, written)
+            os.remove(old_path)
+        finally:
+            self._compact_lock.release()
+
+    @contextmanager
+    def exclusive(self):
+        """等待进行中的合并结束，期间不再开始新的合并 (由调用方直接改写快照，如导入合并)"""
+        with self._compact_lock:
+            yield
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+
+
+class SnapshotWriter:
+    """专用的写线程：request() 只做标记，线程稍候片刻后调用 save() 完成一次完整写入
+
+    等待期间与写入期间到来的请求都合并为下一次写入；flush() 立即写出并等待完成。
+    save 抛出的异常记在 error 中，由主线程取出提示。
+    """
+
+    def __init__(self, save, delay=SAVE_COALESCE_SECONDS):
+        self._save = save
+        self._delay = delay
+        self._cond = threading.Condition()
+        self._dirty = False
+        self._busy = False
+        self._urgent = False
+        self._closing = False
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name='writer', daemon=True)
+        self._thread.start()
+
+    def request(self):
+        with self._cond:
+            self._dirty = True
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._dirty or self._closing)
+                if not self._dirty:
+                    return
+                # 合并窗口内的后续变更；flush / close 时不再等待
+                deadline = time.monotonic() + self._delay
+                while not (self._urgent or self._closing):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._dirty = False
+                self._busy = True
+            try:
+                self._save()
+            except Exception as e:
+                self.error = e
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def pop_error(self):
+        error, self.error = self.error, None
+        return error
+
+    def flush(self, timeout=None):
+        """写出尚未写入的变更并等待完成；超时返回 False"""
+        with self._cond:
+            self._urgent = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(lambda: not self._dirty and not self._busy, timeout)
+            self._urgent = False
+            return done
+
+    def close(self, timeout=None):
+        done = self.flush(timeout)
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return done
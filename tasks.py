@@ -0,0 +1,206 @@
+"""任务表：稳定的整数 id、名称 -> id 的哈希索引与合并别名
+
+计时记录只保存任务 id。重命名、合并以及“保留记录”的删除都只修改任务表，
+不触及任何记录；被合并任务的旧 id 记在 aliases 中，读取记录时解析到现存任务。
+id 只增不减，已删除任务的 id 不会被复用。
+
+变更以日志条目的形式应用 (见 storage.py)：
+    {"op": "add_task", "id": 3, "name": "高数"}
+    {"op": "rename_task", "id": 3, "name": "高数_记录", "to_end": true}
+    {"op": "merge_task", "id": 3, "into": 1}
+    {"op": "delete_task", "id": 3}
+旧版按名称引用任务的条目 (无 id) 仍可应用。
+"""
+
+
+class TaskTable:
+    def __init__(self):
+        # id -> 名称，按任务列表的显示顺序
+        self.names = {}
+        # 名称 -> id
+        self.index = {}
+        # 已合并的 id -> 现存任务 id (始终直接指向现存任务)
+        self.aliases = {}
+        self.next_id = 1
+        # 每次增删、改名、合并加一，供界面判断任务表是否变化
+        self.version = 0
+
+    @classmethod
+    def from_data(cls, data):
+        """由快照中的 tasks / aliases / next_id 构建；旧格式的任务 (无 id) 按顺序编号"""
+        table = cls()
+        for task in data.get('tasks', []):
+            if task.get('name') not in table.index:
+                table.add(task['name'], task.get('id'))
+        for alias, target in data.get('aliases', {}).items():
+            table.aliases[int(alias)] = target
+        table.next_id = max(table.next_id, data.get('next_id', 0), max(table.aliases, default=0) + 1)
+        return table
+
+    def to_data(self):
+        data = {'tasks': [{'id': task_id, 'name': name} for task_id, name in self.names.items()]}
+        if self.aliases:
+            data['aliases'] = {str(alias): target for alias, target in self.aliases.items()}
+        data['next_id'] = self.next_id
+        return data
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, task_id):
+        return task_id in self.names
+
+    def resolve(self, task_id):
+        """记录中的任务 id -> 现存任务 id；任务已删除时返回 None"""
+        task_id = self.aliases.get(task_id, task_id)
+        return task_id if task_id in self.names else None
+
+    def combine(self, totals):
+        """{记录中的任务 id: 值} 按现存任务合并，已删除任务的值丢弃"""
+        combined = {}
+        for task_id, value in totals.items():
+            task_id = self.resolve(task_id)
+            if task_id is not None:
+                combined[task_id] = combined.get(task_id, 0) + value
+        return combined
+
+    def ids_for(self, task_ids):
+        """现存任务 id 集合 -> 记录中可能出现的 id 集合 (含并入这些任务的旧 id)"""
+        ids = set(task_ids)
+        ids.update(alias for alias, target in self.aliases.items() if target in ids)
+        return ids
+
+    # ---- 变更 ----
+    def add(self, name, task_id=None):
+        if task_id is None:
+            task_id = self.next_id
+        self.names[task_id] = name
+        self.index[name] = task_id
+        self.next_id = max(self.next_id, task_id + 1)
+        self.version += 1
+        return task_id
+
+    def rename(self, task_id, name, to_end=False):
+        del self.index[self.names[task_id]]
+        if to_end:
+            del self.names[task_id]
+        self.names[task_id] = name
+        self.index[name] = task_id
+        self.version += 1
+
+    def merge(self, task_id, into):
+        """把 task_id 并入 into：task_id 及指向它的别名都改指 into"""
+        del self.index[self.names.pop(task_id)]
+        for alias, target in self.aliases.items():
+            if target == task_id:
+                self.aliases[alias] = into
+        self.aliases[task_id] = into
+        self.version += 1
+
+    def delete(self, task_id):
+        """删除任务，返回其记录应一并删除的 id 集合 (自身及并入它的旧 id)"""
+        del self.index[self.names.pop(task_id)]
+        dropped = {task_id}
+        for alias, target in list(self.aliases.items()):
+            if target == task_id:
+                dropped.add(alias)
+                del self.aliases[alias]
+        self.version += 1
+        return dropped
+
+    def archive(self, task_id):
+        """“仅删除任务、保留记录”：改名为 <名称>_记录 并移到末尾，同名任务已存在时并入该任务
+
+        返回实际执行的日志条目。
+        """
+        name = f'{self.names[task_id]}_记录'
+        target = self.index.get(name)
+        if target is not None:
+            entry = {'op': 'merge_task', 'id': task_id, 'into': target}
+        else:
+            entry = {'op': 'rename_task', 'id': task_id, 'name': name, 'to_end': True}
+        self.apply(entry)
+        return entry
+
+    def apply(self, entry):
+        """应用一条任务相关的日志条目，返回记录应被删除的任务 id 集合"""
+        op = entry.get('op')
+        task_id = entry.get('id')
+        if task_id is None and 'name' in entry and op != 'add_task':
+            # 旧版条目按名称引用任务
+            task_id = self.index.get(entry['name'])
+        if op == 'add_task':
+            if entry['name'] not in self.index:
+                self.add(entry['name'], task_id)
+        elif task_id not in self.names:
+            pass
+        elif op == 'rename_task':
+            self.rename(task_id, entry['name'], entry.get('to_end', False))
+        elif op == 'merge_task':
+            if entry['into'] in self.names and entry['into'] != task_id:
+                self.merge(task_id, entry['into'])
+        elif op == 'delete_task':
+            if 'id' not in entry and entry.get('keep_records'):
+                self.archive(task_id)
+            else:
+                return self.delete(task_id)
+        return set()
+
+
+class NameIndex:
+    """任务名的子串索引：字符 -> 含该字符的任务 id 集合
+
+    查询时取查询串中各字符集合的交集作为候选，再逐个确认子串；在上一次查询
+    结果的基础上继续输入 (新查询包含旧查询) 时只在上次的结果中筛选。
+    sync() 与任务表比对，只更新名称变化的任务，不整体重建。不区分大小写。
+    """
+
+    def __init__(self):
+        # id -> 小写名称 (已建索引的状态)
+        self.names = {}
+        self.postings = {}
+        self._last = None
+
+    def sync(self, names):
+        """与 {id: 名称} 对齐，返回索引是否有变化"""
+        changed = False
+        for task_id in [task_id for task_id in self.names if task_id not in names]:
+            self._remove(task_id)
+            changed = True
+        for task_id, name in names.items():
+            name = name.lower()
+            if self.names.get(task_id) != name:
+                if task_id in self.names:
+                    self._remove(task_id)
+                self._add(task_id, name)
+                changed = True
+        if changed:
+            self._last = None
+        return changed
+
+    def _add(self, task_id, name):
+        self.names[task_id] = name
+        for char in set(name):
+            self.postings.setdefault(char, set()).add(task_id)
+
+    def _remove(self, task_id):
+        for char in set(self.names.pop(task_id)):
+            ids = self.postings[char]
+            ids.discard(task_id)
+            if not ids:
+                del self.postings[char]
+
+    def search(self, query):
+        """名称包含 query 的任务 id 集合"""
+        query = query.lower()
+        if self._last is not None and self._last[0] in query:
+            candidates = self._last[1]
+        else:
+            sets = sorted((self.postings.get(char, set()) for char in set(query)), key=len)
+            candidates = set.intersection(*sets) if sets else set(self.names)
+        matches = {task_id for task_id in candidates if query in self.names[task_id]}
+        self._last = (query, matches)
+        return matches
@@ -0,0 +1,50 @@
+"""二进制快照损坏时应被忽略，读取回退到 todo.json"""
+import json
+import os
+import sys
+import unittest
+from array import array
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from binsnap import SUPPORTED, BinarySnapshot, Columns, binary_path, open_binary, write_binary  # noqa: E402
+from tasks import TaskTable  # noqa: E402
+
+
+@unittest.skipUnless(SUPPORTED, '二进制快照只在小端机器上启用')
+class TruncatedSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.data_file = os.path.join(self._tmp.name, 'todo.json')
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': 2, 'tasks': [{'id': 1, 'name': '高数'}], 'daily_records': {}}, f)
+        table = TaskTable()
+        table.add('高数')
+        n = 100
+        columns = Columns(array('i', [1] * n), array('q', range(0, n * 60, 60)),
+                          array('q', range(30, n * 60, 60)), array('q', [30] * n))
+        st = os.stat(self.data_file)
+        self.path = binary_path(self.data_file)
+        write_binary(self.path, table, columns, 0, (st.st_size, st.st_mtime_ns))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_intact(self):
+        snapshot = open_binary(self.data_file)
+        self.assertIsNotNone(snapshot)
+        with snapshot:
+            self.assertEqual(len(snapshot.range()), 100)
+
+    def test_truncated(self):
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 20)
+        with self.assertRaises(ValueError):
+            BinarySnapshot(self.path)
+        self.assertIsNone(open_binary(self.data_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
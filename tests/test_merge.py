@@ -0,0 +1,94 @@
+"""多文件合并：按日期归并，任务按名称对应，重复的记录只保留一条"""
+import json
+import os
+import sys
+import unittest
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from merge import merge_files  # noqa: E402
+
+
+def rec(task, start, end, duration):
+    return {'task': task, 'start': start, 'end': end, 'duration': duration}
+
+
+class KWayMergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.output = self._path('merged.json')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self._tmp.name, name)
+
+    def _write(self, name, data, journal=()):
+        path = self._path(name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(dict(data, version=2), f, ensure_ascii=False)
+        if journal:
+            with open(os.path.splitext(path)[0] + '.journal', 'w', encoding='utf-8') as f:
+                for seq, entry in enumerate(journal, 1):
+                    f.write(json.dumps(dict(entry, seq=seq), ensure_ascii=False) + '\n')
+        return path
+
+    def _read_output(self):
+        with open(self.output, encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_duplicates_across_files_are_dropped(self):
+        desktop = self._write('desktop.json', {
+            'tasks': [{'id': 1, 'name': '高数'}, {'id': 2, 'name': '英语'}], 'next_id': 3,
+            'daily_records': {
+                '2025-03-09': [rec(1, '09:00:00', '10:00:00', 3600)],
+                '2025-03-07': [rec(2, '20:00:00', '20:30:00', 1800)],
+            }})
+        # 笔记本上“英语”的 id 是 1，“物理”是这里新建的
+        laptop = self._write('laptop.json', {
+            'tasks': [{'id': 1, 'name': '英语'}, {'id': 2, 'name': '物理'}], 'next_id': 3,
+            'daily_records': {
+                '2025-03-08': [rec(2, '08:00:00', '08:45:00', 2700)],
+                '2025-03-07': [rec(1, '20:00:00', '20:30:00', 1800), rec(1, '21:00:00', '21:10:00', 600)],
+            }})
+        report = merge_files([desktop, laptop], self.output)
+
+        data = self._read_output()
+        self.assertEqual(data['tasks'], [{'id': 1, 'name': '高数'}, {'id': 2, 'name': '英语'},
+                                         {'id': 3, 'name': '物理'}])
+        self.assertEqual(list(data['daily_records']), ['2025-03-09', '2025-03-08', '2025-03-07'])
+        self.assertEqual(data['daily_records']['2025-03-08'], [rec(3, '08:00:00', '08:45:00', 2700)])
+        self.assertEqual(data['daily_records']['2025-03-07'], [rec(2, '20:00:00', '20:30:00', 1800),
+                                                               rec(2, '21:00:00', '21:10:00', 600)])
+        self.assertEqual(report['duplicates'], 1)
+        self.assertEqual(report['records'], 4)
+        self.assertEqual(report['added_tasks'], 1)
+
+    def test_same_file_twice_adds_nothing(self):
+        path = self._write('todo.json', {
+            'tasks': [{'id': 1, 'name': '高数'}], 'next_id': 2,
+            'daily_records': {'2025-03-09': [rec(1, '09:00:00', '10:00:00', 3600)]}})
+        report = merge_files([path, path], self.output)
+        self.assertEqual(report['records'], 1)
+        self.assertEqual(report['duplicates'], 1)
+
+    def test_journal_records_are_merged_and_deduplicated(self):
+        desktop = self._write('desktop.json', {
+            'tasks': [{'id': 1, 'name': '高数'}], 'next_id': 2,
+            'daily_records': {'2025-03-09': [rec(1, '09:00:00', '10:00:00', 3600)]}})
+        laptop = self._write('laptop.json', {'tasks': [{'id': 1, 'name': '高数'}], 'next_id': 2,
+                                             'daily_records': {}}, journal=[
+            dict(rec(1, '09:00:00', '10:00:00', 3600), op='record', date='2025-03-09'),
+            dict(rec(1, '11:00:00', '11:20:00', 1200), op='record', date='2025-03-09'),
+        ])
+        report = merge_files([desktop, laptop], self.output)
+        records = self._read_output()['daily_records']['2025-03-09']
+        self.assertEqual([r['start'] for r in records], ['09:00:00', '11:00:00'])
+        self.assertEqual(report['duplicates'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
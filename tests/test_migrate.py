@@ -0,0 +1,49 @@
+"""迁移不能丢失数据：任务表写在 daily_records 之后的快照同样完整迁移"""
+import json
+import os
+import sys
+import unittest
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrate import migrate_file  # noqa: E402
+from storage import read_data  # noqa: E402
+
+
+class KeyOrderTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, 'todo.json')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write(self, text):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_tasks_after_daily_records(self):
+        self._write('{"version": 2, "daily_records": {"2025-03-08": '
+                    '[{"task": 1, "start": "09:00:00", "end": "09:30:00", "duration": 1800}]}, '
+                    '"tasks": [{"id": 1, "name": "高数"}], "next_id": 2}')
+        report = migrate_file(self.path)
+        self.assertEqual(report['status'], 'migrated')
+        self.assertEqual(report['skipped'], 0)
+        data = read_data(self.path)[0]
+        self.assertEqual(data['table'].names, {1: '高数'})
+        self.assertEqual(data['daily_records']['2025-03-08'][0]['duration'], 1800)
+        # 改写后任务表在前
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(list(json.load(f)), ['version', 'tasks', 'next_id', 'daily_records'])
+
+    def test_current_layout_unchanged(self):
+        self._write(json.dumps({'version': 2, 'tasks': [{'id': 1, 'name': '高数'}], 'next_id': 2,
+                                'daily_records': {'2025-03-08': [
+                                    {'task': 1, 'start': '09:00:00', 'end': '09:30:00', 'duration': 1800}]}}))
+        self.assertEqual(migrate_file(self.path)['status'], 'unchanged')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""无界面报表：读取失败时输出到 stderr 并返回非零退出码；扇形图选项只作用于本次报表"""
+import contextlib
+import io
+import json
+import os
+import sys
+import unittest
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import charts  # noqa: E402
+import report  # noqa: E402
+
+
+class CorruptDataReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.data_file = os.path.join(self._tmp.name, 'todo.json')
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            f.write('{"version": 2, "tasks": [')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_corrupt_data(self):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            code = report.main_cli(['--data', self.data_file, '--output', os.path.join(self._tmp.name, 'out')])
+        self.assertEqual(code, 1)
+        self.assertIn('读取数据文件失败', stderr.getvalue())
+
+
+class PieOptionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.data_file = os.path.join(self._tmp.name, 'todo.json')
+        tasks = [{'id': i, 'name': f'任务{i}'} for i in range(1, 6)]
+        records = [{'task': i, 'start': f'{8 + i:02}:00:00', 'end': f'{8 + i:02}:{10 * i:02}:00', 'duration': 600 * i}
+                   for i in range(1, 6)]
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': 2, 'tasks': tasks, 'next_id': 6, 'daily_records': {'2025-03-08': records}}, f)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_options_reach_slices_without_changing_defaults(self):
+        defaults = charts.PIE_TOP_N, charts.PIE_MIN_SHARE
+        app = report.Dataset(self.data_file)
+        app.load_data()
+        view = {'period': '自定义', 'chart_type': '饼图', 'sub_period': '按天', 'force_day': None, 'now': None,
+                'custom': {'start': '2025-03-08', 'end': '2025-03-08', 'granularity': 'hour', 'tasks': None},
+                'pie': (2, 0)}
+        spec = app._custom_statistics(view)
+        app.close()
+        self.assertEqual(spec['slices'][0], ['任务4', '任务5', charts.OTHER_LABEL])
+        self.assertEqual(len(spec['labels']), 5)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            code = report.main_cli(['--data', self.data_file, '--period', '2025-03-08', '--chart', 'pie',
+                                    '--pie-top', '2', '--workers', '1', '--output', os.path.join(self._tmp.name, 'out')])
+        self.assertEqual(code, 0)
+        self.assertEqual((charts.PIE_TOP_N, charts.PIE_MIN_SHARE), defaults)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""区间查询与汇总索引：跨桶记录按比例拆分，增量记入与撤销后应与重新构建的结果一致"""
+import os
+import sys
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats import (DAY_SECONDS, HOUR_SECONDS, RecordStore, Rollups, bucket_keys, day_seconds,  # noqa: E402
+                   parse_period)
+
+
+class RollupsRemoveTest(unittest.TestCase):
+
+    def setUp(self):
+        # 2025-03-09 23:00 — 03-10 01:00，跨过零点
+        self.start = day_seconds('2025-03-09') + 23 * 3600
+        self.record = (1, self.start, self.start + 2 * 3600, 7200)
+        self.day = self.start // DAY_SECONDS
+
+    def test_add_then_remove_record_spanning_two_days(self):
+        rollups = Rollups()
+        rollups.add(*self.record)
+        self.assertEqual(rollups.totals, {self.day: 3600, self.day + 1: 3600})
+        self.assertEqual(rollups.weeks[(2025, 10)], {1: 3600})
+        self.assertEqual(rollups.weeks[(2025, 11)], {1: 3600})
+        rollups.remove(*self.record)
+        self.assertEqual(rollups.totals, {})
+        for level in (rollups.days, rollups.weeks, rollups.months, rollups.years):
+            self.assertEqual(dict(level), {})
+
+    def test_remove_keeps_other_tasks(self):
+        rollups = Rollups()
+        rollups.add(*self.record)
+        rollups.add(2, self.start, self.start + 600, 600)
+        rollups.remove(*self.record)
+        self.assertEqual(rollups.totals, {self.day: 600})
+        self.assertEqual(dict(rollups.days), {self.day: {2: 600}})
+        self.assertEqual(dict(rollups.months), {(2025, 3): {2: 600}})
+
+    def test_remove_missing_record_is_ignored(self):
+        rollups = Rollups()
+        rollups.remove(*self.record)
+        self.assertEqual(rollups.totals, {})
+        self.assertEqual(dict(rollups.days), {})
+
+    def test_float_residue_counts_as_zero(self):
+        rollups = Rollups()
+        rollups._add_day(self.day, 1, 0.1 + 0.2)
+        rollups.remove(1, self.start, self.start + 1, 0.3)
+        self.assertEqual(rollups.totals, {})
+        self.assertEqual(dict(rollups.years), {})
+
+    def test_matches_rebuild(self):
+        store = RecordStore()
+        store.append(*self.record)
+        store.append(2, self.start - 3600, self.start - 1800, 1800)
+        rollups = Rollups.from_store(store)
+        rollups.add(3, self.start + 3600, self.start + 4 * 3600, 10800)
+        rollups.remove(3, self.start + 3600, self.start + 4 * 3600, 10800)
+        rebuilt = Rollups.from_store(store)
+        self.assertEqual(rollups.totals, rebuilt.totals)
+        self.assertEqual(dict(rollups.days), dict(rebuilt.days))
+        self.assertEqual(dict(rollups.years), dict(rebuilt.years))
+
+
+class RangeQueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base = day_seconds('2025-03-09')
+        self.store = RecordStore()
+        # 有意乱序追加：query 前按开始时间排序
+        self.store.append(2, self.base + 10 * 3600, self.base + 10 * 3600 + 1800, 1800)
+        # 前一天 23:30 — 当天 00:30，跨过零点
+        self.store.append(1, self.base - 1800, self.base + 1800, 3600)
+        self.store.append(1, self.base + DAY_SECONDS + 3600, self.base + DAY_SECONDS + 7200, 3600)
+
+    def test_record_started_before_range_counts_its_overlap(self):
+        result = self.store.query(self.base, self.base + DAY_SECONDS)
+        self.assertEqual(result.totals, {1: 1800, 2: 1800})
+        self.assertEqual(result.records, 2)
+        self.assertEqual(result.buckets, {self.base // DAY_SECONDS: {1: 1800, 2: 1800}})
+
+    def test_task_filter_and_hour_buckets(self):
+        result = self.store.query(self.base, self.base + DAY_SECONDS, {2}, 'hour')
+        self.assertEqual(result.buckets, {self.base // HOUR_SECONDS + 10: {2: 1800}})
+        self.assertEqual(len(bucket_keys(self.base, self.base + DAY_SECONDS, 'hour')), 24)
+
+    def test_rollups_query_matches_store(self):
+        lo, hi = self.base - DAY_SECONDS, self.base + 2 * DAY_SECONDS
+        rollups = Rollups.from_store(self.store)
+        for granularity in ('day', 'week', 'month', 'year'):
+            expected = self.store.query(lo, hi, None, granularity)
+            result = rollups.query(lo, hi, None, granularity)
+            self.assertEqual(result.buckets, expected.buckets, granularity)
+            self.assertEqual(result.totals, expected.totals, granularity)
+        with self.assertRaises(ValueError):
+            rollups.query(lo, hi, None, 'hour')
+
+    def test_week_buckets_start_on_monday(self):
+        # 2025-03-09 是周日，下一天是新的一周
+        keys = bucket_keys(self.base, self.base + 2 * DAY_SECONDS, 'week')
+        self.assertEqual(keys, [self.base // DAY_SECONDS - 6, self.base // DAY_SECONDS + 1])
+
+    def test_parse_period(self):
+        today = date(2025, 3, 9)
+        self.assertEqual(parse_period('2024-02', today), ('2024-02', date(2024, 2, 1), date(2024, 2, 29)))
+        self.assertEqual(parse_period('本周', today)[1:], (date(2025, 3, 3), date(2025, 3, 9)))
+        self.assertEqual(parse_period('2024~2025-01', today)[1:], (date(2024, 1, 1), date(2025, 1, 31)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""日志：合并进快照后的重放不重复、不遗漏，合并中断留下的 .old 日志照常重放"""
+import json
+import os
+import sys
+import unittest
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import Journal, journal_path, read_data, snapshot_data  # noqa: E402
+from tasks import TaskTable  # noqa: E402
+
+
+def record(task, start, end, duration, date='2025-03-08'):
+    return {'op': 'record', 'date': date, 'task': task, 'start': start, 'end': end, 'duration': duration}
+
+
+class JournalReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.data_file = os.path.join(self._tmp.name, 'todo.json')
+        table = TaskTable()
+        table.add('高数')
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            json.dump(snapshot_data(table, {}), f)
+        self.journal = Journal(self.data_file)
+
+    def tearDown(self):
+        self.journal.close()
+        self._tmp.cleanup()
+
+    def _records(self):
+        data, last_seq, _ = read_data(self.data_file)
+        records = [(day, r['task'], r['start']) for day, rs in data['daily_records'].items() for r in rs]
+        return data['table'], sorted(records), last_seq
+
+    def test_replay_after_compaction(self):
+        self.journal.append({'op': 'add_task', 'id': 2, 'name': '英语'})
+        self.journal.append(record(2, '09:00:00', '09:30:00', 1800))
+        self.journal.compact()
+        self.assertFalse(os.path.exists(journal_path(self.data_file)))
+        with open(self.data_file, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['journal_seq'], 2)
+
+        self.journal.append(record(1, '10:00:00', '10:30:00', 1800))
+        table, records, last_seq = self._records()
+        self.assertEqual(table.names, {1: '高数', 2: '英语'})
+        self.assertEqual(records, [('2025-03-08', 1, '10:00:00'), ('2025-03-08', 2, '09:00:00')])
+        self.assertEqual(last_seq, 3)
+
+    def test_entries_already_in_snapshot_are_skipped(self):
+        self.journal.append(record(1, '09:00:00', '09:30:00', 1800))
+        self.journal.close()
+        # 合并写出快照后、删除旧日志前中断：.old 中的条目已包含在快照里
+        journal = journal_path(self.data_file)
+        os.replace(journal, journal + '.old')
+        self.journal.compact()
+        with open(journal + '.old', 'w', encoding='utf-8') as f:
+            f.write(json.dumps(dict(record(1, '09:00:00', '09:30:00', 1800), seq=1)) + '\n')
+        _, records, last_seq = self._records()
+        self.assertEqual(records, [('2025-03-08', 1, '09:00:00')])
+        self.assertEqual(last_seq, 1)
+
+    def test_interrupted_compaction_replays_old_journal_first(self):
+        self.journal.append({'op': 'add_task', 'id': 2, 'name': '英语'})
+        self.journal.close()
+        journal = journal_path(self.data_file)
+        # 轮换后尚未写出快照即中断，之后的变更写进新的日志
+        os.replace(journal, journal + '.old')
+        self.journal.append(record(2, '09:00:00', '09:30:00', 1800))
+        table, records, last_seq = self._records()
+        self.assertIn(2, table.names)
+        self.assertEqual(records, [('2025-03-08', 2, '09:00:00')])
+        self.assertEqual(last_seq, 2)
+
+        # 下次合并先处理 .old，新日志留到之后
+        self.journal.compact()
+        self.assertFalse(os.path.exists(journal + '.old'))
+        self.assertTrue(os.path.exists(journal))
+        self.assertEqual(self._records()[1:], (records, 2))
+
+    def test_delete_task_in_journal_drops_records(self):
+        self.journal.append(record(1, '09:00:00', '09:30:00', 1800))
+        self.journal.compact()
+        self.journal.append({'op': 'delete_task', 'id': 1})
+        table, records, _ = self._records()
+        self.assertEqual(len(table), 0)
+        self.assertEqual(records, [])
+        self.journal.compact()
+        self.assertEqual(self._records()[1], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
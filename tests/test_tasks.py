@@ -0,0 +1,85 @@
+"""任务表：合并后的旧 id 解析到现存任务，删除任务时按 id 计数判断是否有记录"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats import DAY_SECONDS, RecordStore, Rollups  # noqa: E402
+from tasks import TaskTable  # noqa: E402
+
+
+class MergeAliasTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = TaskTable()
+        self.math = self.table.add('高数')
+        self.english = self.table.add('英语')
+        self.words = self.table.add('单词')
+
+    def test_merged_id_resolves_to_target(self):
+        self.table.apply({'op': 'merge_task', 'id': self.words, 'into': self.english})
+        self.assertNotIn(self.words, self.table)
+        self.assertEqual(self.table.resolve(self.words), self.english)
+        self.assertEqual(self.table.combine({self.words: 60, self.english: 30, self.math: 10}),
+                         {self.english: 90, self.math: 10})
+        self.assertEqual(self.table.ids_for({self.english}), {self.english, self.words})
+
+    def test_chained_merge_points_to_live_task(self):
+        self.table.apply({'op': 'merge_task', 'id': self.words, 'into': self.english})
+        self.table.apply({'op': 'merge_task', 'id': self.english, 'into': self.math})
+        self.assertEqual(self.table.resolve(self.words), self.math)
+        self.assertEqual(self.table.aliases, {self.words: self.math, self.english: self.math})
+
+    def test_alias_survives_round_trip(self):
+        self.table.apply({'op': 'merge_task', 'id': self.words, 'into': self.english})
+        table = TaskTable.from_data(self.table.to_data())
+        self.assertEqual(table.resolve(self.words), self.english)
+        # 已合并的 id 不会再分配给新任务
+        self.assertGreater(table.add('物理'), self.words)
+
+    def test_delete_drops_merged_ids(self):
+        self.table.apply({'op': 'merge_task', 'id': self.words, 'into': self.english})
+        dropped = self.table.delete(self.english)
+        self.assertEqual(dropped, {self.english, self.words})
+        self.assertIsNone(self.table.resolve(self.words))
+        self.assertEqual(self.table.combine({self.words: 60, self.math: 10}), {self.math: 10})
+
+    def test_version_changes_with_table(self):
+        version = self.table.version
+        self.table.resolve(self.words)
+        self.assertEqual(self.table.version, version)
+        self.table.apply({'op': 'rename_task', 'id': self.words, 'name': '背单词'})
+        self.assertGreater(self.table.version, version)
+
+
+class DeleteRecordsTest(unittest.TestCase):
+
+    def test_counts_and_drop(self):
+        table = TaskTable()
+        math, english, words = table.add('高数'), table.add('英语'), table.add('单词')
+        table.apply({'op': 'merge_task', 'id': words, 'into': english})
+        store = RecordStore()
+        store.append(math, 9 * 3600, 10 * 3600, 3600)
+        store.append(words, DAY_SECONDS + 9 * 3600, DAY_SECONDS + 9 * 3600 + 600, 600)
+        rollups = Rollups.from_store(store)
+        self.assertEqual(store.count(table.ids_for({english})), 1)
+
+        dropped = table.delete(english)
+        rollups.drop(dropped)
+        self.assertEqual(rollups.totals, {0: 3600})
+        self.assertNotIn(1, rollups.days)
+        store = store.without(dropped)
+        self.assertEqual(list(store.task_ids), [math])
+        self.assertEqual(store.count(dropped), 0)
+
+    def test_counts_follow_replace_range(self):
+        store = RecordStore()
+        store.append(1, 100, 200, 100)
+        store.append(2, 300, 400, 100)
+        store.replace_range(0, DAY_SECONDS, [(3, 500, 600, 100)])
+        self.assertEqual(dict(store.counts), {3: 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""外部修改：未写出的本地变更重新应用到新版本上，文件已被改写时不覆盖"""
+import json
+import os
+import sys
+import unittest
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import file_signature, load_snapshot, rebase_entries, write_json_atomic  # noqa: E402
+from watcher import ConflictError, FileWatcher  # noqa: E402
+
+
+def record(task, start, end='09:30:00', date='2025-03-08'):
+    return {'op': 'record', 'date': date, 'task': task, 'start': start, 'end': end, 'duration': 1800}
+
+
+class RebaseTest(unittest.TestCase):
+
+    def setUp(self):
+        # 另一台设备已新增了 id 为 2 的“物理”，并记了一条高数的记录
+        self.table, self.daily_records, _ = load_snapshot({
+            'version': 2, 'tasks': [{'id': 1, 'name': '高数'}, {'id': 2, 'name': '物理'}], 'next_id': 3,
+            'daily_records': {'2025-03-08': [{'task': 1, 'start': '08:00:00', 'end': '08:30:00',
+                                               'duration': 1800}]}})
+
+    def test_new_task_id_taken_by_other_task(self):
+        entries = [{'op': 'add_task', 'id': 2, 'name': '英语'}, record(2, '09:00:00')]
+        rebased, remap = rebase_entries(self.table, self.daily_records, entries)
+        self.assertEqual(remap, {2: 3})
+        self.assertEqual(rebased, [{'op': 'add_task', 'id': 3, 'name': '英语'}, record(3, '09:00:00')])
+        self.assertEqual(self.table.names, {1: '高数', 2: '物理', 3: '英语'})
+        self.assertEqual([r['task'] for r in self.daily_records['2025-03-08']], [1, 3])
+
+    def test_same_name_maps_to_existing_task(self):
+        entries = [{'op': 'add_task', 'id': 3, 'name': '物理'}, record(3, '09:00:00'),
+                   {'op': 'rename_task', 'id': 3, 'name': '大学物理'}]
+        rebased, remap = rebase_entries(self.table, self.daily_records, entries)
+        self.assertEqual(remap, {3: 2})
+        self.assertEqual([entry['op'] for entry in rebased], ['record', 'rename_task'])
+        self.assertEqual(self.table.names, {1: '高数', 2: '大学物理'})
+        self.assertEqual(self.table.next_id, 3)
+
+    def test_record_already_present_is_not_added_twice(self):
+        entries = [record(1, '08:00:00', '08:30:00'), record(1, '10:00:00', '10:30:00')]
+        rebased, _ = rebase_entries(self.table, self.daily_records, entries)
+        self.assertEqual(rebased, entries[1:])
+        self.assertEqual([r['start'] for r in self.daily_records['2025-03-08']], ['08:00:00', '10:00:00'])
+
+
+class WatcherWriteTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, 'todo.json')
+        self.known = write_json_atomic(self.path, {'version': 2})
+        self.changes = []
+        self.watcher = FileWatcher(lambda ms, fn: None, self.path, self.changes.append, self.known)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _external_write(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 2, 'tasks': [{'id': 1, 'name': '外部'}]}, f)
+        # 保证签名与之前不同
+        os.utime(self.path, ns=(0, self.known[1] + 10 ** 9))
+        return file_signature(self.path)
+
+    def test_own_write_is_not_a_change(self):
+        written = self.watcher.write(lambda: write_json_atomic(self.path, {'version': 2, 'next_id': 2}))
+        self.assertEqual(self.watcher.known, written)
+        self.assertFalse(self.watcher.check())
+        self.assertEqual(self.changes, [])
+
+    def test_write_refuses_to_clobber_external_change(self):
+        signature = self._external_write()
+        with self.assertRaises(ConflictError):
+            self.watcher.write(lambda: write_json_atomic(self.path, {'version': 2}))
+        with open(self.path, encoding='utf-8') as f:
+            self.assertIn('tasks', json.load(f))
+
+        self.assertTrue(self.watcher.check())
+        self.assertEqual(self.changes, [signature])
+        # 处理中不重复回调；载入后以新版本为基准写入
+        self.assertFalse(self.watcher.check())
+        self.watcher.loaded(signature)
+        self.watcher.write(lambda: write_json_atomic(self.path, {'version': 2}))
+        self.assertEqual(self.changes, [signature])
+
+    def test_write_based_on_older_copy_conflicts(self):
+        base = self.watcher.known
+        signature = self._external_write()
+        self.watcher.loaded(signature)
+        # 要写出的数据复制于外部修改载入之前
+        with self.assertRaises(ConflictError):
+            self.watcher.write(lambda: write_json_atomic(self.path, {'version': 2}), base)
+
+
+if __name__ == '__main__':
+    unittest.main()
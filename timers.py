@@ -0,0 +1,133 @@
+"""同时进行的多个计时：共用一个按整秒对齐的 tick 循环，并定期写检查点
+
+计时用单调时钟 (time.monotonic) 计算时长，系统时间被调整时不受影响；
+墙上时间只在开始时记录一次，用于确定记录的日期与起止时刻。
+tick 循环每次醒来后计算下一个“某个计时走过整秒”的时刻再安排，不会累积漂移。
+
+进行中的计时定期写入 `<数据文件名>.timers` (临时文件 + 原子重命名)：
+    {"saved": 1755740325.0, "timers": [{"task": 1, "start": 1755736725.0, "elapsed": 3600}]}
+程序崩溃后下次启动可据此继续计时或补存记录。
+"""
+import json
+import math
+import os
+import time
+
+from storage import write_json_atomic
+
+# 写检查点的间隔，秒
+CHECKPOINT_SECONDS = 30
+
+
+def timers_path(data_file):
+    return os.path.splitext(data_file)[0] + '.timers'
+
+
+def format_elapsed(seconds):
+    seconds = int(seconds)
+    return f'{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}'
+
+
+def read_checkpoint(path):
+    """读取检查点，返回 (保存时刻, [{"task", "start", "elapsed"}])；没有或损坏时为 (None, [])"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data['saved'], [t for t in data['timers'] if {'task', 'start', 'elapsed'} <= set(t)]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, []
+
+
+class TimerSet:
+    """进行中的计时 {任务 id: {"task", "start" (墙上时间), "mono" (开始时的单调时钟)}}
+
+    after(ms, fn) 用于安排下一次 tick (通常为 root.after)，返回值传给 cancel 可取消；
+    每次 tick 调用 on_tick(now)，now 为当前单调时钟。
+    """
+
+    def __init__(self, after, cancel, on_tick, checkpoint_path, checkpoint_seconds=CHECKPOINT_SECONDS):
+        self.after = after
+        self.cancel = cancel
+        self.on_tick = on_tick
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_seconds = checkpoint_seconds
+        self.timers = {}
+        self._job = None
+        self._next_checkpoint = 0
+
+    def __contains__(self, task_id):
+        return task_id in self.timers
+
+    def __len__(self):
+        return len(self.timers)
+
+    def start(self, task_id, elapsed=0, start=None):
+        """开始计时；elapsed 与 start 用于恢复检查点中的计时"""
+        now = time.monotonic()
+        self.timers[task_id] = {'task': task_id, 'start': time.time() - elapsed if start is None else start,
+                                'mono': now - elapsed}
+        self.checkpoint()
+        self._reschedule()
+        return self.timers[task_id]
+
+    def stop(self, task_id):
+        """结束计时，返回 (计时, 时长秒数)"""
+        timer = self.timers.pop(task_id)
+        elapsed = int(time.monotonic() - timer['mono'])
+        self.checkpoint()
+        self._reschedule()
+        return timer, elapsed
+
+    def rekey(self, task_id, new_id):
+        """任务改用了新 id (外部修改后本地新建的任务与外部任务的 id 冲突) 时，把计时改挂到新 id 下"""
+        timer = self.timers.pop(task_id, None)
+        if timer is not None:
+            timer['task'] = new_id
+            self.timers[new_id] = timer
+            self.checkpoint()
+
+    def elapsed(self, timer, now=None):
+        return int((time.monotonic() if now is None else now) - timer['mono'])
+
+    def _reschedule(self):
+        if self._job is not None:
+            self.cancel(self._job)
+            self._job = None
+        if self.timers:
+            self._tick()
+        else:
+            self.on_tick(time.monotonic())
+
+    def _tick(self):
+        now = time.monotonic()
+        self.on_tick(now)
+        if now >= self._next_checkpoint:
+            self.checkpoint()
+        # 下一个走过整秒的计时，略微推后以确保醒来时已越过边界
+        wait = min(1 - (now - timer['mono']) % 1 for timer in self.timers.values())
+        self._job = self.after(math.ceil(wait * 1000) + 1, self._tick)
+
+    def checkpoint(self):
+        """写出进行中的计时；没有计时时删除检查点文件"""
+        now = time.monotonic()
+        self._next_checkpoint = now + self.checkpoint_seconds
+        try:
+            if not self.timers:
+                if os.path.exists(self.checkpoint_path):
+                    os.remove(self.checkpoint_path)
+                return
+            write_json_atomic(self.checkpoint_path, {
+                'saved': time.time(),
+                'timers': [{'task': t['task'], 'start': t['start'], 'elapsed': int(now - t['mono'])}
+                           for t in self.timers.values()],
+            })
+        except OSError:
+            # 检查点只用于崩溃恢复，写入失败不影响计时
+            pass
+
+    def close(self):
+        """停止 tick 循环并写出最后一次检查点 (计时保留到下次启动)"""
+        if self._job is not None:
+            self.cancel(self._job)
+            self._job = None
+        self.checkpoint()
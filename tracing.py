@@ -0,0 +1,175 @@
+"""热点路径计时：轻量的 span、Chrome trace 导出与调试浮窗
+
+设置环境变量 CLOCKTODO_TRACE=1 (或 main.py --trace) 启用；值为文件路径时
+(或 --trace 路径) 退出时写出 Chrome trace-event 格式的 JSON，可在
+chrome://tracing 或 Perfetto 中打开。CLOCKTODO_TRACE_OVERLAY=1 (--trace-overlay)
+另外显示一个小浮窗，列出各操作最近 N 次的耗时。
+
+未启用时 span() 直接返回一个共享的空上下文，traced() 包装的函数只多一次全局变量判断。
+
+    with tracing.span('save_data'):
+        ...
+
+    @tracing.traced('refresh_task_list')
+    def refresh_task_list(self): ...
+"""
+import atexit
+import functools
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# 保留的事件条数上限，超出后丢弃最早的事件
+MAX_EVENTS = 100000
+# 浮窗中每个操作保留的最近耗时个数
+RECENT_COUNT = 20
+# 浮窗刷新间隔，毫秒
+OVERLAY_REFRESH_MS = 500
+
+_NULL_SPAN = nullcontext()
+_tracer = None
+
+
+class Tracer:
+    """收集已结束的 span：完整事件列表 (供导出) 与每个操作最近的耗时 (供浮窗)"""
+
+    def __init__(self, max_events=MAX_EVENTS, recent_count=RECENT_COUNT):
+        self.t0 = time.perf_counter()
+        self.events = deque(maxlen=max_events)
+        self.recent = {}
+        self.recent_count = recent_count
+        self.thread_names = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, start, end, args=None):
+        thread = threading.current_thread()
+        with self._lock:
+            self.events.append((name, start, end, thread.ident, args))
+            self.thread_names.setdefault(thread.ident, thread.name)
+            recent = self.recent.get(name)
+            if recent is None:
+                recent = self.recent[name] = deque(maxlen=self.recent_count)
+            recent.append((end - start) * 1000)
+
+    def summary(self):
+        """[(操作, 最近一次, 中位数, 最大值, 次数)]，单位毫秒，按名称排序"""
+        with self._lock:
+            items = [(name, list(durations)) for name, durations in self.recent.items()]
+        return [(name, d[-1], statistics.median(d), max(d), len(d)) for name, d in sorted(items)]
+
+    def chrome_trace(self):
+        """Chrome trace-event 格式：每个 span 一个完整事件 (ph: X)，时间单位微秒"""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+        trace = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                 for tid, name in thread_names.items()]
+        for name, start, end, tid, args in events:
+            event = {'name': name, 'cat': 'clocktodo', 'ph': 'X', 'pid': pid, 'tid': tid,
+                     'ts': round((start - self.t0) * 1e6, 1), 'dur': round((end - start) * 1e6, 1)}
+            if args:
+                event['args'] = args
+            trace.append(event)
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+    def export(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+
+def enable(export_path=None):
+    """开始记录；给出 export_path 时在进程退出前写出 Chrome trace 文件"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    if export_path:
+        atexit.register(_tracer.export, export_path)
+    return _tracer
+
+
+def enable_from_env():
+    """按 CLOCKTODO_TRACE 启用：'1' 只记录，其他非空值视为导出路径"""
+    value = os.environ.get('CLOCKTODO_TRACE', '')
+    if value and value != '0':
+        enable(None if value == '1' else value)
+
+
+def tracer():
+    """当前的 Tracer，未启用时为 None"""
+    return _tracer
+
+
+def span(name, **args):
+    """计时上下文；未启用时返回共享的空上下文"""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, args or None)
+
+
+def traced(name):
+    """把整个函数调用记为一个 span 的装饰器"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with _Span(_tracer, name, None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TraceOverlay:
+    """调试浮窗：置顶的小窗口，定时刷新各操作最近 N 次的耗时"""
+
+    def __init__(self, root, tracer):
+        import tkinter as tk
+        import tkinter.ttk as ttk
+
+        self.root = root
+        self.tracer = tracer
+        self.window = tk.Toplevel(root)
+        self.window.title('ClockToDo 计时')
+        self.window.attributes('-topmost', True)
+        self.window.protocol('WM_DELETE_WINDOW', self.window.withdraw)
+        columns = ('最近', '中位数', '最大', '次数')
+        self.table = ttk.Treeview(self.window, columns=columns, height=12)
+        self.table.heading('#0', text='操作')
+        self.table.column('#0', width=180)
+        for column in columns:
+            self.table.heading(column, text=column)
+            self.table.column(column, width=70, anchor='e')
+        self.table.pack(fill='both', expand=True)
+        self.root.after(OVERLAY_REFRESH_MS, self.refresh)
+
+    def refresh(self):
+        if self.window.winfo_exists():
+            for name, last, median, longest, count in self.tracer.summary():
+                values = (f'{last:.1f}', f'{median:.1f}', f'{longest:.1f}', count)
+                if self.table.exists(name):
+                    self.table.item(name, values=values)
+                else:
+                    self.table.insert('', 'end', iid=name, text=name, values=values)
+            self.root.after(OVERLAY_REFRESH_MS, self.refresh)
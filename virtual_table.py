@@ -0,0 +1,113 @@
+"""虚拟化表格：Treeview 中只保留可见的几行，滚动与排序时改写这些行的内容
+
+行数再多，Tk 中的项数也不超过可见行数，刷新代价与数据量无关。
+滚动条与滚轮由本类接管，点击表头按该列排序，再次点击反向。
+
+    table = VirtualTable(tree, scrollbar, render=lambda row: (row[0], row[1]),
+                         sort_keys={'计划': (lambda row: row[0], False)})
+    table.set_rows(rows)
+"""
+
+# 滚轮每格滚动的行数
+WHEEL_ROWS = 2
+SORT_MARKS = {False: ' ▲', True: ' ▼'}
+
+
+class VirtualTable:
+    """包装已创建的 Treeview (show='headings') 与竖直滚动条
+
+    render(row) 返回各列显示的文本；color(row) 返回行背景色 (可选)；
+    sort_keys 为 {列名: (排序键函数, 首次点击是否降序)}，未列出的列不可排序。
+    """
+
+    def __init__(self, tree, scrollbar, render, color=None, sort_keys=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.render = render
+        self.color = color
+        self.sort_keys = sort_keys or {}
+        self.height = int(tree.cget('height'))
+        self.rows = []
+        # 当前显示顺序的行
+        self.order = []
+        self.top = 0
+        self.sort_column = None
+        self.sort_reverse = False
+        self._titles = {column: tree.heading(column, 'text') or column for column in tree['columns']}
+        self._tags = set()
+        scrollbar.configure(command=self.yview)
+        for column in self.sort_keys:
+            tree.heading(column, command=lambda c=column: self.sort_by(c))
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            tree.bind(sequence, self._on_wheel)
+
+    def set_rows(self, rows):
+        """替换全部行，保持当前的排序方式与滚动位置"""
+        self.rows = list(rows)
+        self._sort()
+        self._render()
+
+    def sort_by(self, column):
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = self.sort_keys[column][1]
+        for name, title in self._titles.items():
+            mark = SORT_MARKS[self.sort_reverse] if name == column else ''
+            self.tree.heading(name, text=title + mark)
+        self._sort()
+        self.top = 0
+        self._render()
+
+    def _sort(self):
+        if self.sort_column is None:
+            self.order = self.rows
+        else:
+            self.order = sorted(self.rows, key=self.sort_keys[self.sort_column][0], reverse=self.sort_reverse)
+
+    def yview(self, *args):
+        """滚动条的 command：('moveto', 比例) 或 ('scroll', 数量, 'units' | 'pages')"""
+        if args[0] == 'moveto':
+            top = round(float(args[1]) * len(self.order))
+        else:
+            top = self.top + int(args[1]) * (self.height if args[2] == 'pages' else 1)
+        self._scroll_to(top)
+
+    def _on_wheel(self, event):
+        up = event.num == 4 or getattr(event, 'delta', 0) > 0
+        self._scroll_to(self.top + (-WHEEL_ROWS if up else WHEEL_ROWS))
+        return 'break'
+
+    def _scroll_to(self, top):
+        top = max(0, min(top, len(self.order) - self.height))
+        if top != self.top:
+            self.top = top
+            self._render()
+
+    def _render(self):
+        total = len(self.order)
+        self.top = max(0, min(self.top, total - self.height))
+        visible = self.order[self.top:self.top + self.height]
+        items = self.tree.get_children()
+        for i, row in enumerate(visible):
+            tags = ()
+            if self.color is not None:
+                color = self.color(row)
+                tags = (f'bg{color.lstrip("#")}',)
+                if tags[0] not in self._tags:
+                    self._tags.add(tags[0])
+                    self.tree.tag_configure(tags[0], background=color)
+            if i < len(items):
+                self.tree.item(items[i], values=self.render(row), tags=tags)
+            else:
+                self.tree.insert('', 'end', values=self.render(row), tags=tags)
+        if len(items) > len(visible):
+            self.tree.delete(*items[len(visible):])
+        rows = max(1, min(total, self.height))
+        if int(self.tree.cget('height')) != rows:
+            self.tree.configure(height=rows)
+        if total:
+            self.scrollbar.set(self.top / total, (self.top + len(visible)) / total)
+        else:
+            self.scrollbar.set(0, 1)
@@ -0,0 +1,90 @@
+"""数据文件的外部修改检测：按 (大小, 修改时间) 轮询，区分自己的写入与其他程序的写入
+
+todo.json 可能被同步盘、merge.py 或手工编辑改写。FileWatcher 记住程序最后读到或写出的
+版本 (known)，每 WATCH_MS 毫秒 stat 一次，文件与之不同即视为外部修改并回调 on_change。
+程序自己的写入经 write() 在锁内完成：先确认文件仍是 known，再写入并把 known 更新为新签名，
+文件已被外部改写时抛出 ConflictError 而不覆盖。只用 stat，不依赖 inotify 等平台接口。
+"""
+import threading
+
+from storage import file_signature
+
+# 轮询间隔，毫秒
+WATCH_MS = 1000
+
+
+class ConflictError(OSError):
+    """数据文件在上次读取后被其他程序修改，本次写入未执行"""
+
+
+class FileWatcher:
+    """after(ms, fn) 用于安排下一次检查 (通常为 root.after)；on_change(signature) 在检测到外部修改时调用
+
+    回调返回前不会再次触发；处理方载入新版本后调用 loaded(signature)。
+    """
+
+    def __init__(self, after, path, on_change, known, interval_ms=WATCH_MS):
+        self.after = after
+        self.path = path
+        self.on_change = on_change
+        self.known = known
+        self.interval_ms = interval_ms
+        self.lock = threading.Lock()
+        # 外部修改正在处理中 (后台读取尚未完成)
+        self.busy = False
+        self._stopped = False
+        self.after(self.interval_ms, self._poll)
+
+    def _poll(self):
+        if self._stopped:
+            return
+        self.after(self.interval_ms, self._poll)
+        self.check()
+
+    def stop(self):
+        """不再检查 (如切换到了其他数据文件)"""
+        self._stopped = True
+
+    def check(self):
+        """立即检查一次，返回是否检测到外部修改"""
+        if self.busy or not self.lock.acquire(blocking=False):
+            # 正在写入或正在处理上一次修改，下次再查
+            return False
+        try:
+            signature = file_signature(self.path)
+            # 文件被删除时保留内存中的数据，下次写入时重建
+            changed = signature is not None and signature != self.known
+        finally:
+            self.lock.release()
+        if changed:
+            self.busy = True
+            self.on_change(signature)
+        return changed
+
+    def skip(self):
+        """本次修改未能载入 (如文件正被写到一半)，下次检查时重试"""
+        self.busy = False
+
+    def loaded(self, signature):
+        """已载入 signature 对应的版本"""
+        with self.lock:
+            self.known = signature
+            self.busy = False
+
+    def write(self, write, base=None):
+        """确认文件仍是 base 版本 (默认为已知版本) 后调用 write() 写入，其返回值为写出文件的签名
+
+        写出的数据在 base 之后复制时传入 base：复制之后才载入的外部修改不会被误当作已包含。
+        """
+        with self.lock:
+            current = file_signature(self.path)
+            if current is not None and current != (self.known if base is None else base):
+                raise ConflictError(f'{self.path} 已被其他程序修改')
+            self.known = write()
+            return self.known
+
+    def replaced(self, source, written):
+        """由 source 版本生成的 written 版本是自己写出的 (如日志合并)；期间已有外部修改时不认"""
+        with self.lock:
+            if self.known == source:
+                self.known = written